@@ -0,0 +1,354 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# How the notes model is brought up: 'background' (default) loads it in a
+# daemon thread once the worker is serving, 'eager' loads it before returning
+# (used by gunicorn --preload so forked workers share the weights), 'lazy'
+# loads it on first use and 'off' never loads it.
+LOAD_MODES = ('background', 'eager', 'lazy', 'off')
+
+# Where the onnx backend keeps its exported graphs, next to the app unless AI_ONNX_DIR is set
+ONNX_DIR = os.environ.get('AI_ONNX_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'onnx_models')
+
+
+def configure_torch_threads(num_threads=None):
+    """Cap torch's intra-op threads so several workers on one host don't oversubscribe the cores.
+
+    Defaults to AI_TORCH_THREADS, else the cores divided by WEB_CONCURRENCY.
+    """
+    import torch
+    if num_threads is None:
+        workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+        num_threads = int(os.environ.get('AI_TORCH_THREADS', 0)) or max(1, (os.cpu_count() or 1) // workers)
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only settable before the first parallel op; a later call keeps the old value
+        pass
+    return num_threads
+
+
+def _conv1d_to_linear(model):
+    # GPT-2 blocks use transformers' Conv1D (an nn.Linear with a transposed
+    # weight), which dynamic quantization doesn't recognise
+    import torch
+    from transformers.pytorch_utils import Conv1D
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+
+def build_torch_pipeline(model_name):
+    from transformers import pipeline
+    return pipeline("text-generation", model=model_name)
+
+
+def build_torch_int8_pipeline(model_name):
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(_conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("text-generation", model=model, tokenizer=AutoTokenizer.from_pretrained(model_name))
+
+
+def build_onnx_pipeline(model_name):
+    # Needs the optional optimum[onnxruntime] package. The exported graph is
+    # kept in ONNX_DIR so only the first start pays for the export.
+    from optimum.onnxruntime import ORTModelForCausalLM
+    from transformers import AutoTokenizer, pipeline
+    export_dir = os.path.join(ONNX_DIR, model_name.strip('/').replace('/', '--'))
+    if os.path.exists(os.path.join(export_dir, 'config.json')):
+        model = ORTModelForCausalLM.from_pretrained(export_dir)
+    else:
+        model = ORTModelForCausalLM.from_pretrained(model_name, export=True)
+        model.save_pretrained(export_dir)
+        logger.info("Exported %s to ONNX at %s", model_name, export_dir)
+    return pipeline("text-generation", model=model, tokenizer=AutoTokenizer.from_pretrained(model_name))
+
+
+# Inference backends selectable with AI_BACKEND
+BACKENDS = {
+    'torch': build_torch_pipeline,
+    'torch-int8': build_torch_int8_pipeline,
+    'onnx': build_onnx_pipeline,
+}
+
+
+class ModelManager:
+    """Owns the text-generation pipeline and loads it off the request path."""
+
+    def __init__(self, model_name="distilgpt2", load_mode=None, backend=None):
+        self.model_name = model_name
+        self.load_mode = (load_mode or os.environ.get('AI_MODEL_LOAD', 'background')).lower()
+        if self.load_mode not in LOAD_MODES:
+            logger.warning("Unknown AI_MODEL_LOAD %s, using background", self.load_mode)
+            self.load_mode = 'background'
+        self.backend = (backend or os.environ.get('AI_BACKEND', 'torch')).lower()
+        if self.backend not in BACKENDS:
+            logger.warning("Unknown AI_BACKEND %s, using torch", self.backend)
+            self.backend = 'torch'
+        self._pipeline = None
+        self._failed = False
+        self._thread = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def ready(self):
+        return self._pipeline is not None
+
+    @property
+    def status(self):
+        if self._pipeline is not None:
+            return 'ready'
+        if self._failed:
+            return 'failed'
+        if self._thread is not None and self._thread.is_alive():
+            return 'loading'
+        return 'idle'
+
+    def start(self):
+        """Kick off loading according to the configured mode."""
+        if self.load_mode == 'eager':
+            self.load()
+        elif self.load_mode == 'background':
+            self.warm_in_background()
+
+    def load(self):
+        """Load the pipeline synchronously; returns it, or None on failure."""
+        with self._lock:
+            if self._pipeline is not None or self._failed:
+                return self._pipeline
+            try:
+                configure_torch_threads()
+                self._pipeline = BACKENDS[self.backend](self.model_name)
+                logger.info("AI model %s loaded successfully (%s backend)", self.model_name, self.backend)
+            except Exception as e:
+                self._failed = True
+                logger.error("Error loading AI model: %s, using fallback summary", str(e))
+            return self._pipeline
+
+    def warm_in_background(self):
+        if self._pipeline is not None or self._failed or self.load_mode == 'off':
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.load, name="ai-model-loader", daemon=True)
+        self._thread.start()
+        logger.info("Loading AI model %s in background", self.model_name)
+
+    def get(self):
+        """Return the pipeline if it is ready, otherwise None without blocking.
+
+        In lazy mode the first call starts the load; callers fall back to
+        template notes until it completes.
+        """
+        if self._pipeline is None and self.load_mode == 'lazy':
+            self.warm_in_background()
+        return self._pipeline
+
+    def _after_fork(self):
+        # A loader thread does not survive fork. If the parent finished loading,
+        # the child shares those pages copy-on-write; otherwise start over here.
+        self._lock = threading.Lock()
+        if self._pipeline is None and self._thread is not None:
+            self._thread = None
+            if self.load_mode in ('background', 'eager'):
+                self.warm_in_background()
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class InferenceScheduler:
+    """Micro-batches concurrent generation requests into padded batches.
+
+    Callers submit a prompt and get a Future back. A single worker thread
+    drains the queue, waiting up to max_wait_ms for more prompts (or until
+    max_batch_size is reached) and runs them through the pipeline together.
+    """
+
+    def __init__(self, model_manager, max_batch_size=None, max_wait_ms=None, max_queue_depth=None, max_streams=None):
+        self.model_manager = model_manager
+        self.max_batch_size = int(max_batch_size or os.environ.get('AI_BATCH_MAX_SIZE', 8))
+        self.max_wait = float(max_wait_ms or os.environ.get('AI_BATCH_MAX_WAIT_MS', 10)) / 1000.0
+        self.max_queue_depth = int(max_queue_depth or os.environ.get('AI_QUEUE_MAX_DEPTH', 64))
+        self.max_streams = int(max_streams or os.environ.get('AI_STREAM_MAX_CONCURRENT', 4))
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.max_queue_depth)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._prepared = None
+        self._streams = threading.BoundedSemaphore(self.max_streams)
+
+    def submit(self, prompt, **generate_kwargs):
+        self._ensure_worker()
+        future = Future()
+        try:
+            self._queue.put_nowait((prompt, generate_kwargs, future))
+        except queue.Full:
+            raise QueueFullError(f"Inference queue is full ({self.max_queue_depth} pending)")
+        return future
+
+    def generate(self, prompt, timeout=60, **generate_kwargs):
+        """Blocking helper: submit and wait for the generated text."""
+        return self.submit(prompt, **generate_kwargs).result(timeout=timeout)
+
+    def stream(self, prompt, max_chars=None, **generate_kwargs):
+        """Yield the generated continuation piece by piece as tokens decode.
+
+        Streams run one prompt at a time outside the batch queue (at most
+        max_streams at once). Generation stops as soon as max_chars of text
+        have been produced, or when the caller stops iterating.
+        """
+        pipe = self.model_manager.get()
+        if pipe is None:
+            raise RuntimeError("AI model is not loaded")
+        if not self._streams.acquire(blocking=False):
+            raise QueueFullError(f"Too many streaming generations ({self.max_streams} running)")
+        try:
+            from transformers import StoppingCriteriaList, TextIteratorStreamer
+            self._prepare(pipe)
+            tokenizer = pipe.tokenizer
+            inputs = tokenizer(prompt, return_tensors='pt').to(pipe.model.device)
+            cancelled = threading.Event()
+            streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=60)
+            criteria = StoppingCriteriaList([_CharBudget(tokenizer, inputs['input_ids'].shape[-1], max_chars, cancelled)])
+            # Pipeline-only options don't apply to model.generate
+            kwargs = {k: v for k, v in generate_kwargs.items() if k not in ('truncation', 'num_return_sequences')}
+            thread = threading.Thread(
+                target=self._generate_streaming, name="ai-stream",
+                args=(pipe.model, streamer, dict(inputs, streamer=streamer, stopping_criteria=criteria,
+                                                 pad_token_id=tokenizer.pad_token_id, **kwargs)),
+                daemon=True
+            )
+            thread.start()
+        except Exception:
+            self._streams.release()
+            raise
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            cancelled.set()
+            thread.join()
+            self._streams.release()
+
+    @staticmethod
+    def _generate_streaming(model, streamer, kwargs):
+        try:
+            model.generate(**kwargs)
+        except Exception as e:
+            logger.error("Streaming generation failed: %s", str(e))
+            # Unblock the consumer, which would otherwise wait for the timeout
+            streamer.end()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ai-inference-batcher", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch = self._next_batch()
+                # Requests with different generation settings can't share a forward pass
+                groups = {}
+                for prompt, kwargs, future in batch:
+                    if future.set_running_or_notify_cancel():
+                        groups.setdefault(tuple(sorted(kwargs.items())), []).append((prompt, future))
+                for kwargs, items in groups.items():
+                    self._run_group(dict(kwargs), items)
+            except Exception as e:
+                # This is the only worker thread; fail the batch rather than every later request
+                logger.error("Inference batch failed: %s", str(e))
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run_group(self, kwargs, items):
+        pipe = self.model_manager.get()
+        if pipe is None:
+            for _, future in items:
+                future.set_exception(RuntimeError("AI model is not loaded"))
+            return
+        self._prepare(pipe)
+        prompts = [prompt for prompt, _ in items]
+        try:
+            started = time.perf_counter()
+            outputs = pipe(prompts, batch_size=len(prompts), **kwargs)
+            logger.debug("Ran inference batch of %d in %.3fs", len(prompts), time.perf_counter() - started)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for (_, future), output in zip(items, outputs):
+            future.set_result(output[0]['generated_text'])
+
+    def _prepare(self, pipe):
+        # GPT-2 has no pad token; pad on the left with EOS so batched prompts
+        # all end at the position generation starts from.
+        if self._prepared is pipe:
+            return
+        tokenizer = pipe.tokenizer
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+            pipe.model.config.pad_token_id = tokenizer.eos_token_id
+        tokenizer.padding_side = 'left'
+        self._prepared = pipe
+
+
+class _CharBudget:
+    """Stopping criterion: halt once the decoded continuation reaches max_chars, or on cancel."""
+
+    def __init__(self, tokenizer, prompt_length, max_chars, cancelled):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.max_chars = max_chars
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        done = self.cancelled.is_set()
+        if not done and self.max_chars:
+            text = self.tokenizer.decode(input_ids[0, self.prompt_length:], skip_special_tokens=True)
+            done = len(text.strip()) >= self.max_chars
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,223 @@
+"""Ward and doctor dashboard statistics from precomputed rollup tables.
+
+The rollup_* tables (models.py) hold counts and sums per doctor, risk
+category, stay length and discharge day. Every insert path adds its rows'
+share in the same transaction as the insert (add_to_rollups): /add_patient,
+/add_patients and init_db's bulk load. init_db's sync rewrites existing
+patients, so it recomputes them instead (rebuild_rollups).
+
+The stats functions only read rollup rows, whose number depends on how many
+doctors, categories, stay lengths and days there are, not on how many
+patients.
+"""
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import DischargeRollup, Patient, PatientRollup, StayRollup
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS = (PatientRollup, StayRollup, DischargeRollup)
+# Patient columns the rollups are computed from
+SOURCE_COLUMNS = ('DoctorName', 'RiskCategory', 'HasChronicCondition', 'HospitalStayDuration', 'DischargeDate')
+UNKNOWN = 'Unknown'
+REBUILD_CHUNK_SIZE = 200000
+STAY_PERCENTILES = (50, 90)
+
+
+def rollup_frames(patients):
+    """Aggregate a DataFrame of patients (SOURCE_COLUMNS) into a frame of rows for each rollup."""
+    df = pd.DataFrame({
+        'DoctorName': patients['DoctorName'].fillna(UNKNOWN).astype(str),
+        'RiskCategory': patients['RiskCategory'].fillna(UNKNOWN).astype(str),
+        'Chronic': patients['HasChronicCondition'].eq(True).astype('int64'),
+        'StayDays': pd.to_numeric(patients['HospitalStayDuration'], errors='coerce').fillna(0).astype('int64'),
+        'DischargeDate': pd.to_datetime(patients['DischargeDate']),
+        'Patients': 1,
+    })
+    return {
+        PatientRollup: df.groupby(['DoctorName', 'RiskCategory'], as_index=False).agg(
+            Patients=('Patients', 'sum'), Chronic=('Chronic', 'sum'), TotalStayDays=('StayDays', 'sum')),
+        StayRollup: df.groupby(['DoctorName', 'StayDays'], as_index=False).agg(Patients=('Patients', 'sum')),
+        DischargeRollup: df[df['DischargeDate'].notna()].groupby(['DischargeDate', 'DoctorName'], as_index=False).agg(
+            Discharges=('Patients', 'sum'), Chronic=('Chronic', 'sum'), TotalStayDays=('StayDays', 'sum')),
+    }
+
+
+def rollup_records(rows):
+    """Rollup frame rows as dicts of plain Python values for executemany."""
+    if 'DischargeDate' in rows.columns:
+        rows = rows.assign(DischargeDate=rows['DischargeDate'].dt.date)
+    return rows.to_dict('records')
+
+
+def rollup_rows(patients):
+    """rollup_frames for a list of patient dicts, as records, in plain Python.
+
+    For the few rows an app insert adds, building DataFrames would cost
+    more than the insert itself.
+    """
+    totals = {model: {} for model in ROLLUPS}
+
+    def add(model, key, values):
+        current = totals[model].get(key)
+        totals[model][key] = values if current is None else tuple(a + b for a, b in zip(current, values))
+
+    for patient in patients:
+        doctor = UNKNOWN if patient.get('DoctorName') is None else str(patient['DoctorName'])
+        risk = UNKNOWN if patient.get('RiskCategory') is None else str(patient['RiskCategory'])
+        chronic = int(patient.get('HasChronicCondition') in (True, 1))
+        stay = int(patient.get('HospitalStayDuration') or 0)
+        add(PatientRollup, (doctor, risk), (1, chronic, stay))
+        add(StayRollup, (doctor, stay), (1,))
+        if patient.get('DischargeDate') is not None:
+            add(DischargeRollup, (patient['DischargeDate'], doctor), (1, chronic, stay))
+    # Key columns come first in each rollup table, then the counts
+    return {model: [dict(zip(model.__table__.columns.keys(), key + values)) for key, values in rows.items()]
+            for model, rows in totals.items()}
+
+
+def add_to_rollups(connection, patients):
+    """Add newly inserted patients (a DataFrame or list of dicts) to the rollups, in the caller's transaction.
+
+    Each rollup row is incremented with INSERT ... ON CONFLICT DO UPDATE, so
+    concurrent inserts from other workers add up rather than overwrite. Other
+    databases increment row by row instead (increment_rows).
+    """
+    if len(patients) == 0:
+        return
+    insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(connection.dialect.name)
+    if isinstance(patients, pd.DataFrame):
+        records = {model: rollup_records(rows) for model, rows in rollup_frames(patients).items()}
+    else:
+        records = rollup_rows(patients)
+    for model, rows in records.items():
+        if not rows:
+            continue
+        table = model.__table__
+        keys = [column.name for column in table.primary_key.columns]
+        if insert is None:
+            increment_rows(connection, table, keys, rows)
+            continue
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_={
+            column.name: column + stmt.excluded[column.name] for column in table.columns if column.name not in keys})
+        connection.execute(stmt, rows)
+
+
+def increment_rows(connection, table, keys, rows):
+    """Portable upsert for databases without ON CONFLICT: update the row, insert it if there was none.
+
+    The insert runs in a savepoint, so when another worker inserted the same
+    key first it is retried as an update instead of failing the caller.
+    """
+    for row in rows:
+        match = and_(*(table.c[key] == row[key] for key in keys))
+        increments = {column: table.c[column] + value for column, value in row.items() if column not in keys}
+        if connection.execute(update(table).where(match).values(increments)).rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert(), row)
+        except IntegrityError:
+            connection.execute(update(table).where(match).values(increments))
+
+
+def rebuild_rollups(connection):
+    """Recompute every rollup from the patients table, a chunk at a time."""
+    started = time.perf_counter()
+    source = select(*(Patient.__table__.c[name] for name in SOURCE_COLUMNS))
+    parts = [rollup_frames(chunk) for chunk in pd.read_sql_query(source, connection, chunksize=REBUILD_CHUNK_SIZE)]
+    for model in ROLLUPS:
+        connection.execute(delete(model))
+        if not parts:
+            continue
+        # Chunks share keys (the same doctor on every chunk), so sum the partial rollups
+        keys = [column.name for column in model.__table__.primary_key.columns]
+        rows = pd.concat([part[model] for part in parts]).groupby(keys, as_index=False).sum()
+        if len(rows):
+            connection.execute(model.__table__.insert(), rollup_records(rows))
+    logger.info("Rebuilt rollups from %d chunks in %.2fs", len(parts), time.perf_counter() - started)
+
+
+def build_missing_rollups(engine):
+    """Build the rollups if there are patients but no rollups yet, e.g. on the first start after upgrading."""
+    with engine.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # Take the write lock before checking, so workers starting together build once
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        if (connection.execute(select(Patient.PatientID).limit(1)).first() is None
+                or connection.execute(select(PatientRollup.DoctorName).limit(1)).first() is not None):
+            connection.rollback()
+            return
+        rebuild_rollups(connection)
+        connection.commit()
+
+
+def summarize(patients, chronic, total_stay_days):
+    patients = int(patients or 0)
+    return {
+        'patients': patients,
+        'chronic_rate': round(chronic / patients, 4) if patients else None,
+        'mean_stay_days': round(total_stay_days / patients, 2) if patients else None,
+    }
+
+
+def stay_percentiles(histogram):
+    """Nearest-rank stay percentiles from a {stay days: patients} histogram."""
+    stays = np.array(sorted(histogram), dtype=np.int64)
+    cumulative = np.cumsum([histogram[stay] for stay in stays])
+    if not len(stays) or cumulative[-1] == 0:
+        return {f'p{p}': None for p in STAY_PERCENTILES}
+    return {f'p{p}': int(stays[np.searchsorted(cumulative, cumulative[-1] * p / 100)]) for p in STAY_PERCENTILES}
+
+
+def stay_histogram(session, doctor=None):
+    query = session.query(StayRollup.StayDays, func.sum(StayRollup.Patients)).group_by(StayRollup.StayDays)
+    if doctor:
+        query = query.filter(StayRollup.DoctorName == doctor)
+    return {int(stay): int(patients) for stay, patients in query}
+
+
+def patient_count(session):
+    """Number of patients, from the rollups every insert path updates in its own transaction."""
+    return session.query(func.coalesce(func.sum(PatientRollup.Patients), 0)).scalar()
+
+
+def overall_stats(session):
+    """Totals for every patient, and per risk category."""
+    by_risk = session.query(PatientRollup.RiskCategory, func.sum(PatientRollup.Patients), func.sum(PatientRollup.Chronic),
+                            func.sum(PatientRollup.TotalStayDays)).group_by(PatientRollup.RiskCategory).all()
+    totals = np.array([row[1:] for row in by_risk], dtype=np.int64).reshape(-1, 3).sum(axis=0)
+    return {
+        **summarize(*totals),
+        'stay_days': stay_percentiles(stay_histogram(session)),
+        'by_risk_category': {risk: summarize(*values) for risk, *values in by_risk},
+    }
+
+
+def doctor_stats(session):
+    """Totals and stay percentiles per doctor."""
+    totals = session.query(PatientRollup.DoctorName, func.sum(PatientRollup.Patients), func.sum(PatientRollup.Chronic),
+                           func.sum(PatientRollup.TotalStayDays)).group_by(PatientRollup.DoctorName).order_by(PatientRollup.DoctorName)
+    histograms = {}
+    for doctor, stay, patients in session.query(StayRollup.DoctorName, StayRollup.StayDays, StayRollup.Patients):
+        histograms.setdefault(doctor, {})[stay] = patients
+    return [{'doctor': doctor, **summarize(*values), 'stay_days': stay_percentiles(histograms.get(doctor, {}))}
+            for doctor, *values in totals]
+
+
+def discharge_series(session, start, end, doctor=None):
+    """Discharges per day from start to end inclusive, with zeros for days without any."""
+    query = session.query(DischargeRollup.DischargeDate, func.sum(DischargeRollup.Discharges), func.sum(DischargeRollup.Chronic),
+                          func.sum(DischargeRollup.TotalStayDays)).filter(DischargeRollup.DischargeDate.between(start, end))
+    if doctor:
+        query = query.filter(DischargeRollup.DoctorName == doctor)
+    by_day = {day: values for day, *values in query.group_by(DischargeRollup.DischargeDate)}
+    return [{'date': day, **summarize(*by_day.get(day, (0, 0, 0)))} for day in pd.date_range(start, end).date]
@@ -1,13 +1,37 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from models import Patient, SessionLocal
+from flask import Flask, Response, render_template, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
+from models import ORIGIN_APP, Patient, ClinicalRecord, TestReport, SessionLocal, engine, is_pool_process
+from ai_model import ModelManager, InferenceScheduler
+from model_server import RemoteModelManager, RemoteInferenceScheduler
+from cache import TieredCache, make_key
+from artifact_store import ArtifactStore, default_spill_dir
+from report_store import ReportStore, UploadTooLargeError
+from file_serving import ONE_YEAR, StaticVersions, apply_cache_policy, send_cached_file
+from jobs import JobStore, JobQueue, QueueFullError as JobQueueFullError
+from search_index import fts, match_clause
+from analytics import (add_to_rollups, build_missing_rollups, discharge_series, doctor_stats, overall_stats,
+                       patient_count, rebuild_rollups, stay_histogram, stay_percentiles)
+import click
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from fpdf import FPDF
+from datetime import date, datetime, timedelta
+from pdf_renderer import render_pdf, to_latin1
+from clinical_rules import ClinicalRules
 import logging
 import os
+import re
+import time
+import io
+import csv
+import json
+import zipfile
 import tempfile
-from sqlalchemy import func
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import func, exists, select, insert, and_, or_, tuple_
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 
 # Configure logging
@@ -16,49 +40,166 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Dates go out as YYYY-MM-DD, the form they are entered and filtered in,
+# rather than Flask's default HTTP date format
+class JSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+app.json = JSONProvider(app)
+
 # File upload configuration
 UPLOAD_FOLDER = os.path.join('static', 'uploads')
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB limit
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 50)) * 1024 * 1024
+
+# Batch discharge configuration
+BATCH_MAX_PATIENTS = int(os.environ.get('BATCH_MAX_PATIENTS', 1000))
+PDF_RENDER_PROCESSES = int(os.environ.get('PDF_RENDER_PROCESSES', os.cpu_count() or 1))
+# /generate_batch ZIPs are kept in memory up to this size, then on disk
+BATCH_ARCHIVE_SPOOL_BYTES = int(os.environ.get('BATCH_ARCHIVE_SPOOL_MB', 32)) * 1024 * 1024
+
+# Rendered PDFs are held in memory and, unless ARTIFACT_SPILL_DIR is set to '',
+# also written to a directory every worker can read (RAM-backed /dev/shm by default)
+artifact_store = ArtifactStore(
+    ttl=int(os.environ.get('ARTIFACT_TTL', 900)),
+    max_memory_bytes=int(os.environ.get('ARTIFACT_MEMORY_MAX_MB', 256)) * 1024 * 1024,
+    spill_dir=os.environ.get('ARTIFACT_SPILL_DIR', default_spill_dir()) or None,
+    max_spill_bytes=int(os.environ.get('ARTIFACT_SPILL_MAX_MB', 1024)) * 1024 * 1024
+)
+
+# /generate runs on a small per-worker thread pool; job status is kept in the
+# shared cache database so status and event requests can land on any worker
+job_store = JobStore(
+    db_path=os.environ.get('JOBS_DB', os.environ.get('AI_NOTES_CACHE_DB', 'smartdischarge_cache.db')) or None,
+    ttl=int(os.environ.get('JOB_TTL', 3600))
+)
+generate_jobs = JobQueue(
+    job_store,
+    max_workers=int(os.environ.get('GENERATE_WORKERS', 2)),
+    max_pending=int(os.environ.get('GENERATE_QUEUE_MAX', 32))
+)
+JOB_EVENTS_POLL = 0.5
+JOB_EVENTS_TIMEOUT = 300
+
+# Test reports are stored once per content hash under static/uploads/reports;
+# page counts and thumbnails are extracted on a background job queue
+REPORTS_URL_PREFIX = 'uploads/reports'
+report_store = ReportStore(os.path.join(UPLOAD_FOLDER, 'reports'))
+report_jobs = JobQueue(
+    job_store,
+    max_workers=int(os.environ.get('REPORT_WORKERS', 2)),
+    max_pending=int(os.environ.get('REPORT_QUEUE_MAX', 256)),
+    name='report-job'
+)
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# url_for('static', ...) URLs carry ?v=<content hash>, so browsers can keep a
+# versioned asset for a year and still pick up a changed file at once
+static_versions = StaticVersions(app.static_folder)
+
+@app.url_defaults
+def add_static_version(endpoint, values):
+    if endpoint == 'static' and 'v' not in values:
+        version = static_versions.get(values.get('filename', ''))
+        if version:
+            values['v'] = version
+
+@app.after_request
+def cache_versioned_static(response):
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 206, 304):
+        if request.args['v'] == static_versions.get(request.view_args.get('filename', '')):
+            apply_cache_policy(response, ONE_YEAR, immutable=True, public=True)
+    return response
+
+# Each request gets its own session from the scoped registry; drop it at the end
+@app.teardown_appcontext
+def remove_session(exception=None):
+    SessionLocal.remove()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Load AI model with retry mechanism
-def load_ai_model():
-    try:
-        from transformers import pipeline
-        summarizer = pipeline("text-generation", model="distilgpt2")
-        logger.info("AI model loaded successfully")
-        return summarizer
-    except Exception as e:
-        logger.error("Error loading AI model: %s, using fallback summary", str(e))
-        return None
+# AI model is loaded off the request path; see ai_model.ModelManager. With
+# AI_SERVER_SOCKET set, inference goes to the shared model_server.py sidecar
+# instead and falls back to template notes while it is unreachable.
+AI_MODEL_NAME = os.environ.get('AI_MODEL_NAME', 'distilgpt2')
+if os.environ.get('AI_SERVER_SOCKET'):
+    model_manager = RemoteModelManager(os.environ['AI_SERVER_SOCKET'], model_name=AI_MODEL_NAME)
+    inference_scheduler = RemoteInferenceScheduler(model_manager)
+else:
+    model_manager = ModelManager(model_name=AI_MODEL_NAME)
+    if not is_pool_process():
+        model_manager.start()
+    inference_scheduler = InferenceScheduler(model_manager)
 
-summarizer = load_ai_model()
+# Summary wording comes from the clinical rule table; CLINICAL_RULES_OVERRIDES
+# names a JSON file with hospital-specific changes merged on top of it
+clinical_rules = ClinicalRules.load(overrides_path=os.environ.get('CLINICAL_RULES_OVERRIDES') or None)
 
 # Map GeneralHealth to diseases and age
 def map_disease_and_age(general_health, has_chronic, risk_category):
-    age_map = {
-        'Obese': 'Adult (40-60)',
-        'Overweight': 'Adult (30-50)',
-        'Normal': 'Young Adult (20-40)'
+    return clinical_rules.map_disease(general_health, has_chronic, risk_category)
+
+# Recorded diagnosis and age (e.g. from the cardiology dataset) take precedence
+# over the GeneralHealth-based mapping
+def resolve_disease(patient_data):
+    disease, complaint, age = map_disease_and_age(
+        patient_data.get('GeneralHealth', 'Unknown'),
+        patient_data.get('HasChronicCondition', False),
+        patient_data.get('RiskCategory', 'Unknown')
+    )
+    clinical = patient_data.get('Clinical')
+    if clinical:
+        disease = clinical.get('FinalDiagnosis') or clinical.get('ProvisionalDiagnosis') or disease
+        if clinical.get('Age'):
+            age = f"{clinical['Age']} years"
+    return disease, complaint, age
+
+# Function to parse a YYYY-MM-DD value; blank or 'Unknown' means no date
+def parse_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    value = str(value).strip()
+    if not value or value.lower() == 'unknown':
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+CLINICAL_FIELDS = [
+    'Age', 'SymptomDuration', 'PastMedicalHistory', 'SystolicBP', 'DiastolicBP', 'HeartRate',
+    'PhysicalExam', 'ECGFindings', 'ProvisionalDiagnosis', 'FinalDiagnosis', 'Medications',
+    'DischargeMedications', 'FollowUp'
+]
+
+# Query for patients together with their structured clinical record, if any
+def patient_query(session):
+    return session.query(Patient, ClinicalRecord).outerjoin(ClinicalRecord, ClinicalRecord.PatientID == Patient.PatientID)
+
+# Convert a Patient row into the dict shape the summary code works with
+def patient_to_dict(patient, clinical=None):
+    return {
+        'PatientID': patient.PatientID,
+        'Name': patient.Name,
+        'Sex': patient.Sex,
+        'State': patient.State,
+        'GeneralHealth': patient.GeneralHealth,
+        'HasChronicCondition': patient.HasChronicCondition,
+        'HospitalStayDuration': patient.HospitalStayDuration,
+        'RiskCategory': patient.RiskCategory,
+        'DoctorName': patient.DoctorName,
+        'Allergies': patient.Allergies,
+        'ChiefComplaint': patient.ChiefComplaint,
+        'AdmissionDate': patient.AdmissionDate,
+        'DischargeDate': patient.DischargeDate,
+        'TestReports': patient.TestReports,
+        'Clinical': {field: getattr(clinical, field) for field in CLINICAL_FIELDS} if clinical else None
     }
-    age = age_map.get(risk_category, 'Adult (30-60)')
-    
-    if has_chronic:
-        if general_health == 'Fair':
-            return 'Hypertension', 'High blood pressure', age
-        elif general_health == 'Poor':
-            return 'Diabetes', 'High blood sugar', age
-        else:
-            return 'Chronic Heart Disease', 'Chest pain', age
-    else:
-        return 'Acute Respiratory Infection', 'Shortness of breath', age
 
 # Function to fetch patient data by ID
 def get_patient_data(patient_id):
@@ -66,25 +207,10 @@ def get_patient_data(patient_id):
     try:
         patient_id_int = int(patient_id)
         logger.debug("Looking up PatientID: %d", patient_id_int)
-        patient = session.query(Patient).filter(Patient.PatientID == patient_id_int).first()
-        if patient:
+        row = patient_query(session).filter(Patient.PatientID == patient_id_int).first()
+        if row:
             logger.debug("Patient found for ID: %d", patient_id_int)
-            return {
-                'PatientID': patient.PatientID,
-                'Name': patient.Name,
-                'Sex': patient.Sex,
-                'State': patient.State,
-                'GeneralHealth': patient.GeneralHealth,
-                'HasChronicCondition': patient.HasChronicCondition,
-                'HospitalStayDuration': patient.HospitalStayDuration,
-                'RiskCategory': patient.RiskCategory,
-                'DoctorName': patient.DoctorName,
-                'Allergies': patient.Allergies,
-                'ChiefComplaint': patient.ChiefComplaint,
-                'AdmissionDate': patient.AdmissionDate,
-                'DischargeDate': patient.DischargeDate,
-                'TestReports': patient.TestReports
-            }
+            return patient_to_dict(*row)
         logger.warning("No patient found for ID: %d", patient_id_int)
         return None
     except ValueError as ve:
@@ -96,21 +222,175 @@ def get_patient_data(patient_id):
     finally:
         session.close()
 
-# Function to get all patient IDs
-def get_patient_ids():
+# Function to check whether a patient ID exists, via the primary key index
+def patient_exists(patient_id):
     session = SessionLocal()
     try:
-        patient_ids = set(str(pid[0]) for pid in session.query(Patient.PatientID).all())
-        logger.debug("Fetched %d patient IDs from database", len(patient_ids))
-        return patient_ids
+        return session.query(exists().where(Patient.PatientID == int(patient_id))).scalar()
+    except (ValueError, TypeError):
+        return False
+    except Exception as e:
+        logger.error("Error checking patient ID %s: %s", patient_id, str(e))
+        return False
+    finally:
+        session.close()
+
+# AI notes depend only on these prompt inputs, so they are cached by content
+AI_GENERATE_KWARGS = dict(max_length=300, num_return_sequences=1, truncation=True, temperature=0.8, do_sample=True, min_length=50)
+AI_NOTES_MAX_CHARS = 200
+# Bumped when clean_ai_output changes, so notes cleaned the old way aren't served
+AI_NOTES_CACHE_VERSION = 2
+ai_notes_cache = TieredCache(
+    'ai_notes',
+    max_entries=int(os.environ.get('AI_NOTES_CACHE_SIZE', 1024)),
+    db_path=os.environ.get('AI_NOTES_CACHE_DB', 'smartdischarge_cache.db') or None
+)
+
+def build_ai_prompt(disease, general_health, risk_category, stay_duration):
+    return f"Generate a concise medical note for a patient with {disease}. Describe the disease briefly, mention key patient data (Health: {general_health}, Risk: {risk_category}, Stay: {stay_duration} days), and suggest one treatment or lifestyle change. Keep it under 150 words."
+
+def ai_notes_cache_key(disease, general_health, risk_category, stay_duration):
+    return make_key(AI_NOTES_CACHE_VERSION, model_manager.model_name, AI_GENERATE_KWARGS, AI_NOTES_MAX_CHARS,
+                    disease=disease, general_health=general_health,
+                    risk_category=risk_category, stay_duration=stay_duration)
+
+def fallback_ai_notes(disease, reason):
+    advice = clinical_rules.diseases.get(disease, clinical_rules.default_disease)['notes_advice']
+    return f"AI Notes: {disease} requires ongoing monitoring. {advice}. [{reason}]"
+
+def clean_ai_output(prompt, ai_output):
+    ai_output = ai_output.replace(prompt, '').strip()
+    logger.debug("Raw AI output: %s", ai_output)
+    if not ai_output or len(ai_output) < 20:
+        raise ValueError("AI output is empty or too short")
+    ai_notes = to_latin1(ai_output[:AI_NOTES_MAX_CHARS]).strip()
+    return f"AI Notes: {ai_notes}".replace('\n', ' ')
+
+# Function to generate AI notes for many prompt inputs at once. Inputs are
+# (disease, general_health, risk_category, stay_duration) tuples; cache misses
+# are submitted together so the inference scheduler can batch them. wave caps
+# how many are queued at a time (default: half the queue). Inputs whose
+# generation failed get fallback notes and are added to the fallbacks set.
+def generate_ai_notes_many(inputs, wave=None, fallbacks=None):
+    fallbacks = set() if fallbacks is None else fallbacks
+    results, pending = {}, []
+    for params in dict.fromkeys(inputs):
+        cache_key = ai_notes_cache_key(*params)
+        cached = ai_notes_cache.get(cache_key)
+        if cached is not None:
+            results[params] = cached
+        else:
+            pending.append((params, cache_key))
+    if not pending:
+        return results
+
+    if not model_manager.get():
+        logger.warning("AI model %s, using fallback notes", model_manager.status)
+        for params, _ in pending:
+            results[params] = fallback_ai_notes(params[0], 'AI model unavailable')
+        return results
+
+    # Submit in waves of at most half the queue, leaving the other half free so
+    # concurrent /generate requests don't get QueueFullError during a big batch
+    wave = wave or max(1, inference_scheduler.max_queue_depth // 2)
+    for start in range(0, len(pending), wave):
+        submitted = []
+        for params, cache_key in pending[start:start + wave]:
+            prompt = build_ai_prompt(*params)
+            logger.debug("Generating AI notes with prompt: %s", prompt)
+            try:
+                submitted.append((params, cache_key, prompt, inference_scheduler.submit(prompt, **AI_GENERATE_KWARGS)))
+            except Exception as e:
+                logger.error("Error queueing AI notes: %s, using fallback", str(e))
+                results[params] = fallback_ai_notes(params[0], 'AI generation failed; using fallback')
+                fallbacks.add(params)
+        for params, cache_key, prompt, future in submitted:
+            try:
+                ai_notes = clean_ai_output(prompt, future.result(timeout=60))
+                logger.info("AI notes generated successfully: %s", ai_notes)
+                ai_notes_cache.set(cache_key, ai_notes)
+            except Exception as e:
+                logger.error("Error generating AI notes: %s, using fallback", str(e))
+                ai_notes = fallback_ai_notes(params[0], 'AI generation failed; using fallback')
+                fallbacks.add(params)
+            results[params] = ai_notes
+    return results
+
+# Function to generate AI notes, served from the cache when the inputs repeat.
+# Returns the notes and whether generation failed and they are the fallback.
+def generate_ai_notes(disease, general_health, risk_category, stay_duration):
+    params = (disease, general_health, risk_category, stay_duration)
+    fallbacks = set()
+    ai_notes = generate_ai_notes_many([params], fallbacks=fallbacks)[params]
+    return ai_notes, params in fallbacks
+
+# Function to stream AI notes as they decode. Yields (event, text) pairs: 'token'
+# for each new piece of text, then one 'done' with the final notes. Those go through
+# the same clean_ai_output as batch-generated ones before they are cached, so the
+# following /generate reuses them as-is.
+def stream_ai_notes(disease, general_health, risk_category, stay_duration):
+    cache_key = ai_notes_cache_key(disease, general_health, risk_category, stay_duration)
+    cached = ai_notes_cache.get(cache_key)
+    if cached is not None:
+        yield 'done', cached
+        return
+    if not model_manager.get():
+        logger.warning("AI model %s, using fallback notes", model_manager.status)
+        yield 'done', fallback_ai_notes(disease, 'AI model unavailable')
+        return
+
+    prompt = build_ai_prompt(disease, general_health, risk_category, stay_duration)
+    pieces = []
+    try:
+        for text in inference_scheduler.stream(prompt, max_chars=AI_NOTES_MAX_CHARS, **AI_GENERATE_KWARGS):
+            pieces.append(text)
+            yield 'token', text
+        ai_notes = clean_ai_output(prompt, ''.join(pieces))
+        ai_notes_cache.set(cache_key, ai_notes)
     except Exception as e:
-        logger.error("Error fetching patient IDs: %s", str(e))
-        return set()
+        logger.error("Error streaming AI notes: %s, using fallback", str(e))
+        ai_notes = fallback_ai_notes(disease, 'AI generation failed; using fallback')
+    yield 'done', ai_notes
+
+# Function to list the distinct AI notes inputs of the patients in the database,
+# worked out as /generate does (recorded diagnoses included)
+def patient_ai_inputs():
+    session = SessionLocal()
+    try:
+        rows = session.query(Patient.GeneralHealth, Patient.HasChronicCondition, Patient.RiskCategory,
+                             Patient.HospitalStayDuration, ClinicalRecord.FinalDiagnosis, ClinicalRecord.ProvisionalDiagnosis) \
+            .outerjoin(ClinicalRecord, ClinicalRecord.PatientID == Patient.PatientID).distinct().all()
     finally:
         session.close()
+    inputs = []
+    for general_health, has_chronic, risk_category, stay_duration, final_diagnosis, provisional_diagnosis in rows:
+        disease, _, _ = resolve_disease({
+            'GeneralHealth': general_health, 'HasChronicCondition': has_chronic, 'RiskCategory': risk_category,
+            'Clinical': {'FinalDiagnosis': final_diagnosis, 'ProvisionalDiagnosis': provisional_diagnosis},
+        })
+        inputs.append((disease, general_health, risk_category, stay_duration))
+    return list(dict.fromkeys(inputs))
+
+# Pre-generate AI notes for every prompt combination in the database so repeat cases never hit the model
+def prewarm_ai_notes_cache():
+    if not model_manager.load():
+        logger.error("AI model unavailable, cannot pre-warm notes cache")
+        return 0
+    inputs = patient_ai_inputs()
+    # Offline, so nothing else needs a slot: fill the whole queue
+    generate_ai_notes_many(inputs, wave=inference_scheduler.max_queue_depth)
+    logger.info("Pre-warmed AI notes cache for %d combinations", len(inputs))
+    return len(inputs)
 
-# Function to generate AI-enhanced summary
-def generate_summary(patient_data, detail_level, doctor_notes, discharge_date):
+@app.cli.command('warm-notes-cache')
+def warm_notes_cache_command():
+    """Generate and cache AI notes for every disease/health/risk/stay combination among the patients."""
+    click.echo(f"Pre-warmed {prewarm_ai_notes_cache()} entries")
+
+# Function to generate AI-enhanced summary. ai_notes_failed in the result is True
+# when AI generation failed and the notes are the fallback, which mustn't be cached.
+def generate_summary(patient_data, detail_level, doctor_notes, discharge_date, ai_notes=None, is_fallback=None, sections=None,
+                     ai_notes_failed=False):
     try:
         name = patient_data.get('Name', 'Unknown')
         sex = patient_data.get('Sex', 'Unknown')
@@ -122,55 +402,54 @@ def generate_summary(patient_data, detail_level, doctor_notes, discharge_date):
         doctor_name = patient_data.get('DoctorName', 'Dr. Anita Sharma')
         allergies = patient_data.get('Allergies', 'None')
         chief_complaint = patient_data.get('ChiefComplaint', 'Unknown')
-        admission_date = patient_data.get('AdmissionDate', (datetime.strptime(discharge_date, '%Y-%m-%d') - timedelta(days=int(stay_duration or 1))).strftime('%Y-%m-%d'))
-        disease, complaint_default, age = map_disease_and_age(general_health, has_chronic, risk_category)
-        
-        # Template for base summary
-        hpi = f"Presented with {chief_complaint or complaint_default} for {'1 week' if has_chronic else '3 days'}."
-        past_history = f"History of {'obesity' if risk_category == 'Obese' else 'no major conditions'}."
-        social_history = f"{'Non-smoker, sedentary' if risk_category == 'Obese' else 'Non-smoker, active'} lifestyle."
-        physical_exam = f"{'BP 140/90' if disease == 'Hypertension' else 'Blood glucose 180 mg/dL' if disease == 'Diabetes' else 'HR 80 bpm'} on admission."
-        lab_data = f"{'HbA1c 7.0%' if disease == 'Diabetes' else 'Normal lipids' if disease == 'Chronic Heart Disease' else 'CRP elevated' if disease == 'Acute Respiratory Infection' else 'Normal labs'}."
-        hospital_course = f"{'Monitored BP and adjusted medications' if disease == 'Hypertension' else 'Managed glucose levels' if disease == 'Diabetes' else 'Cardiac monitoring' if disease == 'Chronic Heart Disease' else 'Antibiotic therapy'}."
-        
-        medications_dict = {
-            'Hypertension': 'Lisinopril 10mg daily for 30 days',
-            'Diabetes': 'Metformin 500mg twice daily for 60 days',
-            'Chronic Heart Disease': 'Aspirin 81mg daily, Atorvastatin 20mg daily for 90 days',
-            'Acute Respiratory Infection': 'Amoxicillin 500mg three times daily for 7 days'
-        }
-        medications = medications_dict.get(disease, 'Standard medications prescribed')
+        # discharge_date is a date; without a recorded admission date, count back the stay
+        admission_date = patient_data.get('AdmissionDate') or discharge_date - timedelta(days=int(stay_duration or 1))
+        disease, complaint_default, age = resolve_disease(patient_data)
         
-        diet = f"{'Low-salt diet' if disease == 'Hypertension' else 'Low-sugar diet' if disease == 'Diabetes' else 'Heart-healthy diet' if disease == 'Chronic Heart Disease' else 'Balanced diet'}."
-        activity = f"{'Light walking 30 min daily' if has_chronic else 'Resume normal activity in 1 week'}."
-        follow_up = f"Follow up in {'1 month' if has_chronic else '2 weeks'} with {'blood pressure check' if disease == 'Hypertension' else 'blood sugar test' if disease == 'Diabetes' else 'cardiac evaluation' if disease == 'Chronic Heart Disease' else 'respiratory check'}."
-        discharge_instructions = f"{'Monitor BP daily' if disease == 'Hypertension' else 'Check glucose regularly' if disease == 'Diabetes' else 'Report chest pain immediately' if disease == 'Chronic Heart Disease' else 'Complete antibiotic course'}."
-        
-        condition = 'Stable' if general_health in ['Good', 'Very good', 'Excellent'] else 'Improved' if general_health == 'Fair' else 'Unchanged'
-        
-        # Simplified AI-generated notes with robust fallback
-        ai_notes = ""
-        if summarizer:
-            prompt = f"Generate a concise medical note for a patient with {disease}. Describe the disease briefly, mention key patient data (Health: {general_health}, Risk: {risk_category}, Stay: {stay_duration} days), and suggest one treatment or lifestyle change. Keep it under 150 words."
-            try:
-                logger.debug("Generating AI notes with prompt: %s", prompt)
-                ai_output = summarizer(prompt, max_length=300, num_return_sequences=1, truncation=True, temperature=0.8, do_sample=True, min_length=50)[0]['generated_text']
-                ai_output = ai_output.replace(prompt, '').strip()
-                logger.debug("Raw AI output: %s", ai_output)
-                if not ai_output or len(ai_output) < 20:
-                    raise ValueError("AI output is empty or too short")
-                ai_notes = ai_output[:200].strip()
-                ai_notes = f"AI Notes: {ai_notes}"
-                ai_notes = ai_notes.replace('\n', ' ')
-                logger.info("AI notes generated successfully: %s", ai_notes)
-            except Exception as e:
-                logger.error("Error generating AI notes: %s, using fallback", str(e))
-                ai_notes = f"AI Notes: {disease} requires ongoing monitoring. {'Manage BP with low-salt diet' if disease == 'Hypertension' else 'Control glucose with diet' if disease == 'Diabetes' else 'Monitor heart health' if disease == 'Chronic Heart Disease' else 'Complete antibiotics'}. [AI generation failed; using fallback]"
-        else:
-            logger.warning("AI model unavailable, using fallback notes")
-            ai_notes = f"AI Notes: {disease} requires ongoing monitoring. {'Manage BP with low-salt diet' if disease == 'Hypertension' else 'Control glucose with diet' if disease == 'Diabetes' else 'Monitor heart health' if disease == 'Chronic Heart Disease' else 'Complete antibiotics'}. [AI model unavailable]"
+        # Template for base summary, from the clinical rule table unless precomputed (batch runs)
+        if sections is None:
+            sections = clinical_rules.sections(disease, has_chronic, risk_category, general_health,
+                                               chief_complaint or complaint_default)
+        hpi = sections['hpi']
+        past_history = sections['past_history']
+        social_history = sections['social_history']
+        physical_exam = sections['physical_exam']
+        lab_data = sections['lab_data']
+        hospital_course = sections['hospital_course']
+        medications = sections['medications']
+        diet = sections['diet']
+        activity = sections['activity']
+        follow_up = sections['follow_up']
+        discharge_instructions = sections['discharge_instructions']
+        condition = sections['condition']
+        secondary_diagnosis = sections['secondary_diagnosis']
+
+        # Use the recorded clinical data where the source dataset provided it
+        clinical = patient_data.get('Clinical')
+        if clinical:
+            if clinical.get('SymptomDuration'):
+                hpi = f"Presented with {chief_complaint or complaint_default} for {clinical['SymptomDuration']}."
+            if clinical.get('PastMedicalHistory'):
+                past_history = f"{clinical['PastMedicalHistory']}."
+                if has_chronic:
+                    secondary_diagnosis = clinical['PastMedicalHistory']
+            if clinical.get('PhysicalExam'):
+                physical_exam = f"{clinical['PhysicalExam']} on admission."
+            if clinical.get('ECGFindings'):
+                lab_data = f"ECG: {clinical['ECGFindings']}."
+            if clinical.get('Medications'):
+                hospital_course = f"Treated with {clinical['Medications']}."
+            if not clinical_rules.is_known_disease(disease):
+                discharge_instructions = "Take discharge medications as prescribed and report worsening symptoms."
+            medications = clinical.get('DischargeMedications') or medications
+            if clinical.get('FollowUp'):
+                follow_up = f"{clinical['FollowUp']}."
 
-        patient_ids = get_patient_ids()
+        if ai_notes is None:
+            ai_notes, ai_notes_failed = generate_ai_notes(disease, general_health, risk_category, stay_duration)
+
+        if is_fallback is None:
+            is_fallback = not patient_exists(patient_data.get('PatientID'))
         return {
             'hpi': hpi,
             'past_history': past_history,
@@ -183,218 +462,95 @@ def generate_summary(patient_data, detail_level, doctor_notes, discharge_date):
             'activity': activity,
             'follow_up': follow_up,
             'discharge_instructions': discharge_instructions,
-            'discharge_date': discharge_date,
-            'admission_date': admission_date,
+            'discharge_date': discharge_date.isoformat(),
+            'admission_date': admission_date.isoformat(),
             'condition': condition,
             'allergies': allergies,
             'chief_complaint': chief_complaint or complaint_default,
-            'diagnosis': f"{disease}. Secondary: {'Obesity-related complications' if risk_category == 'Obese' else 'None'}.",
+            'diagnosis': f"{disease}. Secondary: {secondary_diagnosis}.",
             'doctor_name': doctor_name,
             'age': age,
-            'is_fallback': str(patient_data.get('PatientID', 'Unknown')) not in patient_ids,
-            'ai_notes': ai_notes
+            'is_fallback': is_fallback,
+            'ai_notes': ai_notes,
+            'ai_notes_failed': ai_notes_failed
         }
     except Exception as e:
         logger.error("Error in generate_summary: %s", str(e))
         raise ValueError(f"Failed to generate summary: {str(e)}")
 
+# Finished summaries and their PDFs, keyed on the full patient row plus the
+# request parameters, so any change to the patient yields a new key. Entries are
+# tagged per patient so updates can also reclaim the superseded ones right away.
+SUMMARY_CACHE_VERSION = 2
+summary_cache = TieredCache(
+    'summaries',
+    max_entries=int(os.environ.get('SUMMARY_CACHE_SIZE', 512)),
+    db_path=os.environ.get('SUMMARY_CACHE_DB', os.environ.get('AI_NOTES_CACHE_DB', 'smartdischarge_cache.db')) or None,
+    max_bytes=int(os.environ.get('SUMMARY_CACHE_MAX_MB', 128)) * 1024 * 1024,
+    max_disk_bytes=int(os.environ.get('SUMMARY_CACHE_DISK_MAX_MB', 1024)) * 1024 * 1024
+)
+
+def summary_cache_key(patient_data, detail_level, doctor_notes, discharge_date):
+    # Readiness is part of the key so fallback notes aren't served once the model is up
+    return make_key(SUMMARY_CACHE_VERSION, patient_data, clinical_rules.fingerprint, model_manager.model_name, model_manager.ready, AI_GENERATE_KWARGS,
+                    detail_level=detail_level, doctor_notes=doctor_notes, discharge_date=discharge_date)
+
+def summary_cache_tag(patient_id):
+    return f"patient:{patient_id}"
+
+# Function to drop cached summaries and PDFs for a patient after it changes
+def invalidate_patient_summaries(*patient_ids):
+    summary_cache.delete_tags([summary_cache_tag(patient_id) for patient_id in patient_ids])
+
 # Function to generate visually enhanced PDF
 def generate_pdf(patient_data, summary):
     try:
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_margins(20, 15, 20)
+        pdf_bytes = render_pdf(patient_data, summary)
+        logger.info("PDF created")
+        return pdf_bytes
+    except Exception as e:
+        logger.error("Error in generate_pdf: %s", str(e))
+        raise ValueError(f"Failed to generate PDF: {str(e)}")
 
-        # Draw border around content
-        pdf.set_draw_color(0, 102, 204)  # Blue border
-        pdf.rect(10, 10, 190, 277)  # A4 size: 210x297mm, 10mm margin
+# Process pool for bulk PDF rendering, created on first use. Spawned rather than
+# forked so the render processes don't inherit the AI model or open connections.
+# Its target, pdf_renderer.render_pdf, imports nothing from the app, and under
+# `python app.py`, where render processes re-run this file first, the startup
+# work here is skipped for them (models.is_pool_process).
+_pdf_pool = None
 
-        # Hospital header with logo
-        logo_path = os.path.join(os.path.dirname(__file__), "static", "images", "logo.png")
+def get_pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_RENDER_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+    return _pdf_pool
+
+# Function to render many PDFs, in the process pool when the batch is big enough to pay for it.
+# Yields each job's PDF bytes (or the exception) in order; at most two PDFs per
+# render process are in flight, so the caller can write each out and drop it.
+def render_pdfs(jobs):
+    pool = None
+    if len(jobs) >= 4 and PDF_RENDER_PROCESSES >= 2:
         try:
-            pdf.image(logo_path, x=85, y=15, w=40)  # Centered logo
+            pool = get_pdf_pool()
         except Exception as e:
-            logger.warning("Logo image not found or invalid at %s: %s", logo_path, str(e))
-
-        pdf.set_y(55)
-        pdf.set_fill_color(0, 102, 204)  # Blue header
-        pdf.set_text_color(255, 255, 255)  # White text
-        pdf.set_font("Arial", 'B', 14)
-        pdf.cell(0, 10, "ICareForYou", ln=True, align='C', fill=True)
-        pdf.set_font("Arial", 'I', 10)
-        pdf.set_text_color(0, 0, 0)  # Black text
-        pdf.cell(0, 8, "Hyderabad, Telangana, India | Mobile: +91 9123696969", ln=True, align='C')
-        pdf.ln(10)
-
-        # Horizontal line separator
-        pdf.set_draw_color(0, 102, 204)
-        pdf.line(20, pdf.get_y(), 190, pdf.get_y())
-        pdf.ln(5)
-
-        # Identifying data
-        pdf.set_font("Arial", 'B', 12)
-        pdf.set_fill_color(240, 240, 240)  # Light gray
-        pdf.cell(0, 10, "Identifying Data:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, f"Patient: {patient_data.get('Name', 'Unknown')}", align='L')
-        pdf.multi_cell(0, 10, f"Medical Record Number: {patient_data.get('PatientID', 'Unknown')}", align='L')
-        pdf.multi_cell(0, 10, f"Age: {summary['age']}", align='L')
-        pdf.multi_cell(0, 10, f"Sex: {patient_data.get('Sex', 'Unknown')}", align='L')
-        pdf.multi_cell(0, 10, f"Admission Date: {summary['admission_date']}", align='L')
-        pdf.multi_cell(0, 10, f"Discharge Date: {summary['discharge_date']}", align='L')
-        if summary['is_fallback']:
-            pdf.multi_cell(0, 10, "Note: Generated based on similar patient data", align='L')
-        pdf.ln(5)
-
-        # Service
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Service:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, "General Medicine")
-        pdf.ln(5)
-
-        # Chief complaint
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Chief Complaint:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['chief_complaint'])
-        pdf.ln(5)
-
-        # HPI
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "History of Present Illness:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['hpi'])
-        pdf.ln(5)
-
-        # Past history
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Past Medical/Surgical History:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['past_history'])
-        pdf.ln(5)
-
-        # Social history
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Social History:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['social_history'])
-        pdf.ln(5)
-
-        # Allergies
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Allergies:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['allergies'])
-        pdf.ln(5)
-
-        # Physical exam
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Physical Exam on Admission:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['physical_exam'])
-        pdf.ln(5)
-
-        # Lab data
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Laboratory Data:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['lab_data'])
-        pdf.ln(5)
-
-        # Hospital course
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Hospital Course:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['hospital_course'])
-        pdf.ln(5)
-
-        # Condition at discharge
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Condition at Discharge:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['condition'])
-        pdf.ln(5)
-
-        # Discharge diagnoses
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Discharge Diagnoses:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['diagnosis'])
-        pdf.ln(5)
-
-        # Discharge medications
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Discharge Medications:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['medications'])
-        pdf.ln(5)
-
-        # Diet
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Diet:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['diet'])
-        pdf.ln(5)
-
-        # Activity
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Activity:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['activity'])
-        pdf.ln(5)
-
-        # Follow-up
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Follow-Up:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['follow_up'])
-        pdf.ln(5)
-
-        # Discharge instructions
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Discharge Instructions:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['discharge_instructions'])
-        pdf.ln(5)
-
-        # AI notes
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "AI-Generated Notes:", ln=True, fill=True)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, summary['ai_notes'])
-        pdf.ln(5)
-
-        # Signature
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, f"Signature: {summary['doctor_name']}", ln=True, fill=True)
-        pdf.set_font("Arial", 'I', 12)
-        pdf.cell(0, 10, "Consultant Physician, ICareForYou", ln=True)
-        pdf.ln(10)
-
-        # Horizontal line separator
-        pdf.set_draw_color(0, 102, 204)
-        pdf.line(20, pdf.get_y(), 190, pdf.get_y())
-        pdf.ln(5)
-
-        # Hospital footer
-        pdf.set_fill_color(0, 102, 204)
-        pdf.set_text_color(255, 255, 255)
-        pdf.set_font("Arial", 'B', 14)
-        pdf.cell(0, 10, "ICareForYou", ln=True, align='C', fill=True)
-        pdf.set_font("Arial", 'I', 10)
-        pdf.set_text_color(0, 0, 0)
-        pdf.cell(0, 8, "Hyderabad, Telangana, India | Mobile: +91 9123696969", ln=True, align='C')
-
-        # Use /tmp for PDF storage
-        pdf_file = os.path.join(tempfile.gettempdir(), "discharge_summary.pdf")
-        pdf.output(pdf_file)
-        logger.info("PDF created")
-        return pdf_file
+            logger.warning("PDF process pool unavailable, rendering inline: %s", str(e))
+    in_flight = deque()  # futures for jobs[index:], in order
+    for index, job in enumerate(jobs):
+        while pool is not None and len(in_flight) < PDF_RENDER_PROCESSES * 2 and index + len(in_flight) < len(jobs):
+            try:
+                in_flight.append(pool.submit(render_pdf, *jobs[index + len(in_flight)]))
+            except Exception as e:
+                logger.warning("PDF process pool unavailable, rendering inline: %s", str(e))
+                pool = None
+        yield render_result(job, in_flight.popleft().result if in_flight else lambda: render_pdf(*job))
+
+def render_result(job, render):
+    try:
+        return render()
     except Exception as e:
-        logger.error("Error in generate_pdf: %s", str(e))
-        raise ValueError(f"Failed to generate PDF: {str(e)}")
+        logger.error("Error rendering PDF for patient %s: %s", job[0].get('PatientID'), str(e))
+        return e
 
 @app.route('/')
 def index():
@@ -406,44 +562,356 @@ def add_patient():
     logger.info("Serving add patient page")
     return render_template('add_patient.html')
 
+# Shared patient filters: exact discharge_date, doctor, state and risk_category;
+# name prefix; admitted_/discharged_ from/to date ranges; q for free text
+PATIENT_FILTER_KEYS = ('discharge_date', 'doctor', 'state', 'risk_category', 'name', 'admitted_from',
+                       'admitted_to', 'discharged_from', 'discharged_to', 'q')
+DATE_FILTER_KEYS = ('discharge_date', 'admitted_from', 'admitted_to', 'discharged_from', 'discharged_to')
+DATE_RANGES = {'admitted': Patient.AdmissionDate, 'discharged': Patient.DischargeDate}
+
+# Function to read the patient filters from query arguments or a JSON object,
+# with dates parsed; raises ValueError on a malformed date
+def read_patient_filters(args):
+    filters = {key: args.get(key) for key in PATIENT_FILTER_KEYS}
+    for key in DATE_FILTER_KEYS:
+        filters[key] = parse_date(filters[key])
+    return filters
+
+# Function to match free text (filter q) against the chief complaint, allergies and narratives
+def apply_text_filter(query, terms):
+    if engine.dialect.name == 'sqlite':
+        match = match_clause(terms)
+        if match is None:
+            return query
+        # A join rather than IN (...): ordered by fts.c.rowid, SQLite streams the
+        # matches newest first and stops once a page is full
+        return query.join(fts, fts.c.rowid == Patient.PatientID).filter(match)
+    # No FTS5 index on other databases: every word must appear in the complaint or allergies
+    words = re.findall(r'\w+', terms)
+    if not words:
+        return query
+    return query.filter(and_(*(or_(Patient.ChiefComplaint.ilike(f'%{word}%'), Patient.Allergies.ilike(f'%{word}%'))
+                               for word in words)))
+
+# Column to order and page /search results by: the FTS rowid (the same PatientID)
+# when the text index is joined, so matches can be read in index order
+def search_order_column(filters):
+    if filters.get('q') and engine.dialect.name == 'sqlite' and match_clause(filters['q']) is not None:
+        return fts.c.rowid
+    return Patient.PatientID
+
+# Apply the shared patient filters to a Query or select()
+def apply_patient_filters(query, filters):
+    if filters.get('discharge_date'):
+        query = query.filter(Patient.DischargeDate == filters['discharge_date'])
+    if filters.get('doctor'):
+        query = query.filter(Patient.DoctorName == filters['doctor'])
+    if filters.get('state'):
+        query = query.filter(Patient.State == filters['state'])
+    if filters.get('risk_category'):
+        query = query.filter(Patient.RiskCategory == filters['risk_category'])
+    if filters.get('name'):
+        # Case-insensitive prefix, written as a range so idx_patients_name_lower serves it
+        prefix = filters['name'].lower()
+        query = query.filter(func.lower(Patient.Name) >= prefix,
+                             func.lower(Patient.Name) < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    for key, column in DATE_RANGES.items():
+        # Inclusive range scans on the date indexes; unknown (NULL) dates never match
+        if filters.get(f'{key}_from'):
+            query = query.filter(column >= filters[f'{key}_from'])
+        if filters.get(f'{key}_to'):
+            query = query.filter(column <= filters[f'{key}_to'])
+    if filters.get('q'):
+        query = apply_text_filter(query, filters['q'])
+    return query
+
+# Columns rendered by the view_database table
+VIEW_DATABASE_COLUMNS = [
+    Patient.PatientID, Patient.Name, Patient.Sex, Patient.State, Patient.GeneralHealth,
+    Patient.HasChronicCondition, Patient.HospitalStayDuration, Patient.RiskCategory,
+    Patient.DoctorName, Patient.Allergies, Patient.ChiefComplaint, Patient.AdmissionDate,
+    Patient.DischargeDate, Patient.TestReports
+]
+
 @app.route('/view_database')
 def view_database():
     logger.info("Serving view database page")
     session = SessionLocal()
     try:
-        page = int(request.args.get('page', 1))
         per_page = 100
-        offset = (page - 1) * per_page
-        patients = session.query(Patient).order_by(Patient.PatientID.desc()).offset(offset).limit(per_page).all()
-        total_patients = session.query(Patient).count()
-        has_more = offset + len(patients) < total_patients
-        logger.info("Fetched %d patients for view_database, page %d, has_more: %s", len(patients), page, has_more)
-        return jsonify({
-            'patients': [{
-                'PatientID': p.PatientID,
-                'Name': p.Name,
-                'Sex': p.Sex,
-                'State': p.State,
-                'GeneralHealth': p.GeneralHealth,
-                'HasChronicCondition': p.HasChronicCondition,
-                'HospitalStayDuration': p.HospitalStayDuration,
-                'RiskCategory': p.RiskCategory,
-                'DoctorName': p.DoctorName,
-                'Allergies': p.Allergies,
-                'ChiefComplaint': p.ChiefComplaint,
-                'AdmissionDate': p.AdmissionDate,
-                'DischargeDate': p.DischargeDate,
-                'TestReports': p.TestReports
-            } for p in patients],
-            'has_more': has_more,
-            'next_page': page + 1
-        }) if request.args.get('ajax') else render_template('view_database.html', patients=patients, has_more=has_more, next_page=page + 1)
+        # Keyset pagination: each page continues below the last PatientID the client saw
+        before = request.args.get('before', type=int)
+        query = session.query(*VIEW_DATABASE_COLUMNS)
+        if before is not None:
+            query = query.filter(Patient.PatientID < before)
+        patients = query.order_by(Patient.PatientID.desc()).limit(per_page + 1).all()
+        has_more = len(patients) > per_page
+        patients = patients[:per_page]
+        next_before = patients[-1].PatientID if patients else None
+        logger.info("Fetched %d patients for view_database, before %s, has_more: %s", len(patients), before, has_more)
+        if request.args.get('ajax'):
+            return jsonify({
+                'patients': [dict(p._mapping) for p in patients],
+                'has_more': has_more,
+                'next_before': next_before
+            })
+        return render_template('view_database.html', patients=patients, has_more=has_more, next_before=next_before,
+                               total_patients=patient_count(session))
     except Exception as e:
         logger.error("Error fetching patients for view_database: %s", str(e))
         return jsonify({'error': 'Failed to load patient database'}), 500
     finally:
         session.close()
 
+SEARCH_PER_PAGE = 50
+SEARCH_MAX_PER_PAGE = 200
+
+@app.route('/search')
+def search_patients():
+    try:
+        filters = read_patient_filters(request.args)
+    except ValueError:
+        return jsonify({'error': '⚠️ Dates must be in YYYY-MM-DD format.'}), 400
+    per_page = max(1, min(request.args.get('per_page', SEARCH_PER_PAGE, type=int), SEARCH_MAX_PER_PAGE))
+    before = request.args.get('before', type=int)
+    session = SessionLocal()
+    try:
+        # Same keyset pagination and row shape as /view_database
+        query = apply_patient_filters(session.query(*VIEW_DATABASE_COLUMNS), filters)
+        order_column = search_order_column(filters)
+        if before is not None:
+            query = query.filter(order_column < before)
+        patients = query.order_by(order_column.desc()).limit(per_page + 1).all()
+        has_more = len(patients) > per_page
+        patients = patients[:per_page]
+        logger.info("Search %s returned %d patients", {k: v for k, v in filters.items() if v}, len(patients))
+        return jsonify({
+            'patients': [dict(p._mapping) for p in patients],
+            'has_more': has_more,
+            'next_before': patients[-1].PatientID if patients else None
+        })
+    except Exception as e:
+        logger.error("Error searching patients: %s", str(e))
+        return jsonify({'error': 'Failed to search patients'}), 500
+    finally:
+        session.close()
+
+DISCHARGES_PER_PAGE = 500
+DISCHARGES_MAX_PER_PAGE = 5000
+# Filters with a (column, DischargeDate) index, so a window stays a single range scan
+DISCHARGE_FILTERS = {'doctor': Patient.DoctorName, 'risk_category': Patient.RiskCategory}
+
+# Discharges dated from..to (inclusive; from defaults to today, to to from), in
+# discharge order. Only that slice of the discharge date index is read, so a day's
+# list costs the same however much history the table holds. Further pages continue
+# after the last row seen: after=YYYY-MM-DD:PatientID, as returned in next_after.
+@app.route('/discharges')
+def discharges():
+    try:
+        start = parse_date(request.args.get('from')) or date.today()
+        end = parse_date(request.args.get('to')) or start
+        after = request.args.get('after')
+        if after:
+            after_date, after_id = after.split(':')
+            after = (parse_date(after_date), int(after_id))
+    except ValueError:
+        return jsonify({'error': '⚠️ from and to must be YYYY-MM-DD dates, and after YYYY-MM-DD:PatientID.'}), 400
+    if end < start:
+        return jsonify({'error': '⚠️ to must not be before from.'}), 400
+    per_page = max(1, min(request.args.get('per_page', DISCHARGES_PER_PAGE, type=int), DISCHARGES_MAX_PER_PAGE))
+    session = SessionLocal()
+    try:
+        query = session.query(*VIEW_DATABASE_COLUMNS).filter(Patient.DischargeDate.between(start, end))
+        for key, column in DISCHARGE_FILTERS.items():
+            if request.args.get(key):
+                query = query.filter(column == request.args[key])
+        if after:
+            query = query.filter(tuple_(Patient.DischargeDate, Patient.PatientID) > after)
+        patients = query.order_by(Patient.DischargeDate, Patient.PatientID).limit(per_page + 1).all()
+        has_more = len(patients) > per_page
+        patients = patients[:per_page]
+        logger.info("Fetched %d discharges from %s to %s", len(patients), start, end)
+        return jsonify({
+            'from': start,
+            'to': end,
+            'patients': [dict(p._mapping) for p in patients],
+            'has_more': has_more,
+            'next_after': f"{patients[-1].DischargeDate.isoformat()}:{patients[-1].PatientID}" if has_more else None
+        })
+    except Exception as e:
+        logger.error("Error fetching discharges: %s", str(e))
+        return jsonify({'error': 'Failed to fetch discharges'}), 500
+    finally:
+        session.close()
+
+# Dashboard statistics, served from the rollup tables (analytics.py); they are
+# built from the patients table the first time the app starts without them
+if not is_pool_process():
+    build_missing_rollups(engine)
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 731
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the statistics rollups from the patients table."""
+    with engine.begin() as connection:
+        rebuild_rollups(connection)
+    click.echo("Rebuilt statistics rollups")
+
+@app.route('/stats')
+def stats():
+    session = SessionLocal()
+    try:
+        return jsonify(overall_stats(session))
+    except Exception as e:
+        logger.error("Error reading stats: %s", str(e))
+        return jsonify({'error': 'Failed to load statistics'}), 500
+    finally:
+        session.close()
+
+@app.route('/stats/doctors')
+def stats_doctors():
+    session = SessionLocal()
+    try:
+        return jsonify({'doctors': doctor_stats(session)})
+    except Exception as e:
+        logger.error("Error reading doctor stats: %s", str(e))
+        return jsonify({'error': 'Failed to load statistics'}), 500
+    finally:
+        session.close()
+
+# Length-of-stay histogram, for every patient or one doctor's
+@app.route('/stats/length_of_stay')
+def stats_length_of_stay():
+    doctor = request.args.get('doctor')
+    session = SessionLocal()
+    try:
+        histogram = stay_histogram(session, doctor)
+        return jsonify({
+            'doctor': doctor,
+            'histogram': [{'stay_days': stay, 'patients': histogram[stay]} for stay in sorted(histogram)],
+            'stay_days': stay_percentiles(histogram)
+        })
+    except Exception as e:
+        logger.error("Error reading length of stay stats: %s", str(e))
+        return jsonify({'error': 'Failed to load statistics'}), 500
+    finally:
+        session.close()
+
+# Daily discharge counts from..to (default: the last 30 days), optionally for one doctor
+@app.route('/stats/discharges')
+def stats_discharges():
+    try:
+        end = parse_date(request.args.get('to')) or date.today()
+        start = parse_date(request.args.get('from')) or end - timedelta(days=STATS_DEFAULT_DAYS - 1)
+    except ValueError:
+        return jsonify({'error': '⚠️ from and to must be YYYY-MM-DD dates.'}), 400
+    if end < start or (end - start).days >= STATS_MAX_DAYS:
+        return jsonify({'error': f'⚠️ from must be on or before to, and at most {STATS_MAX_DAYS} days earlier.'}), 400
+    doctor = request.args.get('doctor')
+    session = SessionLocal()
+    try:
+        return jsonify({'from': start, 'to': end, 'doctor': doctor, 'days': discharge_series(session, start, end, doctor)})
+    except Exception as e:
+        logger.error("Error reading discharge stats: %s", str(e))
+        return jsonify({'error': 'Failed to load statistics'}), 500
+    finally:
+        session.close()
+
+# Streaming export of the patients table
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'patients.ndjson'),
+    'csv': ('text/csv', 'patients.csv'),
+    'parquet': ('application/vnd.apache.parquet', 'patients.parquet')
+}
+EXPORT_CHUNK_SIZE = 5000
+
+# Yield lists of plain row tuples from a server-side cursor, one chunk at a time
+def iter_patient_chunks(filters):
+    session = SessionLocal()
+    try:
+        stmt = apply_patient_filters(select(*Patient.__table__.columns), filters).order_by(Patient.PatientID)
+        result = session.execute(stmt.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_SIZE))
+        for rows in result.partitions():
+            yield [tuple(row) for row in rows]
+    finally:
+        session.close()
+
+def export_ndjson(columns, chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows)
+
+def export_csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that hands back what was written since the last drain
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def export_parquet(columns, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    # Fix the schema from the model so an all-null chunk can't change a column's type
+    arrow_types = {int: pa.int64(), bool: pa.bool_(), float: pa.float64(), str: pa.string(), date: pa.date32()}
+    schema = pa.schema([(column.name, arrow_types.get(column.type.python_type, pa.string()))
+                        for column in Patient.__table__.columns if column.name in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in chunks:
+        # One row group per chunk
+        writer.write_table(pa.Table.from_pydict({name: list(values) for name, values in zip(columns, zip(*rows))}, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+@app.route('/export')
+def export_patients():
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"⚠️ Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}."}), 400
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({'error': '⚠️ Parquet export requires pyarrow to be installed.'}), 501
+    try:
+        filters = read_patient_filters(request.args)
+    except ValueError:
+        return jsonify({'error': '⚠️ Dates must be in YYYY-MM-DD format.'}), 400
+    logger.info("Exporting patients as %s with filters %s", export_format, filters)
+
+    columns = [column.name for column in Patient.__table__.columns]
+    exporter = {'ndjson': export_ndjson, 'csv': export_csv, 'parquet': export_parquet}[export_format]
+    mimetype, download_name = EXPORT_FORMATS[export_format]
+    return Response(exporter(columns, iter_patient_chunks(filters)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={download_name}'})
+
 @app.route('/preview', methods=['POST'])
 def preview():
     patient_id = request.form.get('patient_id')
@@ -456,12 +924,7 @@ def preview():
 
     patient_data = get_patient_data(patient_id)
     if patient_data:
-        disease, complaint, age = map_disease_and_age(
-            patient_data.get('GeneralHealth', 'Unknown'),
-            patient_data.get('HasChronicCondition', False),
-            patient_data.get('RiskCategory', 'Unknown')
-        )
-        patient_ids = get_patient_ids()
+        disease, complaint, age = resolve_disease(patient_data)
         return jsonify({
             'name': patient_data.get('Name', 'Unknown'),
             'sex': patient_data.get('Sex', 'Unknown'),
@@ -471,119 +934,481 @@ def preview():
             'chief_complaint': patient_data.get('ChiefComplaint', complaint),
             'stay_duration': patient_data.get('HospitalStayDuration', 'Unknown'),
             'chronic': patient_data.get('HasChronicCondition', False),
-            'is_fallback': str(patient_data.get('PatientID', 'Unknown')) not in patient_ids,
+            'is_fallback': not patient_exists(patient_data.get('PatientID')),
             'doctor_name': patient_data.get('DoctorName', 'Dr. Anita Sharma'),
             'allergies': patient_data.get('Allergies', 'None'),
-            'admission_date': patient_data.get('AdmissionDate', 'Unknown'),
-            'discharge_date': patient_data.get('DischargeDate', 'Unknown'),
+            'admission_date': patient_data.get('AdmissionDate') or 'Unknown',
+            'discharge_date': patient_data.get('DischargeDate') or 'Unknown',
             'test_reports': patient_data.get('TestReports', '')
         })
     logger.error("No patient data available for ID: %s", patient_id)
     return jsonify({'error': f'⚠️ No patient found with ID {patient_id}. Please check the ID or add the patient.'}), 404
 
+class PatientNotFoundError(LookupError):
+    status_code = 404
+
+# Function to run the whole /generate pipeline; report(stage) is called as each stage starts
+def run_generate(report, patient_id, detail_level, doctor_notes, discharge_date):
+    report('fetching_patient')
+    patient_data = get_patient_data(patient_id)
+    if not patient_data:
+        logger.error("No patient data available for ID: %s", patient_id)
+        raise PatientNotFoundError(f'⚠️ No patient found with ID {patient_id}. Please check the ID or add the patient.')
+
+    cache_key = summary_cache_key(patient_data, detail_level, doctor_notes, discharge_date)
+    summary = summary_cache.get(f"{cache_key}:summary")
+    pdf_bytes = summary_cache.get(f"{cache_key}:pdf") if summary is not None else None
+    if pdf_bytes is not None:
+        logger.info("Serving cached summary for patient ID: %s", patient_id)
+        return {'summary': summary, 'pdf_file': artifact_store.put(pdf_bytes)}
+
+    report('ai_notes')
+    logger.info("Generating summary with AI for patient ID: %s", patient_id)
+    summary = generate_summary(patient_data, detail_level, doctor_notes, discharge_date)
+    report('rendering_pdf')
+    logger.info("Summary generated, creating PDF")
+    pdf_bytes = generate_pdf(patient_data, summary)
+    pdf_token = artifact_store.put(pdf_bytes)
+    logger.info("PDF stored as artifact %s", pdf_token)
+    if summary['ai_notes_failed']:
+        # Fallback notes from a transient failure; the next request should retry the model
+        logger.info("AI notes fell back for patient ID: %s, not caching the summary", patient_id)
+    else:
+        tag = summary_cache_tag(patient_data['PatientID'])
+        summary_cache.set(f"{cache_key}:summary", summary, tag=tag)
+        summary_cache.set(f"{cache_key}:pdf", pdf_bytes, tag=tag)
+    report('pdf_ready')
+    return {'summary': summary, 'pdf_file': pdf_token}
+
+# /generate queues the work and returns a job ID straight away; pass wait=1 to
+# run it inline and get the summary in the response instead
 @app.route('/generate', methods=['POST'])
 def generate():
     logger.info("Received generate request")
     patient_id = request.form.get('patient_id')
     detail_level = request.form.get('detail_level')
     doctor_notes = request.form.get('doctor_notes', '')
-    discharge_date = request.form.get('discharge_date', datetime.now().strftime('%Y-%m-%d'))
 
     try:
         patient_id_int = int(patient_id)
-        patient_id_str = str(patient_id_int)
     except (ValueError, TypeError):
         logger.error("Invalid patient ID format: %s", patient_id)
         return jsonify({'error': '⚠️ Invalid Patient ID. Please enter a valid number.'}), 400
+    try:
+        discharge_date = parse_date(request.form.get('discharge_date')) or date.today()
+    except ValueError:
+        return jsonify({'error': '⚠️ Discharge date must be in YYYY-MM-DD format.'}), 400
 
-    patient_data = get_patient_data(patient_id)
+    args = (patient_id_int, detail_level, doctor_notes, discharge_date)
+    if request.form.get('wait') not in (None, '', '0', 'false'):
+        try:
+            return jsonify(run_generate(lambda stage: None, *args))
+        except PatientNotFoundError as e:
+            return jsonify({'error': str(e)}), 404
+        except ValueError as ve:
+            logger.error("ValueError in processing: %s", str(ve))
+            return jsonify({'error': str(ve)}), 500
+        except Exception as e:
+            logger.error("Unexpected error in processing: %s", str(e))
+            return jsonify({'error': f'Failed to generate summary: {str(e)}'}), 500
+
+    try:
+        job_id = generate_jobs.submit(run_generate, *args)
+    except JobQueueFullError:
+        logger.warning("Generate queue full, rejecting request for patient ID: %s", patient_id)
+        return jsonify({'error': '⚠️ The server is busy generating other summaries. Please try again shortly.'}), 503
+    logger.info("Queued generate job %s for patient ID: %s", job_id, patient_id)
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/jobs/{job_id}',
+        'events_url': f'/jobs/{job_id}/events'
+    }), 202
+
+# Server-Sent Events stream of a patient's AI notes: 'token' events as text
+# decodes, then 'done' carrying the final notes
+@app.route('/ai_notes/stream')
+def stream_notes():
+    patient_id = request.args.get('patient_id')
+    try:
+        patient_id_int = int(patient_id)
+    except (ValueError, TypeError):
+        return jsonify({'error': '⚠️ Invalid Patient ID. Please enter a valid number.'}), 400
+    patient_data = get_patient_data(patient_id_int)
     if not patient_data:
-        logger.error("No patient data available for ID: %s", patient_id)
         return jsonify({'error': f'⚠️ No patient found with ID {patient_id}. Please check the ID or add the patient.'}), 404
+    disease, _, _ = resolve_disease(patient_data)
+    params = (disease, patient_data.get('GeneralHealth', 'Unknown'), patient_data.get('RiskCategory', 'Unknown'),
+              patient_data.get('HospitalStayDuration', 'Unknown'))
+
+    def stream():
+        for event, text in stream_ai_notes(*params):
+            payload = {'text': text} if event == 'token' else {'ai_notes': text}
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Job status as JSON; result holds the summary and pdf_file once status is done
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+# Server-Sent Events stream of a job's stages, ending with a done or failed event
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    if job_store.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        last = None
+        deadline = time.monotonic() + JOB_EVENTS_TIMEOUT
+        while time.monotonic() < deadline:
+            job = job_store.get(job_id)
+            if job is None:
+                return
+            state = (job['status'], job['stage'])
+            if state != last:
+                last = state
+                event = job['status'] if job['status'] in ('done', 'failed') else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(job)}\n\n"
+                if event != 'progress':
+                    return
+            else:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+            job_store.wait_for_change(JOB_EVENTS_POLL)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/generate_batch', methods=['POST'])
+def generate_batch():
+    logger.info("Received batch generate request")
+    payload = request.get_json(silent=True) or {}
+    patient_ids = payload.get('patient_ids') or []
+    detail_level = payload.get('detail_level')
+    doctor_notes = payload.get('doctor_notes', '')
 
     try:
-        logger.info("Generating summary with AI for patient ID: %s", patient_id)
-        summary = generate_summary(patient_data, detail_level, doctor_notes, discharge_date)
-        logger.info("Summary generated, creating PDF")
-        pdf_file = generate_pdf(patient_data, summary)
-        logger.info("PDF created at: %s", pdf_file)
-        return jsonify({'summary': summary, 'pdf_file': 'discharge_summary.pdf'})
-    except ValueError as ve:
-        logger.error("ValueError in processing: %s", str(ve))
-        return jsonify({'error': str(ve)}), 500
+        patient_ids = [int(pid) for pid in patient_ids]
+    except (ValueError, TypeError):
+        return jsonify({'error': '⚠️ patient_ids must be a list of numbers.'}), 400
+    try:
+        filters = read_patient_filters(payload.get('filter') or {})
+        discharge_date = parse_date(payload.get('discharge_date'))
+    except (ValueError, AttributeError):
+        return jsonify({'error': '⚠️ filter must be an object, with dates in YYYY-MM-DD format.'}), 400
+    if not patient_ids and not any(filters.values()):
+        return jsonify({'error': '⚠️ Provide patient_ids or a filter (discharge_date, doctor, state).'}), 400
+
+    # Load every requested patient in one query
+    session = SessionLocal()
+    try:
+        query = apply_patient_filters(patient_query(session), filters)
+        if patient_ids:
+            query = query.filter(Patient.PatientID.in_(patient_ids))
+        patients = [patient_to_dict(*row) for row in query.order_by(Patient.PatientID).limit(BATCH_MAX_PATIENTS + 1).all()]
     except Exception as e:
-        logger.error("Unexpected error in processing: %s", str(e))
-        return jsonify({'error': f'Failed to generate summary: {str(e)}'}), 500
+        logger.error("Error loading patients for batch: %s", str(e))
+        return jsonify({'error': 'Failed to load patients'}), 500
+    finally:
+        session.close()
+    if len(patients) > BATCH_MAX_PATIENTS:
+        return jsonify({'error': f'⚠️ Batch is limited to {BATCH_MAX_PATIENTS} patients.'}), 400
 
-@app.route('/download/<filename>')
-def download(filename):
-    logger.info("Downloading %s", filename)
+    found_ids = {p['PatientID'] for p in patients}
+    results = [{'patient_id': pid, 'status': 'not_found'} for pid in dict.fromkeys(patient_ids) if pid not in found_ids]
+
+    # AI stage: one bulk call covering each distinct prompt
+    ai_inputs, rule_inputs = {}, []
+    for p in patients:
+        disease, complaint, _ = resolve_disease(p)
+        ai_inputs[p['PatientID']] = (disease, p.get('GeneralHealth', 'Unknown'), p.get('RiskCategory', 'Unknown'), p.get('HospitalStayDuration', 'Unknown'))
+        rule_inputs.append({'disease': disease, 'HasChronicCondition': p.get('HasChronicCondition', False),
+                            'RiskCategory': p.get('RiskCategory', 'Unknown'), 'GeneralHealth': p.get('GeneralHealth', 'Unknown'),
+                            'chief_complaint': p.get('ChiefComplaint', 'Unknown') or complaint})
+    ai_fallbacks = set()
+    ai_notes = generate_ai_notes_many(ai_inputs.values(), fallbacks=ai_fallbacks)
+
+    # Rule-table sections for the whole batch in one vectorised pass
+    batch_sections = clinical_rules.sections_frame(pd.DataFrame(rule_inputs)).to_dict('records') if rule_inputs else []
+
+    # Template stage
+    jobs = []
+    for p, sections in zip(patients, batch_sections):
+        patient_discharge_date = discharge_date or p.get('DischargeDate') or date.today()
+        try:
+            summary = generate_summary(p, detail_level, doctor_notes, patient_discharge_date,
+                                       ai_notes=ai_notes[ai_inputs[p['PatientID']]], is_fallback=False, sections=sections,
+                                       ai_notes_failed=ai_inputs[p['PatientID']] in ai_fallbacks)
+            jobs.append((p, summary))
+        except ValueError as ve:
+            results.append({'patient_id': p['PatientID'], 'status': 'error', 'error': str(ve)})
+
+    # PDF stage: each PDF goes into the archive as it is rendered and is then
+    # dropped; big archives spill from memory to a temporary file
+    archive = tempfile.SpooledTemporaryFile(max_size=BATCH_ARCHIVE_SPOOL_BYTES)
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for (p, summary), pdf_bytes in zip(jobs, render_pdfs(jobs)):
+            if isinstance(pdf_bytes, Exception):
+                results.append({'patient_id': p['PatientID'], 'status': 'error', 'error': f'Failed to generate PDF: {str(pdf_bytes)}'})
+                continue
+            pdf_name = f"discharge_summary_{p['PatientID']}.pdf"
+            # PDF page streams are already deflated, so store them as-is
+            zf.writestr(pdf_name, pdf_bytes, compress_type=zipfile.ZIP_STORED)
+            results.append({'patient_id': p['PatientID'], 'status': 'ok', 'pdf_file': pdf_name})
+        zf.writestr('manifest.json', json.dumps({'results': results}, indent=2))
+    archive_size = archive.tell()
+    archive.seek(0)
+
+    succeeded = sum(1 for r in results if r['status'] == 'ok')
+    logger.info("Batch generated %d of %d summaries", succeeded, len(results))
+    response = send_file(archive, mimetype='application/zip', as_attachment=True, download_name='discharge_summaries.zip')
+    response.content_length = archive_size
+    response.headers['X-Batch-Succeeded'] = str(succeeded)
+    response.headers['X-Batch-Failed'] = str(len(results) - succeeded)
+    return response
+
+@app.route('/download/<token>')
+def download(token):
+    logger.info("Downloading %s", token)
     try:
-        file_path = os.path.join(tempfile.gettempdir(), filename)
-        if not os.path.exists(file_path):
-            logger.error("File not found: %s", file_path)
+        artifact = artifact_store.get(token)
+        if artifact is None:
+            logger.error("Artifact not found or expired: %s", token)
             return jsonify({'error': 'File not found'}), 404
-        return send_file(file_path, as_attachment=True, download_name='discharge_summary.pdf')
+        # A token always names the same bytes, so it doubles as a strong ETag
+        cache_args = dict(etag=token, max_age=artifact_store.ttl, immutable=True, mimetype='application/pdf',
+                          as_attachment=True, download_name='discharge_summary.pdf')
+        if artifact.path:
+            # Spilled copy: served by path, so it can be sendfile'd or offloaded to the front server
+            return send_cached_file(artifact.path, **cache_args)
+        # BytesIO shares the stored bytes rather than copying them
+        return send_cached_file(data=artifact.data, **cache_args)
     except Exception as e:
-        logger.error("Error downloading file %s: %s", filename, str(e))
+        logger.error("Error downloading file %s: %s", token, str(e))
         return jsonify({'error': 'File not found'}), 404
 
-@app.route('/uploads/<filename>')
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify({'ai_notes': ai_notes_cache.stats(), 'summaries': summary_cache.stats(), 'model': model_manager.status})
+
+# Stored reports and thumbnails are named by their content hash, so the hash is
+# a strong ETag and the browser never needs to revalidate them
+CONTENT_ADDRESSED_UPLOAD = re.compile(r'^reports/(?:thumbs/)?[0-9a-f]{2}/([0-9a-f]{64})\.[a-z]+$')
+
+@app.route('/uploads/<path:filename>')
 def serve_uploaded_file(filename):
     logger.info("Serving uploaded file: %s", filename)
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(file_path):
-            logger.error("File not found: %s", file_path)
+        # safe_join refuses paths that escape the upload folder
+        file_path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+        if file_path is None or not os.path.isfile(file_path):
+            logger.error("File not found: %s", file_path or filename)
             return jsonify({'error': 'File not found'}), 404
-        return send_file(file_path)
+        match = CONTENT_ADDRESSED_UPLOAD.match(filename)
+        if match:
+            return send_cached_file(file_path, etag=match.group(1), max_age=ONE_YEAR, immutable=True)
+        return send_cached_file(file_path)
     except Exception as e:
         logger.error("Error serving file %s: %s", filename, str(e))
         return jsonify({'error': 'File not found'}), 404
 
+def report_to_dict(test_report):
+    return {
+        'report_id': test_report.ReportID,
+        'file_name': test_report.FileName,
+        'url': f"/{test_report.Path}",
+        'size': test_report.Size,
+        'status': test_report.Status,
+        'page_count': test_report.PageCount,
+        'thumbnail_url': f"/{test_report.ThumbnailPath}" if test_report.ThumbnailPath else None,
+        'uploaded_at': test_report.UploadedAt
+    }
+
+# Function to stream an upload into the report store and record it for the patient.
+# The caller commits, then queues extraction with queue_report_processing().
+def store_test_report(session, patient, stream, filename):
+    stored = report_store.save(stream, os.path.splitext(filename)[1], max_bytes=app.config['MAX_CONTENT_LENGTH'])
+    test_report = TestReport(
+        PatientID=patient.PatientID,
+        FileName=secure_filename(filename) or 'report',
+        ContentHash=stored.content_hash,
+        Path=f"{REPORTS_URL_PREFIX}/{stored.key}",
+        Size=stored.size,
+        Status='pending',
+        UploadedAt=datetime.now().isoformat(timespec='seconds')
+    )
+    session.add(test_report)
+    patient.TestReports = test_report.Path
+    session.flush()
+    logger.info("Stored test report %s for PatientID %s (%d bytes%s)", filename, patient.PatientID, stored.size,
+                '' if stored.created else ', identical file already stored')
+    return test_report
+
+# Function to fill in a stored report's page count and thumbnail; runs on report_jobs
+def process_test_report(report, report_id):
+    session = SessionLocal()
+    try:
+        test_report = session.get(TestReport, report_id)
+        if test_report is None:
+            return None
+        # An identical file uploaded earlier has already been processed
+        done = session.query(TestReport).filter(TestReport.ContentHash == test_report.ContentHash,
+                                                TestReport.Status == 'ready').first()
+        if done is not None:
+            test_report.PageCount, test_report.ThumbnailPath = done.PageCount, done.ThumbnailPath
+        else:
+            report('extracting')
+            page_count, thumbnail_key = report_store.extract(test_report.Path[len(REPORTS_URL_PREFIX) + 1:],
+                                                             test_report.ContentHash)
+            test_report.PageCount = page_count
+            test_report.ThumbnailPath = f"{REPORTS_URL_PREFIX}/{thumbnail_key}" if thumbnail_key else None
+        test_report.Status = 'ready'
+        session.commit()
+        return report_to_dict(test_report)
+    except Exception as e:
+        session.rollback()
+        logger.error("Error processing test report %s: %s", report_id, str(e))
+        session.query(TestReport).filter(TestReport.ReportID == report_id).update({'Status': 'failed'})
+        session.commit()
+        raise
+    finally:
+        SessionLocal.remove()
+
+# Function to queue extraction for a committed report. When the queue is full the
+# report stays pending until `flask process-reports` picks it up.
+def queue_report_processing(report_id):
+    try:
+        return report_jobs.submit(process_test_report, report_id)
+    except JobQueueFullError:
+        logger.warning("Report queue full, report %s left pending", report_id)
+        return None
+
+@app.cli.command('process-reports')
+def process_reports_command():
+    """Extract page counts and thumbnails for reports still pending (e.g. after a restart)."""
+    session = SessionLocal()
+    try:
+        report_ids = [report_id for (report_id,) in session.query(TestReport.ReportID).filter(TestReport.Status == 'pending')]
+    finally:
+        session.close()
+    for report_id in report_ids:
+        process_test_report(lambda stage: None, report_id)
+    click.echo(f"Processed {len(report_ids)} pending reports")
+
+def report_upload_response(message, test_report, job_id):
+    response = {'message': message, 'report': report_to_dict(test_report)}
+    if job_id:
+        response.update(job_id=job_id, status_url=f"/jobs/{job_id}")
+    return jsonify(response)
+
+@app.route('/patients/<int:patient_id>/reports')
+def list_test_reports(patient_id):
+    session = SessionLocal()
+    try:
+        if not patient_exists(patient_id):
+            return jsonify({'error': f'⚠️ No patient found with ID {patient_id}'}), 404
+        reports = session.query(TestReport).filter(TestReport.PatientID == patient_id).order_by(TestReport.ReportID).all()
+        return jsonify({'patient_id': patient_id, 'reports': [report_to_dict(r) for r in reports]})
+    finally:
+        session.close()
+
+# Raw upload: the request body is the file itself (?filename= names it), copied to
+# the store as it arrives instead of being parsed as a multipart form first
+@app.route('/patients/<int:patient_id>/reports', methods=['POST'])
+def upload_test_report_stream(patient_id):
+    filename = request.args.get('filename', '')
+    if not allowed_file(filename):
+        return jsonify({'error': '⚠️ Invalid file type. Only JPG, PNG, or PDF allowed.'}), 400
+    session = SessionLocal()
+    try:
+        patient = session.get(Patient, patient_id)
+        if not patient:
+            return jsonify({'error': f'⚠️ No patient found with ID {patient_id}'}), 404
+        test_report = store_test_report(session, patient, request.stream, filename)
+        session.commit()
+        invalidate_patient_summaries(patient_id)
+        job_id = queue_report_processing(test_report.ReportID)
+        return report_upload_response(f"Test report uploaded for Patient ID {patient_id}", test_report, job_id)
+    except (UploadTooLargeError, RequestEntityTooLarge):
+        session.rollback()
+        return jsonify({'error': f"⚠️ File too large (max {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB)"}), 413
+    except Exception as e:
+        session.rollback()
+        logger.error("Error uploading test report: %s", str(e))
+        return jsonify({'error': f"Failed to upload test report: {str(e)}"}), 500
+    finally:
+        session.close()
+
+# /add_patient form fields -> (Patient column, default when the field is missing)
+PATIENT_FIELDS = {
+    'name': ('Name', 'Unknown'),
+    'sex': ('Sex', 'Unknown'),
+    'state': ('State', 'Unknown'),
+    'general_health': ('GeneralHealth', 'Unknown'),
+    'chronic_condition': ('HasChronicCondition', 'No'),
+    'stay_duration': ('HospitalStayDuration', 1),
+    'risk_category': ('RiskCategory', 'Unknown'),
+    'doctor_name': ('DoctorName', 'Dr. Anita Sharma'),
+    'allergies': ('Allergies', 'None'),
+    'admission_date': ('AdmissionDate', None),
+    'discharge_date': ('DischargeDate', None),
+    'chief_complaint': ('ChiefComplaint', 'Unknown')
+}
+
+# Function to build Patient column values from a form, JSON object or CSV row.
+# Keys may be the form field names or the Patient column names (as in /export);
+# PatientID is never taken from the input, the database assigns it, and the
+# rows are marked as added through the app so a CSV sync won't overwrite them.
+def patient_values(fields):
+    values = {}
+    for field, (column, default) in PATIENT_FIELDS.items():
+        value = fields.get(field)
+        if value is None:
+            value = fields.get(column)
+        values[column] = default if value is None else value
+    values['HasChronicCondition'] = str(values['HasChronicCondition']).strip().lower() in ('yes', 'true', '1')
+    values['HospitalStayDuration'] = int(values['HospitalStayDuration'])
+    values['AdmissionDate'] = parse_date(values['AdmissionDate'])
+    values['DischargeDate'] = parse_date(values['DischargeDate'])
+    values['Origin'] = ORIGIN_APP
+    return values
+
 @app.route('/add_patient', methods=['POST'])
 def add_patient_post():
     logger.info("Received add patient request")
+    try:
+        values = patient_values(request.form)
+    except (TypeError, ValueError) as e:
+        logger.error("Invalid patient fields: %s", str(e))
+        return jsonify({'error': '⚠️ Stay duration must be a number and dates in YYYY-MM-DD format.'}), 400
     session = SessionLocal()
     try:
-        # Get next PatientID
-        max_id = session.query(func.max(Patient.PatientID)).scalar() or 0
-        next_id = max_id + 1
+        # Insert first so the database allocates the PatientID; concurrent adds
+        # from other workers can't be handed the same one
+        new_patient = Patient(**values, TestReports='')
+        session.add(new_patient)
+        session.flush()
+        next_id = new_patient.PatientID
+        add_to_rollups(session.connection(), [values])
 
         # Handle file upload
-        test_report_path = ''
+        test_report = None
         if 'test_report' in request.files:
             file = request.files['test_report']
             if file and allowed_file(file.filename):
-                filename = secure_filename(f"{next_id}_{file.filename}")
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                test_report_path = f"uploads/{filename}"
-                logger.info("Test report uploaded: %s", test_report_path)
+                test_report = store_test_report(session, new_patient, file.stream, file.filename)
             else:
                 logger.warning("Invalid or no test report uploaded")
 
-        # Get form data
-        new_patient = Patient(
-            PatientID=next_id,
-            Name=request.form.get('name', 'Unknown'),
-            Sex=request.form.get('sex', 'Unknown'),
-            State=request.form.get('state', 'Unknown'),
-            GeneralHealth=request.form.get('general_health', 'Unknown'),
-            HasChronicCondition=request.form.get('chronic_condition') == 'Yes',
-            HospitalStayDuration=int(request.form.get('stay_duration', 1)),
-            RiskCategory=request.form.get('risk_category', 'Unknown'),
-            DoctorName=request.form.get('doctor_name', 'Dr. Anita Sharma'),
-            Allergies=request.form.get('allergies', 'None'),
-            AdmissionDate=request.form.get('admission_date', 'Unknown'),
-            DischargeDate=request.form.get('discharge_date', 'Unknown'),
-            ChiefComplaint=request.form.get('chief_complaint', 'Unknown'),
-            TestReports=test_report_path
-        )
-
-        # Add to database
-        session.add(new_patient)
         session.commit()
+        invalidate_patient_summaries(next_id)
+        if test_report is not None:
+            queue_report_processing(test_report.ReportID)
         logger.info("Patient added with ID: %s", next_id)
 
         # Return success response with redirect
@@ -600,6 +1425,63 @@ def add_patient_post():
     finally:
         session.close()
 
+# Largest /add_patients request (also bounded by MAX_CONTENT_LENGTH); bigger
+# intakes should be split, or loaded with init_db
+ADD_PATIENTS_MAX_ROWS = int(os.environ.get('ADD_PATIENTS_MAX_ROWS', 20000))
+
+# Function to read /add_patients rows: a JSON array of objects, or a CSV upload in the 'file' field
+def read_patient_rows():
+    if request.is_json:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("Expected a JSON array of patient objects")
+        return rows
+    file = request.files.get('file')
+    if not file:
+        raise ValueError("Send a JSON array or a CSV file in the 'file' field")
+    return list(csv.DictReader(io.TextIOWrapper(file.stream, encoding='utf-8-sig')))
+
+@app.route('/add_patients', methods=['POST'])
+def add_patients_post():
+    logger.info("Received bulk add patients request")
+    try:
+        rows = read_patient_rows()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': f'⚠️ {str(e)}'}), 400
+    if not rows:
+        return jsonify({'error': '⚠️ No patients to add'}), 400
+    if len(rows) > ADD_PATIENTS_MAX_ROWS:
+        return jsonify({'error': f'⚠️ At most {ADD_PATIENTS_MAX_ROWS} patients per request'}), 413
+
+    values = []
+    for index, row in enumerate(rows, start=1):
+        try:
+            values.append({**patient_values(row), 'TestReports': ''})
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'⚠️ Row {index}: {str(e)}'}), 400
+
+    session = SessionLocal()
+    try:
+        # One transaction; rows go out as multi-row INSERT ... RETURNING batches
+        # and the database allocates the IDs, returned in input order
+        stmt = insert(Patient).returning(Patient.PatientID, sort_by_parameter_order=True)
+        patient_ids = list(session.scalars(stmt, values))
+        add_to_rollups(session.connection(), values)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error("Error adding patients: %s", str(e))
+        return jsonify({'error': f"Failed to add patients: {str(e)}"}), 500
+    finally:
+        session.close()
+
+    invalidate_patient_summaries(*patient_ids)
+    logger.info("Added %d patients (IDs %d-%d)", len(patient_ids), patient_ids[0], patient_ids[-1])
+    return jsonify({
+        'message': f"Added {len(patient_ids)} patients",
+        'patient_ids': patient_ids
+    })
+
 @app.route('/upload_test_report', methods=['POST'])
 def upload_test_report():
     logger.info("Received test report upload request")
@@ -619,13 +1501,13 @@ def upload_test_report():
 
         file = request.files['test_report']
         if file and allowed_file(file.filename):
-            filename = secure_filename(f"{patient_id}_{file.filename}")
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            patient.TestReports = f"uploads/{filename}"
+            # Earlier reports are kept; Patient.TestReports points at this latest one
+            test_report = store_test_report(session, patient, file.stream, file.filename)
             session.commit()
+            invalidate_patient_summaries(patient_id_int)
+            job_id = queue_report_processing(test_report.ReportID)
             logger.info("Test report uploaded for PatientID %s: %s", patient_id, patient.TestReports)
-            return jsonify({'message': f"Test report uploaded for Patient ID {patient_id}"})
+            return report_upload_response(f"Test report uploaded for Patient ID {patient_id}", test_report, job_id)
         else:
             return jsonify({'error': '⚠️ Invalid file type. Only JPG, PNG, or PDF allowed.'}), 400
     except Exception as e:
@@ -0,0 +1,135 @@
+import logging
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+# data is set for memory hits, path for hits in the shared directory
+Artifact = namedtuple('Artifact', ['data', 'path', 'size'])
+
+
+def default_spill_dir():
+    # /dev/shm is RAM-backed and visible to every gunicorn worker
+    base = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, 'smartdischarge-artifacts')
+
+
+class ArtifactStore:
+    """Bounded, TTL-evicting store for generated files, keyed by an unguessable token.
+
+    Artifacts are kept in a per-process LRU capped at max_memory_bytes. When
+    spill_dir is set they are also written there, so a download served by a
+    different worker than the one that rendered the file still finds it, and
+    entries evicted from memory remain available until their TTL runs out.
+    """
+
+    def __init__(self, ttl=900, max_memory_bytes=256 * 1024 * 1024, spill_dir=None, max_spill_bytes=1024 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._memory = OrderedDict()  # token -> (data, expires)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def put(self, data):
+        token = secrets.token_urlsafe(24)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._memory[token] = (data, expires)
+            self._memory_bytes += len(data)
+            self._evict_memory()
+            self._puts += 1
+            sweep = self._puts % 64 == 0
+        if self.spill_dir:
+            self._spill(token, data)
+            if sweep:
+                self.sweep_spill_dir()
+        return token
+
+    def get(self, token):
+        if not token or not TOKEN_PATTERN.match(token):
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(token)
+            if entry is not None:
+                data, expires = entry
+                if expires > now:
+                    self._memory.move_to_end(token)
+                    return Artifact(data, None, len(data))
+                self._drop(token)
+        if self.spill_dir:
+            path = os.path.join(self.spill_dir, token)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            if stat.st_mtime + self.ttl > now:
+                return Artifact(None, path, stat.st_size)
+            self._unlink(path)
+        return None
+
+    def _drop(self, token):
+        data, _ = self._memory.pop(token)
+        self._memory_bytes -= len(data)
+
+    def _evict_memory(self):
+        now = time.time()
+        for token in [t for t, (_, expires) in self._memory.items() if expires <= now]:
+            self._drop(token)
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            self._drop(next(iter(self._memory)))
+
+    def _spill(self, token, data):
+        # Write under a temporary name and rename so readers never see a partial file
+        path = os.path.join(self.spill_dir, token)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.spill_dir, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not spill artifact %s to %s: %s", token, self.spill_dir, str(e))
+
+    def sweep_spill_dir(self):
+        """Delete expired spilled artifacts, then the oldest ones while over max_spill_bytes."""
+        now = time.time()
+        entries = []
+        try:
+            with os.scandir(self.spill_dir) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if stat.st_mtime + self.ttl <= now:
+                        self._unlink(entry.path)
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logger.warning("Could not sweep artifact directory %s: %s", self.spill_dir, str(e))
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_spill_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
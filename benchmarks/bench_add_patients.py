@@ -0,0 +1,95 @@
+"""Patient registration throughput: single /add_patient posts vs /add_patients.
+
+Fires single adds from several threads at once (the concurrent-intake case;
+every add must get its own PatientID, so failures should be 0), then posts
+the same number of patients in one /add_patients request, as JSON and as a
+CSV upload, and reports rows per second for each.
+
+    python benchmarks/bench_add_patients.py [--rows 5000] [--threads 8]
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FORM = {'name': 'Intake', 'sex': 'Male', 'state': 'Telangana', 'general_health': 'Fair',
+        'chronic_condition': 'Yes', 'stay_duration': '3', 'risk_category': 'Obese',
+        'doctor_name': 'Dr. Anita Sharma', 'allergies': 'None', 'admission_date': '2025-05-01',
+        'discharge_date': '2025-05-04', 'chief_complaint': 'Chest pain'}
+
+
+def single_adds(app, rows, threads):
+    ids, failures = [], []
+    lock = threading.Lock()
+
+    def run(count):
+        client = app.test_client()
+        for _ in range(count):
+            response = client.post('/add_patient', data=FORM)
+            with lock:
+                if response.status_code == 200:
+                    ids.append(int(response.get_json()['message'].rsplit(' ', 1)[1]))
+                else:
+                    failures.append(response.status_code)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=run, args=(rows // threads,)) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    assert len(ids) == len(set(ids)), "duplicate PatientIDs allocated"
+    return len(ids) / elapsed, len(failures)
+
+
+def bulk_add(client, rows, as_csv):
+    if as_csv:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(FORM))
+        writer.writeheader()
+        writer.writerows([FORM] * rows)
+        kwargs = {'data': {'file': (io.BytesIO(buffer.getvalue().encode('utf-8')), 'intake.csv')},
+                  'content_type': 'multipart/form-data'}
+    else:
+        kwargs = {'json': [FORM] * rows}
+    started = time.perf_counter()
+    response = client.post('/add_patients', **kwargs)
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200, response.get_json()
+    assert len(response.get_json()['patient_ids']) == rows
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    os.environ['AI_SERVER_SOCKET'] = ''
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    import app as smartdischarge
+    client = smartdischarge.app.test_client()
+
+    rate, failures = single_adds(smartdischarge.app, args.rows, args.threads)
+    print(f"{args.rows} patients")
+    print(f"  /add_patient x {args.threads} threads: {rate:8.0f} rows/s ({failures} failed)")
+    print(f"  /add_patients JSON:          {bulk_add(client, args.rows, as_csv=False):8.0f} rows/s")
+    print(f"  /add_patients CSV:           {bulk_add(client, args.rows, as_csv=True):8.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Concurrent /generate + /download load test for the PDF artifact store.
+
+Each thread generates summaries for its own patients and downloads them
+straight back, checking that every PDF carries the requested patient's
+record number. Half the downloads are served by a second store that only
+shares the spill directory, standing in for a different gunicorn worker.
+
+    python benchmarks/bench_artifact_downloads.py [--threads 16] [--requests 25]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def record_numbers(pdf_bytes):
+    # Page content streams are deflated; pull the MRN lines back out of them
+    found = set()
+    for stream in re.findall(rb'stream\r?\n(.*?)\r?\nendstream', pdf_bytes, re.S):
+        try:
+            text = zlib.decompress(stream)
+        except zlib.error:
+            continue
+        found.update(int(m) for m in re.findall(rb'Medical Record Number: (\d+)', text))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=25, help='generate+download pairs per thread')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='smartdischarge-bench-')
+    os.environ.setdefault('AI_MODEL_LOAD', 'off')
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.environ['ARTIFACT_SPILL_DIR'] = os.path.join(workdir, 'artifacts')
+    os.chdir(workdir)
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from models import Patient, SessionLocal
+    from artifact_store import ArtifactStore
+    import app as smartdischarge
+
+    total = args.threads * args.requests
+    session = SessionLocal()
+    session.add_all([
+        Patient(PatientID=i, Name=f'Patient {i}', Sex='Female', State='Telangana',
+                GeneralHealth=['Excellent', 'Good', 'Fair', 'Poor'][i % 4], HasChronicCondition=bool(i % 2),
+                HospitalStayDuration=i % 10 + 1, RiskCategory=['Normal', 'Overweight', 'Obese'][i % 3],
+                DoctorName='Dr. Anita Sharma', Allergies='None', ChiefComplaint='Chest pain',
+                AdmissionDate=date(2025, 5, 1), DischargeDate=date(2025, 5, 5), TestReports='')
+        for i in range(1, total + 1)
+    ])
+    session.commit()
+    session.close()
+
+    primary = smartdischarge.artifact_store
+    other_worker = ArtifactStore(ttl=primary.ttl, spill_dir=primary.spill_dir)
+    errors = []
+    latencies = []
+    lock = threading.Lock()
+
+    def run(thread_index):
+        client = smartdischarge.app.test_client()
+        for n in range(args.requests):
+            pid = thread_index * args.requests + n + 1
+            started = time.perf_counter()
+            response = client.post('/generate', data={'patient_id': pid, 'discharge_date': '2025-05-05', 'wait': 1})
+            if response.status_code != 200:
+                errors.append(f"{pid}: /generate returned {response.status_code}")
+                continue
+            token = response.get_json()['pdf_file']
+            if n % 2:
+                artifact = other_worker.get(token)
+                pdf_bytes = open(artifact.path, 'rb').read() if artifact else b''
+            else:
+                download = client.get(f'/download/{token}')
+                pdf_bytes = download.data if download.status_code == 200 else b''
+            elapsed = time.perf_counter() - started
+            if record_numbers(pdf_bytes) != {pid}:
+                errors.append(f"{pid}: downloaded PDF is for {sorted(record_numbers(pdf_bytes)) or 'nothing'}")
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{total} generate+download pairs over {args.threads} threads in {wall:.2f}s ({total / wall:.1f}/s)")
+    if latencies:
+        print(f"  p50 {latencies[len(latencies) // 2] * 1000:.1f}ms  p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+    print(f"  mismatched or missing PDFs: {len(errors)}")
+    for line in errors[:10]:
+        print(f"    {line}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Concurrent read/write stress test of the database layer.
+
+Spawns several processes (standing in for gunicorn workers), each running
+reader and writer threads against one database for a fixed time. Readers do
+the /preview lookup (get_patient_data); writers insert patients and update
+their TestReports like /add_patient and /upload_test_report. Reports p50/p99
+latency per operation and how many operations failed.
+
+    python benchmarks/bench_db_concurrency.py [--workers 4] [--readers 4] [--writers 2] [--seconds 10]
+
+Set DATABASE_URL to run it against a server database instead of SQLite.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEED_PATIENTS = 10000
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else float('nan')
+
+
+def seed(count):
+    from models import Patient, SessionLocal
+    session = SessionLocal()
+    session.bulk_save_objects([
+        Patient(PatientID=i, Name=f'Patient {i}', Sex='Female', State='Telangana', GeneralHealth='Good',
+                HasChronicCondition=bool(i % 2), HospitalStayDuration=i % 10 + 1, RiskCategory='Normal',
+                DoctorName='Dr. Anita Sharma', Allergies='None', ChiefComplaint='Chest pain',
+                AdmissionDate=date(2025, 5, 1), DischargeDate=date(2025, 5, 5), TestReports='')
+        for i in range(1, count + 1)
+    ])
+    session.commit()
+    SessionLocal.remove()
+
+
+def worker(index, args, results):
+    import logging
+    logging.disable(logging.CRITICAL)
+    from models import Patient, SessionLocal
+    import app as smartdischarge
+
+    samples = {'read': [], 'write': []}
+    errors = {'read': 0, 'write': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    # Each process writes its own ID range so failures come from locking, not key clashes
+    next_id = iter(range(SEED_PATIENTS + 1 + index * 10_000_000, SEED_PATIENTS + (index + 1) * 10_000_000))
+
+    def record(kind, started, ok):
+        with lock:
+            if ok:
+                samples[kind].append((time.perf_counter() - started) * 1000)
+            else:
+                errors[kind] += 1
+
+    def reader():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            ok = smartdischarge.get_patient_data(random.randint(1, SEED_PATIENTS)) is not None
+            record('read', started, ok)
+            SessionLocal.remove()
+
+    def writer():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            session = SessionLocal()
+            try:
+                patient_id = next(next_id)
+                session.add(Patient(PatientID=patient_id, Name='Stress', Sex='Male', State='Telangana',
+                                    GeneralHealth='Fair', HasChronicCondition=True, HospitalStayDuration=3,
+                                    RiskCategory='Obese', DoctorName='Dr. Anita Sharma', Allergies='None',
+                                    ChiefComplaint='Chest pain', AdmissionDate=date(2025, 5, 1),
+                                    DischargeDate=date(2025, 5, 4), TestReports=''))
+                session.commit()
+                patient = session.get(Patient, patient_id)
+                patient.TestReports = f'uploads/{patient_id}_report.pdf'
+                session.commit()
+                ok = True
+            except Exception:
+                session.rollback()
+                ok = False
+            finally:
+                SessionLocal.remove()
+            record('write', started, ok)
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put((samples, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4, help='processes, like gunicorn -w')
+    parser.add_argument('--readers', type=int, default=4, help='reader threads per process')
+    parser.add_argument('--writers', type=int, default=2, help='writer threads per process')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    os.environ['AI_SERVER_SOCKET'] = ''
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    if 'DATABASE_URL' not in os.environ:
+        os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+    seed(SEED_PATIENTS)
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    procs = [context.Process(target=worker, args=(i, args, results)) for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    print(f"{args.workers} processes x ({args.readers} readers + {args.writers} writers), {args.seconds:.0f}s, "
+          f"{os.environ.get('DATABASE_URL', 'sqlite:///smartdischarge.db')}")
+    print(f"{'op':>6} {'ops':>8} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for kind in ('read', 'write'):
+        samples = sorted(s for samples, _ in collected for s in samples[kind])
+        errors = sum(errors[kind] for _, errors in collected)
+        p50 = statistics.median(samples) if samples else float('nan')
+        print(f"{kind:>6} {len(samples):8d} {len(samples) / args.seconds:8.0f} {p50:8.2f} "
+              f"{percentile(samples, 0.99):8.2f} {errors:7d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Discharge-window queries before and after the DATE migration.
+
+Builds a throwaway SQLite database in the old layout (dates as text, 'Unknown'
+when missing, no date indexes) holding --patients patients discharged at
+--per-day a day, times the same window queries against it, then lets
+models.create_schema migrate it and times them again, directly and through
+/discharges. Run at two sizes to see that a day's list doesn't grow with
+history.
+
+    python benchmarks/bench_discharges.py [--patients 1000000] [--per-day 1000] [--requests 50]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DOCTORS = [f'Dr. Doctor {i}' for i in range(20)]
+END = date(2026, 1, 1)
+
+OLD_SCHEMA = """
+CREATE TABLE patients (
+    PatientID INTEGER NOT NULL PRIMARY KEY, Name VARCHAR, Sex VARCHAR, State VARCHAR, GeneralHealth VARCHAR,
+    HasChronicCondition BOOLEAN, HospitalStayDuration INTEGER, RiskCategory VARCHAR, DoctorName VARCHAR,
+    Allergies VARCHAR, ChiefComplaint VARCHAR, AdmissionDate VARCHAR, DischargeDate VARCHAR, TestReports VARCHAR
+);
+CREATE INDEX idx_patient_id ON patients (PatientID);
+"""
+
+QUERY_SQL = ("SELECT * FROM patients WHERE DischargeDate BETWEEN ? AND ?{doctor} "
+             "ORDER BY DischargeDate, PatientID LIMIT 501")
+
+
+def build(path, patients, per_day):
+    days = max(1, patients // per_day)
+    db = sqlite3.connect(path)
+    db.executescript(OLD_SCHEMA)
+    rows = []
+    for pid in range(1, patients + 1):
+        discharged = END - timedelta(days=days - (pid - 1) * days // patients)
+        stay = random.randint(1, 10)
+        known = random.random() > 0.02
+        rows.append((pid, f'Patient {pid}', 'Female', 'State', 'Fair', pid % 2, stay, 'Normal', random.choice(DOCTORS),
+                     'None', 'Chest pain', (discharged - timedelta(days=stay)).isoformat() if known else 'Unknown',
+                     discharged.isoformat() if known else 'Unknown', ''))
+    db.executemany("INSERT INTO patients VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    db.commit()
+    db.close()
+    return days
+
+
+def windows(days):
+    day = END - timedelta(days=random.randint(1, days))
+    return {
+        'one day': (day, day, None),
+        'one day, one doctor': (day, day, random.choice(DOCTORS)),
+        'one week': (day - timedelta(days=6), day, None),
+    }
+
+
+def time_sql(path, days, requests):
+    db = sqlite3.connect(path)
+    samples = {}
+    for _ in range(requests):
+        for name, (start, end, doctor) in windows(days).items():
+            sql = QUERY_SQL.format(doctor=' AND DoctorName = ?' if doctor else '')
+            params = (start.isoformat(), end.isoformat()) + ((doctor,) if doctor else ())
+            started = time.perf_counter()
+            db.execute(sql, params).fetchall()
+            samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+    db.close()
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--per-day', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    os.environ['AI_SERVER_SOCKET'] = ''
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    days = build('smartdischarge.db', args.patients, args.per_day)
+    print(f"{args.patients} patients over {days} days")
+    before = time_sql('smartdischarge.db', days, max(3, args.requests // 10))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    started = time.perf_counter()
+    import app as smartdischarge  # models.create_schema migrates the database
+    print(f"Migrated and indexed in {time.perf_counter() - started:.1f}s")
+    after = time_sql('smartdischarge.db', days, args.requests)
+
+    client = smartdischarge.app.test_client()
+    endpoint, rows = {}, {}
+    for _ in range(args.requests):
+        for name, (start, end, doctor) in windows(days).items():
+            params = {'from': start.isoformat(), 'to': end.isoformat(), 'per_page': 500}
+            if doctor:
+                params['doctor'] = doctor
+            started = time.perf_counter()
+            response = client.get('/discharges', query_string=params)
+            endpoint.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_json()
+            rows.setdefault(name, []).append(len(response.get_json()['patients']))
+
+    print(f"{'window':>20} {'text ms':>9} {'DATE ms':>9} {'endpoint ms':>12} {'rows':>6}")
+    for name in before:
+        print(f"{name:>20} {before[name]:9.1f} {after[name]:9.2f} {statistics.median(endpoint[name]):12.1f} "
+              f"{statistics.mean(rows[name]):6.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Bytes served and worker time on a repeat-view workload.
+
+Simulates clinicians reopening the same pages: each session loads the index
+page's static assets, opens a few test reports (a PDF viewer's range reads
+followed by the full file) and downloads the same discharge summary again.
+The workload is run twice: by a client that ignores caching headers, and by
+one that behaves like a browser cache (reuses fresh copies, revalidates
+stale ones with If-None-Match / If-Modified-Since). Reports the requests
+that reached a worker, response bytes and time spent in the app.
+
+    python benchmarks/bench_file_serving.py [--sessions 50] [--report-mb 5]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class Client:
+    """Test client wrapper that counts traffic and optionally acts as an HTTP cache."""
+
+    def __init__(self, client, caching):
+        self.client = client
+        self.caching = caching
+        self.cache = {}  # url -> (body, etag, last_modified, fresh_until)
+        self.requests = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def _send(self, url, headers):
+        started = time.perf_counter()
+        response = self.client.get(url, headers=headers)
+        self.seconds += time.perf_counter() - started
+        self.requests += 1
+        self.bytes += len(response.data)
+        return response
+
+    def get(self, url, byte_range=None):
+        cached = self.cache.get(url) if self.caching else None
+        if cached and time.time() < cached[3]:
+            body = cached[0]
+            return body[byte_range[0]:byte_range[1] + 1] if byte_range else body
+        headers = {}
+        if byte_range:
+            headers['Range'] = f'bytes={byte_range[0]}-{byte_range[1]}'
+        if cached and not byte_range:
+            if cached[1]:
+                headers['If-None-Match'] = cached[1]
+            if cached[2]:
+                headers['If-Modified-Since'] = cached[2]
+        response = self._send(url, headers)
+        if response.status_code == 304:
+            body = cached[0]
+        else:
+            assert response.status_code in (200, 206), (url, response.status_code)
+            body = response.data
+        if self.caching and response.status_code in (200, 304) and 'no-store' not in response.headers.get('Cache-Control', ''):
+            max_age = response.cache_control.max_age or 0
+            self.cache[url] = (body, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                               time.time() + (0 if response.cache_control.no_cache else max_age))
+        return body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--reports', type=int, default=3)
+    parser.add_argument('--report-mb', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    os.environ['AI_SERVER_SOCKET'] = ''
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    import app as smartdischarge
+    setup = smartdischarge.app.test_client()
+    setup.post('/add_patients', json=[{'name': 'Patient', 'general_health': 'Fair', 'chronic_condition': 'Yes'}])
+    report_urls = []
+    for i in range(args.reports):
+        scan = b'%PDF-1.4\n' + bytes([i]) * (args.report_mb * 1024 * 1024)
+        report_urls.append(setup.post('/patients/1/reports?filename=scan.pdf', data=scan).get_json()['report']['url'])
+    pdf_url = '/download/' + setup.post('/generate', data={'patient_id': 1, 'wait': 1}).get_json()['pdf_file']
+
+    print(f"{args.sessions} sessions, {args.reports} x {args.report_mb}MB reports, FILE_OFFLOAD="
+          f"{os.environ.get('FILE_OFFLOAD', '') or 'off'}")
+    print(f"{'client':>10} {'requests':>9} {'MB sent':>9} {'worker s':>9}")
+    for caching in (False, True):
+        client = Client(smartdischarge.app.test_client(), caching)
+        for _ in range(args.sessions):
+            page = client.get('/').decode('utf-8')
+            for asset in re.findall(r'(?:src|href)="(/static/[^"]+)"', page):
+                client.get(asset)
+            for url in report_urls:
+                client.get(url, byte_range=(0, 65535))
+                client.get(url, byte_range=(1024 * 1024, 2 * 1024 * 1024 - 1))
+                client.get(url)
+            client.get(pdf_url)
+        label = 'caching' if caching else 'no cache'
+        print(f"{label:>10} {client.requests:9d} {client.bytes / 1e6:9.1f} {client.seconds:9.2f}")
+
+
+if __name__ == '__main__':
+    main()
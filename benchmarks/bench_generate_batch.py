@@ -0,0 +1,64 @@
+"""Throughput of /generate_batch against N sequential /generate calls.
+
+Runs against a throwaway SQLite database in a temp directory with the AI
+model switched off, so it measures the template, database and PDF stages.
+
+    python benchmarks/bench_generate_batch.py [--patients 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--patients', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault('AI_MODEL_LOAD', 'off')
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from models import Patient, SessionLocal
+    import app as smartdischarge
+
+    session = SessionLocal()
+    session.add_all([
+        Patient(PatientID=i, Name=f'Patient {i}', Sex='Female', State='Telangana',
+                GeneralHealth=['Excellent', 'Good', 'Fair', 'Poor'][i % 4], HasChronicCondition=bool(i % 2),
+                HospitalStayDuration=i % 10 + 1, RiskCategory=['Normal', 'Overweight', 'Obese'][i % 3],
+                DoctorName='Dr. Anita Sharma', Allergies='None', ChiefComplaint='Chest pain',
+                AdmissionDate=date(2025, 5, 1), DischargeDate=date(2025, 5, 5), TestReports='')
+        for i in range(1, args.patients + 1)
+    ])
+    session.commit()
+    session.close()
+
+    client = smartdischarge.app.test_client()
+    ids = list(range(1, args.patients + 1))
+
+    started = time.perf_counter()
+    for pid in ids:
+        assert client.post('/generate', data={'patient_id': pid, 'discharge_date': '2025-05-05', 'wait': 1}).status_code == 200
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    response = client.post('/generate_batch', json={'patient_ids': ids, 'discharge_date': '2025-05-05'})
+    assert response.status_code == 200 and response.headers['X-Batch-Succeeded'] == str(len(ids))
+    batch = time.perf_counter() - started
+
+    print(f"{len(ids)} patients")
+    print(f"  /generate x N   : {single:7.2f}s  {len(ids) / single:8.1f} summaries/s")
+    print(f"  /generate_batch : {batch:7.2f}s  {len(ids) / batch:8.1f} summaries/s  ({single / batch:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
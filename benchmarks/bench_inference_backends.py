@@ -0,0 +1,119 @@
+"""Latency, throughput, memory and quality of each AI_BACKEND.
+
+Each backend is loaded in its own subprocess so resident memory is measured
+in isolation. Quality is the perplexity of a fixed clinical note under the
+model: a quantized or exported backend that keeps note quality should stay
+close to the torch (fp32) figure.
+
+    python benchmarks/bench_inference_backends.py [--model distilgpt2] [--backends torch,torch-int8,onnx]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROMPT = ("Generate a concise medical note for a patient with Hypertension. Describe the disease briefly, mention "
+          "key patient data (Health: Fair, Risk: Obese, Stay: 5 days), and suggest one treatment or lifestyle "
+          "change. Keep it under 150 words.")
+REFERENCE_NOTE = ("Hypertension is a chronic condition in which the blood pressure in the arteries is persistently "
+                  "elevated. The patient stayed five days and is at high risk because of obesity. A low-salt diet, "
+                  "regular exercise and daily blood pressure checks are recommended.")
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def perplexity(pipe, text):
+    import torch
+    encoded = pipe.tokenizer(text, return_tensors='pt')
+    with torch.no_grad():
+        logits = pipe.model(input_ids=encoded['input_ids'], attention_mask=encoded['attention_mask']).logits
+    loss = torch.nn.functional.cross_entropy(logits[0, :-1].float(), encoded['input_ids'][0, 1:])
+    return float(torch.exp(loss))
+
+
+def run_backend(model_name, backend, notes, batch):
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    import logging
+    logging.disable(logging.CRITICAL)
+    from ai_model import InferenceScheduler, ModelManager
+
+    started = time.perf_counter()
+    manager = ModelManager(model_name=model_name, load_mode='lazy', backend=backend)
+    pipe = manager.load()
+    if pipe is None:
+        return {'backend': backend, 'error': 'failed to load'}
+    load_time = time.perf_counter() - started
+    scheduler = InferenceScheduler(manager, max_batch_size=batch, max_wait_ms=50)
+    kwargs = dict(max_new_tokens=60, do_sample=False)
+
+    scheduler.generate(PROMPT, **kwargs)  # warm-up
+    latencies = []
+    for _ in range(notes):
+        started = time.perf_counter()
+        scheduler.generate(PROMPT, **kwargs)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    futures = [scheduler.submit(PROMPT, **kwargs) for _ in range(notes)]
+    sample = [f.result(timeout=600) for f in futures][0].replace(PROMPT, '').strip()
+    throughput = notes / (time.perf_counter() - started)
+
+    return {
+        'backend': backend,
+        'load_s': load_time,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'notes_per_s': throughput,
+        'rss_mb': rss_mb(),
+        'perplexity': perplexity(pipe, REFERENCE_NOTE),
+        'sample': sample[:100].replace('\n', ' ')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='distilgpt2')
+    parser.add_argument('--backends', default='torch,torch-int8,onnx')
+    parser.add_argument('--notes', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.model, args.child, args.notes, args.batch)))
+        return
+
+    results = []
+    for backend in args.backends.split(','):
+        proc = subprocess.run([sys.executable, __file__, '--child', backend, '--model', args.model,
+                               '--notes', str(args.notes), '--batch', str(args.batch)],
+                              capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        results.append(json.loads(lines[-1]) if proc.returncode == 0 and lines
+                       else {'backend': backend, 'error': (proc.stderr.strip().splitlines() or ['failed'])[-1]})
+
+    print(f"{args.model}, {args.notes} notes, batch {args.batch}, AI_TORCH_THREADS={os.environ.get('AI_TORCH_THREADS', 'auto')}")
+    print(f"{'backend':>11} {'load s':>7} {'p50 ms':>8} {'notes/s':>8} {'RSS MB':>8} {'ppl':>8}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['backend']:>11}  error: {r['error']}")
+            continue
+        print(f"{r['backend']:>11} {r['load_s']:7.1f} {r['p50_ms']:8.0f} {r['notes_per_s']:8.2f} {r['rss_mb']:8.0f} {r['perplexity']:8.1f}")
+    for r in results:
+        if 'sample' in r:
+            print(f"  {r['backend']}: {r['sample']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Notes/second for /generate-style prompts at 1, 8 and 32 concurrent callers.
+
+Compares calling the pipeline directly (batch of one per request) against
+the micro-batching InferenceScheduler. Needs transformers and torch.
+
+    python benchmarks/bench_inference_batching.py [--requests 64]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_model import ModelManager, InferenceScheduler  # noqa: E402
+
+PROMPT = ("Generate a concise medical note for a patient with {disease}. Describe the disease briefly, "
+          "mention key patient data (Health: Fair, Risk: Obese, Stay: {stay} days), and suggest one "
+          "treatment or lifestyle change. Keep it under 150 words.")
+DISEASES = ['Hypertension', 'Diabetes', 'Chronic Heart Disease', 'Acute Respiratory Infection']
+GENERATE_KWARGS = dict(max_length=300, num_return_sequences=1, truncation=True,
+                       temperature=0.8, do_sample=True, min_length=50)
+
+
+def run(call, concurrency, total):
+    prompts = [PROMPT.format(disease=DISEASES[i % 4], stay=i % 10 + 1) for i in range(total)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, prompts))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    manager = ModelManager(load_mode='eager')
+    manager.start()
+    pipe = manager.get()
+    if pipe is None:
+        sys.exit("AI model could not be loaded; install transformers and torch")
+    scheduler = InferenceScheduler(manager, max_batch_size=args.max_batch_size,
+                                   max_wait_ms=args.max_wait_ms, max_queue_depth=args.requests)
+    scheduler.generate(PROMPT.format(disease=DISEASES[0], stay=1), **GENERATE_KWARGS)  # warm-up
+
+    def direct(prompt):
+        return pipe(prompt, **GENERATE_KWARGS)[0]['generated_text']
+
+    def batched(prompt):
+        return scheduler.generate(prompt, timeout=600, **GENERATE_KWARGS)
+
+    print(f"{'concurrency':>11} {'direct notes/s':>15} {'batched notes/s':>16}")
+    for concurrency in (1, 8, 32):
+        print(f"{concurrency:>11} {run(direct, concurrency, args.requests):>15.2f} "
+              f"{run(batched, concurrency, args.requests):>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Time to first text and tokens decoded per note: streaming vs the batch path.
+
+The batch path decodes up to max_length tokens and then truncates the note to
+AI_NOTES_MAX_CHARS; the streaming path stops once that budget is reached.
+
+    python benchmarks/bench_notes_streaming.py [--model distilgpt2] [--notes 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='distilgpt2')
+    parser.add_argument('--notes', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from ai_model import InferenceScheduler, ModelManager
+    import app as smartdischarge
+
+    manager = ModelManager(model_name=args.model, load_mode='lazy')
+    if manager.load() is None:
+        sys.exit(f"Could not load {args.model}")
+    scheduler = InferenceScheduler(manager)
+    tokenizer = manager.get().tokenizer
+    prompt = smartdischarge.build_ai_prompt('Hypertension', 'Fair', 'Obese', 5)
+    kwargs = smartdischarge.AI_GENERATE_KWARGS
+
+    full, full_tokens = [], []
+    for _ in range(args.notes):
+        started = time.perf_counter()
+        text = scheduler.generate(prompt, **kwargs)
+        full.append(time.perf_counter() - started)
+        full_tokens.append(len(tokenizer(text.replace(prompt, ''))['input_ids']))
+
+    first, streamed, streamed_tokens = [], [], []
+    for _ in range(args.notes):
+        started = time.perf_counter()
+        pieces = []
+        for text in scheduler.stream(prompt, max_chars=smartdischarge.AI_NOTES_MAX_CHARS, **kwargs):
+            if not pieces:
+                first.append(time.perf_counter() - started)
+            pieces.append(text)
+        streamed.append(time.perf_counter() - started)
+        streamed_tokens.append(len(tokenizer(''.join(pieces))['input_ids']))
+
+    print(f"{args.model}, {args.notes} notes")
+    print(f"  batch path : first text {statistics.median(full) * 1000:7.0f}ms  "
+          f"total {statistics.median(full) * 1000:7.0f}ms  tokens {statistics.median(full_tokens):5.0f}")
+    print(f"  streaming  : first text {statistics.median(first) * 1000:7.0f}ms  "
+          f"total {statistics.median(streamed) * 1000:7.0f}ms  tokens {statistics.median(streamed_tokens):5.0f}")
+
+
+if __name__ == '__main__':
+    main()
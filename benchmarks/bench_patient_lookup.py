@@ -0,0 +1,75 @@
+"""Per-request latency of /preview and /generate as the patients table grows.
+
+Grows a throwaway SQLite database to 10k, 100k and 1M patients and times
+requests at each size. With the fallback check on the primary key index,
+latency should stay flat as the table grows.
+
+    python benchmarks/bench_patient_lookup.py [--requests 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def grow(engine, start, stop):
+    row = ('Patient', 'Female', 'Telangana', 'Fair', 1, 3, 'Obese', 'Dr. Anita Sharma', 'None',
+           'Chest pain', '2025-05-01', '2025-05-04', '')
+    raw = engine.raw_connection()
+    try:
+        raw.executemany(
+            "INSERT INTO patients (PatientID, Name, Sex, State, GeneralHealth, HasChronicCondition, "
+            "HospitalStayDuration, RiskCategory, DoctorName, Allergies, ChiefComplaint, AdmissionDate, "
+            "DischargeDate, TestReports) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((pid,) + row for pid in range(start, stop + 1)))
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def timed(client, route, size, requests):
+    samples = []
+    for _ in range(requests):
+        data = {'patient_id': random.randint(1, size), 'discharge_date': '2025-05-04', 'wait': 1}
+        started = time.perf_counter()
+        assert client.post(route, data=data).status_code == 200
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault('AI_MODEL_LOAD', 'off')
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from models import engine
+    import app as smartdischarge
+    client = smartdischarge.app.test_client()
+
+    print(f"{'patients':>10} {'/preview p50 ms':>16} {'p99 ms':>8} {'/generate p50 ms':>17} {'p99 ms':>8}")
+    loaded = 0
+    for size in SIZES:
+        grow(engine, loaded + 1, size)
+        loaded = size
+        preview = timed(client, '/preview', size, args.requests)
+        generate = timed(client, '/generate', size, max(args.requests // 10, 1))
+        print(f"{size:>10} {preview[0]:>16.2f} {preview[1]:>8.2f} {generate[0]:>17.2f} {generate[1]:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""/search latency at a million patients.
+
+Builds a throwaway SQLite database of synthetic patients (20 doctors, 30
+states, two years of admissions in PatientID order, a narrative for every
+tenth patient), then times the first page of typical clinician searches. --no-indexes drops the
+filter indexes first, for comparison.
+
+    python benchmarks/bench_patient_search.py [--patients 1000000] [--requests 50] [--no-indexes]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DOCTORS = [f'Dr. Doctor {i}' for i in range(20)]
+STATES = [f'State {i}' for i in range(30)]
+RISKS = ['Normal', 'Overweight', 'Obese', 'Underweight']
+COMPLAINTS = ['Chest pain', 'Shortness of breath', 'Palpitations', 'Fatigue on exertion', 'Syncope', 'Ankle swelling']
+ALLERGIES = ['None', 'None', 'None', 'Penicillin', 'Sulfa drugs', 'Aspirin']
+NAMES = ['Aarav', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Meera', 'Arjun', 'Kavya', 'Rohan', 'Isha']
+START = date(2024, 1, 1)
+
+QUERIES = {
+    'doctor': lambda: {'doctor': random.choice(DOCTORS)},
+    'doctor + discharged week': lambda: dict(doctor=random.choice(DOCTORS), **week('discharged')),
+    'state + risk': lambda: {'state': random.choice(STATES), 'risk_category': random.choice(RISKS)},
+    'admitted week': lambda: week('admitted'),
+    'name prefix': lambda: {'name': random.choice(NAMES) + ' ' + random.choice('KMS')},
+    'name lookup': lambda: {'name': random.choice(NAMES) + ' ' + random.choice('KMS') + str(random.randint(1, 99999))},
+    'text': lambda: {'q': random.choice(['penicillin', 'syncope', 'ST depression', 'angina'])},
+    'text prefix': lambda: {'q': random.choice(['penic*', 'sync*', 'fibril*'])},
+    'text + doctor': lambda: {'q': 'chest pain', 'doctor': random.choice(DOCTORS)},
+    'unfiltered': lambda: {},
+}
+
+
+def week(kind):
+    start = START + timedelta(days=random.randint(0, 700))
+    return {f'{kind}_from': start.isoformat(), f'{kind}_to': (start + timedelta(days=6)).isoformat()}
+
+
+def build(engine, patients):
+    raw = engine.raw_connection()
+    try:
+        raw.execute("DROP TRIGGER IF EXISTS patients_fts_insert")
+        rows = []
+        for pid in range(1, patients + 1):
+            # IDs are allocated as patients arrive, so admission dates roughly follow them
+            admitted = START + timedelta(days=pid * 720 // patients + random.randint(-3, 3))
+            rows.append((pid, f'{random.choice(NAMES)} {random.choice("KMSPRT")}{pid}', 'Female',
+                         random.choice(STATES), 'Fair', pid % 2, random.randint(1, 10), random.choice(RISKS),
+                         random.choice(DOCTORS), random.choice(ALLERGIES), random.choice(COMPLAINTS),
+                         admitted.isoformat(), (admitted + timedelta(days=random.randint(1, 10))).isoformat(), '', None))
+        raw.executemany("INSERT INTO patients VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        raw.executemany(
+            "INSERT INTO clinical_narratives (PatientID, DischargeSummary) VALUES (?, ?)",
+            ((pid, random.choice(['Angina pectoris, ECG ST depression V4-V6.', 'Atrial fibrillation, rate controlled.',
+                                  'Heart failure, diuresed.'])) for pid in range(1, patients + 1, 10)))
+        raw.commit()
+    finally:
+        raw.close()
+    with engine.begin() as connection:
+        from search_index import rebuild_search_index
+        rebuild_search_index(connection)
+        connection.exec_driver_sql("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--no-indexes', action='store_true')
+    args = parser.parse_args()
+
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    os.environ['AI_SERVER_SOCKET'] = ''
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from models import Patient, engine
+    started = time.perf_counter()
+    build(engine, args.patients)
+    print(f"Built {args.patients} patients in {time.perf_counter() - started:.0f}s")
+    if args.no_indexes:
+        with engine.begin() as connection:
+            for index in Patient.__table__.indexes:
+                index.drop(connection)
+
+    import app as smartdischarge
+    client = smartdischarge.app.test_client()
+    print(f"{'query':>26} {'p50 ms':>8} {'p99 ms':>8} {'rows':>6}")
+    for name, make in QUERIES.items():
+        samples, rows = [], 0
+        for _ in range(args.requests):
+            params = make()
+            started = time.perf_counter()
+            response = client.get('/search', query_string=params)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_json()
+            rows += len(response.get_json()['patients'])
+        samples.sort()
+        print(f"{name:>26} {statistics.median(samples):8.1f} {samples[int(len(samples) * 0.99) - 1]:8.1f} "
+              f"{rows / args.requests:6.0f}")
+
+
+if __name__ == '__main__':
+    main()
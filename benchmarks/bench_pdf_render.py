@@ -0,0 +1,84 @@
+"""PDFs/second and per-PDF allocations for the discharge summary renderer.
+
+Compares three ways of producing the same document:
+  baseline  - fpdf's stock str buffer, logo parsed per PDF (the old generate_pdf)
+  buffer    - append-only output buffer, logo parsed per PDF
+  shared    - append-only output buffer, logo parsed once per process (what the app uses)
+
+    python benchmarks/bench_pdf_render.py [--count 200]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdf_renderer  # noqa: E402
+from fpdf import FPDF  # noqa: E402
+
+PATIENT = {'PatientID': 42, 'Name': 'Asha Rao', 'Sex': 'Female'}
+SUMMARY = {
+    'age': '58 years', 'admission_date': '2025-05-01', 'discharge_date': '2025-05-05', 'is_fallback': False,
+    'chief_complaint': 'Chest pain', 'hpi': 'Presented with chest pain for 2 days.',
+    'past_history': 'Hypertension.', 'social_history': 'Non-smoker, active lifestyle.', 'allergies': 'None',
+    'physical_exam': 'BP 148/71, HR 74, no murmurs on admission.', 'lab_data': 'ECG: ST depression V4-V6.',
+    'hospital_course': 'Treated with Atorvastatin 20mg HS.', 'condition': 'Stable',
+    'diagnosis': 'Angina pectoris. Secondary: Hypertension.', 'medications': 'Atorvastatin 20mg HS',
+    'diet': 'Heart-healthy diet.', 'activity': 'Light walking 30 min daily.', 'follow_up': 'Review after 3 days.',
+    'discharge_instructions': 'Report chest pain immediately.',
+    'ai_notes': 'AI Notes: Angina pectoris requires ongoing monitoring. Monitor heart health.',
+    'doctor_name': 'Dr. Anita Sharma'
+}
+
+
+class StockBufferPDF(pdf_renderer.DischargePDF):
+    # Skip the output buffer swap to reproduce the original per-request cost
+    def __init__(self, *args, **kwargs):
+        FPDF.__init__(self, *args, **kwargs)
+
+
+def unshared_logo(pdf_class=pdf_renderer.DischargePDF):
+    def render():
+        original = pdf_renderer.DischargePDF, pdf_renderer.load_logo
+        pdf_renderer.DischargePDF, pdf_renderer.load_logo = pdf_class, lambda: None
+        try:
+            return pdf_renderer.render_pdf(PATIENT, SUMMARY)
+        finally:
+            pdf_renderer.DischargePDF, pdf_renderer.load_logo = original
+    return render
+
+
+def measure(render, count):
+    render()  # warm-up
+    started = time.perf_counter()
+    for _ in range(count):
+        render()
+    rate = count / (time.perf_counter() - started)
+
+    tracemalloc.start()
+    render()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rate, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200)
+    args = parser.parse_args()
+
+    modes = {
+        'baseline': unshared_logo(StockBufferPDF),
+        'buffer': unshared_logo(),
+        'shared': lambda: pdf_renderer.render_pdf(PATIENT, SUMMARY),
+    }
+    print(f"{'mode':>9} {'PDFs/s':>9} {'peak alloc/PDF':>15}")
+    for name, render in modes.items():
+        rate, peak = measure(render, args.count)
+        print(f"{name:>9} {rate:>9.1f} {peak / 1024:>12.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
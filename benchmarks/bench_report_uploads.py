@@ -0,0 +1,84 @@
+"""Test-report upload latency, throughput and storage with deduplication.
+
+Uploads a large synthetic PDF scan several times, through the multipart
+/upload_test_report form and the raw POST /patients/<id>/reports stream,
+for different patients. Reports per-upload latency and MB/s, how long the
+background page-count job takes to mark each report ready, and the bytes
+on disk (repeated uploads of one file should be stored once).
+
+    python benchmarks/bench_report_uploads.py [--size-mb 40] [--uploads 5]
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def synthetic_pdf(size_mb, pages=50):
+    body = b''.join(b'%d 0 obj <</Type /Page /Parent 1 0 R>> endobj\n' % (i + 2) for i in range(pages))
+    padding = b'0' * max(0, size_mb * 1024 * 1024 - len(body))
+    return b'%PDF-1.4\n1 0 obj <</Type /Pages>> endobj\n' + body + b'stream\n' + padding + b'\nendstream\n%%EOF\n'
+
+
+def disk_usage(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=40)
+    parser.add_argument('--uploads', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    os.environ['AI_SERVER_SOCKET'] = ''
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.environ.setdefault('MAX_UPLOAD_MB', str(args.size_mb + 1))
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    import app as smartdischarge
+    client = smartdischarge.app.test_client()
+    client.post('/add_patients', json=[{'name': f'Patient {i}'} for i in range(args.uploads * 2)])
+    pdf = synthetic_pdf(args.size_mb)
+
+    def multipart(patient_id):
+        return client.post('/upload_test_report', content_type='multipart/form-data',
+                           data={'patient_id': str(patient_id), 'test_report': (io.BytesIO(pdf), 'scan.pdf')})
+
+    def raw(patient_id):
+        return client.post(f'/patients/{patient_id}/reports?filename=scan.pdf', data=io.BytesIO(pdf),
+                           content_type='application/pdf', content_length=len(pdf))
+
+    print(f"{args.uploads} uploads each of a {args.size_mb}MB PDF")
+    print(f"{'route':>10} {'p50 ms':>8} {'MB/s':>8} {'ready ms':>9}")
+    patient_id = 0
+    for name, upload in (('multipart', multipart), ('raw', raw)):
+        latencies, ready = [], []
+        for _ in range(args.uploads):
+            patient_id += 1
+            started = time.perf_counter()
+            response = upload(patient_id)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_json()
+            status_url = response.get_json()['status_url']
+            while client.get(status_url).get_json()['status'] not in ('done', 'failed'):
+                time.sleep(0.005)
+            ready.append(time.perf_counter() - started)
+        p50 = statistics.median(latencies)
+        print(f"{name:>10} {p50 * 1000:8.0f} {args.size_mb / p50:8.0f} {statistics.median(ready) * 1000:9.0f}")
+
+    uploaded = 2 * args.uploads * len(pdf)
+    stored = disk_usage(smartdischarge.report_store.root)
+    print(f"uploaded {uploaded / 1e6:.0f}MB, stored {stored / 1e6:.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
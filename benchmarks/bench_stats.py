@@ -0,0 +1,98 @@
+"""Dashboard statistics: ad hoc pandas over the patients table vs the rollups.
+
+Builds a throwaway SQLite database of synthetic patients (40 doctors, a year
+of discharges), then times computing per-doctor statistics by reading every
+patient into pandas against the /stats endpoints, which read the rollups.
+Also reports the full rollup rebuild and what keeping the rollups current
+adds to /add_patient and /add_patients.
+
+    python benchmarks/bench_stats.py [--patients 1000000] [--requests 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DOCTORS = [f'Dr. Doctor {i}' for i in range(40)]
+RISKS = ['Normal', 'Overweight', 'Obese', 'Underweight', 'Unknown']
+START = date(2025, 1, 1)
+
+
+def build(engine, patients):
+    raw = engine.raw_connection()
+    try:
+        rows = []
+        for pid in range(1, patients + 1):
+            discharged = START + timedelta(days=pid * 365 // patients)
+            rows.append((pid, f'Patient {pid}', 'Female', 'State', 'Fair', random.random() < 0.3,
+                         random.randint(1, 14), random.choice(RISKS), random.choice(DOCTORS), 'None', 'Chest pain',
+                         None, discharged.isoformat(), '', None))
+        raw.executemany("INSERT INTO patients VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def adhoc_doctor_stats(engine):
+    import pandas as pd
+    patients = pd.read_sql_query('SELECT PatientID, DoctorName, HasChronicCondition, HospitalStayDuration '
+                                 'FROM patients', engine)
+    grouped = patients.groupby('DoctorName')
+    return grouped.agg(patients=('PatientID', 'size'), chronic_rate=('HasChronicCondition', 'mean'),
+                       mean_stay=('HospitalStayDuration', 'mean'), p50=('HospitalStayDuration', 'median'),
+                       p90=('HospitalStayDuration', lambda stays: stays.quantile(0.9)))
+
+
+def median_ms(fn, requests):
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['AI_MODEL_LOAD'] = 'off'
+    os.environ['AI_SERVER_SOCKET'] = ''
+    os.environ['AI_NOTES_CACHE_DB'] = ''
+    os.chdir(tempfile.mkdtemp(prefix='smartdischarge-bench-'))
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from models import engine
+    build(engine, args.patients)
+    started = time.perf_counter()
+    import app as smartdischarge  # builds the rollups for the existing patients
+    print(f"{args.patients} patients; app start with full rollup rebuild {time.perf_counter() - started:.1f}s")
+
+    print(f"{'per-doctor stats':>28} {median_ms(lambda: adhoc_doctor_stats(engine), 3):9.0f} ms  (pandas over every row)")
+    client = smartdischarge.app.test_client()
+    for url in ('/stats', '/stats/doctors', '/stats/length_of_stay', '/stats/discharges?from=2025-03-01&to=2025-03-31'):
+        def request():
+            assert client.get(url).status_code == 200
+        print(f"{url.split('?')[0]:>28} {median_ms(request, args.requests):9.2f} ms")
+
+    rows = [{'name': 'New', 'doctor_name': random.choice(DOCTORS), 'stay_duration': 3, 'discharge_date': '2025-06-01'}
+            for _ in range(1000)]
+    for label, rollups in (('with rollups', smartdischarge.add_to_rollups), ('without', lambda connection, patients: None)):
+        smartdischarge.add_to_rollups = rollups
+        single = median_ms(lambda: client.post('/add_patient', data=rows[0]), args.requests)
+        bulk = median_ms(lambda: client.post('/add_patients', json=rows), 5)
+        print(f"{label:>28} /add_patient {single:6.2f} ms, /add_patients x1000 {bulk:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts, **fields):
+    """Content-address a set of inputs as a stable sha256 hex digest."""
+    payload = json.dumps([parts, fields], sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TieredCache:
+    """LRU memory cache with an optional SQLite tier shared across processes.
+
+    Values may be bytes or anything JSON-serialisable. The SQLite file is safe
+    to share between gunicorn workers and survives restarts; pass db_path=None
+    for a memory-only cache. Both tiers are bounded by entry count and,
+    optionally, by total bytes. Entries can carry a tag so a group of them
+    (e.g. everything derived from one patient) can be dropped together.
+    """
+
+    def __init__(self, name, max_entries=1024, db_path=None, max_disk_entries=100000,
+                 max_bytes=None, max_disk_bytes=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._table = f"cache_{name}"
+        self._memory = OrderedDict()  # key -> (value, size, tag)
+        self._memory_bytes = 0
+        self._tags = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._bytes_since_prune = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        # sqlite3 connections can't cross threads or forks, so keep one per thread per pid
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table} "
+                     "(key TEXT PRIMARY KEY, kind TEXT NOT NULL, value BLOB NOT NULL, accessed REAL NOT NULL, "
+                     "tag TEXT, size INTEGER NOT NULL DEFAULT 0)")
+        # Cache files written before tags and sizes existed
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({self._table})")}
+        if 'tag' not in columns:
+            conn.execute(f"ALTER TABLE {self._table} ADD COLUMN tag TEXT")
+        if 'size' not in columns:
+            conn.execute(f"ALTER TABLE {self._table} ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            conn.execute(f"UPDATE {self._table} SET size = length(value)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self._table}_accessed ON {self._table} (accessed)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self._table}_tag ON {self._table} (tag)")
+        conn.commit()
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _forget(self, key):
+        # Caller holds self._lock
+        value, size, tag = self._memory.pop(key)
+        self._memory_bytes -= size
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _remember(self, key, value, size, tag):
+        with self._lock:
+            if key in self._memory:
+                self._forget(key)
+            self._memory[key] = (value, size, tag)
+            self._memory_bytes += size
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._memory and (len(self._memory) > self.max_entries or
+                                    (self.max_bytes is not None and self._memory_bytes > self.max_bytes)):
+                self._forget(next(iter(self._memory)))
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key][0]
+        if self.db_path:
+            try:
+                conn = self._connection()
+                row = conn.execute(f"SELECT kind, value, tag FROM {self._table} WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute(f"UPDATE {self._table} SET accessed = ? WHERE key = ?", (time.time(), key))
+                    conn.commit()
+                    value = bytes(row[1]) if row[0] == 'bytes' else json.loads(row[1])
+                    self._remember(key, value, len(row[1]), row[2])
+                    with self._lock:
+                        self.hits += 1
+                        self.disk_hits += 1
+                    return value
+            except sqlite3.Error as e:
+                logger.warning("Cache %s disk lookup failed: %s", self.name, str(e))
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value, tag=None):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            kind, stored = 'bytes', bytes(value)
+        else:
+            kind, stored = 'json', json.dumps(value)
+        self._remember(key, value, len(stored), tag)
+        if not self.db_path:
+            return
+        try:
+            conn = self._connection()
+            conn.execute(f"INSERT OR REPLACE INTO {self._table} (key, kind, value, accessed, tag, size) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (key, kind, stored, time.time(), tag, len(stored)))
+            self._writes += 1
+            self._bytes_since_prune += len(stored)
+            if self._writes % 256 == 0 or (self.max_disk_bytes and self._bytes_since_prune > self.max_disk_bytes // 16):
+                self._prune(conn)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Cache %s disk write failed: %s", self.name, str(e))
+
+    def _prune(self, conn):
+        # Trim the least recently used rows now and then rather than on every write
+        conn.execute(f"DELETE FROM {self._table} WHERE key IN (SELECT key FROM {self._table} "
+                     "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+        if self.max_disk_bytes:
+            conn.execute(f"DELETE FROM {self._table} WHERE key IN (SELECT key FROM (SELECT key, SUM(size) OVER "
+                         "(ORDER BY accessed DESC, key ROWS UNBOUNDED PRECEDING) AS running "
+                         f"FROM {self._table}) WHERE running > ?)", (self.max_disk_bytes,))
+        self._bytes_since_prune = 0
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._forget(key)
+        if self.db_path:
+            try:
+                conn = self._connection()
+                conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Cache %s disk delete failed: %s", self.name, str(e))
+
+    def delete_tag(self, tag):
+        """Drop every entry stored with this tag from both tiers."""
+        self.delete_tags([tag])
+
+    def delete_tags(self, tags):
+        """delete_tag() for many tags, in one disk transaction."""
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._forget(key)
+        if self.db_path:
+            try:
+                conn = self._connection()
+                conn.executemany(f"DELETE FROM {self._table} WHERE tag = ?", [(tag,) for tag in tags])
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Cache %s disk delete failed: %s", self.name, str(e))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._memory),
+                'bytes': self._memory_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+from string import Formatter
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), "data", "clinical_rules.json")
+
+
+def merge_rules(base, override):
+    """Deep-merge a rule override onto the base table; override values win."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_rules(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _compile(rows):
+    # Fold each keyed row over the table's 'default' row so a lookup is one dict access
+    default = rows.get('default', {})
+    return {key: {**default, **row} for key, row in rows.items() if key != 'default'}, default
+
+
+class ClinicalRules:
+    """Discharge summary wording driven by a JSON rule table.
+
+    The table holds per-disease rows (exam, labs, course, medications, diet,
+    follow-up, instructions), rows keyed by chronic status, risk category and
+    general health, and the sentence templates that combine them. Every keyed
+    table may carry a 'default' row used for keys it doesn't list. A hospital
+    can change any of it with an override file merged on top of the base table.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        # Identifies this exact table, so caches of rendered summaries can key on it
+        self.fingerprint = hashlib.sha256(json.dumps(table, sort_keys=True).encode('utf-8')).hexdigest()
+        self.diseases, self.default_disease = _compile(table['diseases'])
+        self.chronic = {key == 'true': row for key, row in table['chronic'].items()}
+        self.risk_category = _compile(table['risk_category'])
+        self.general_health = _compile(table['general_health'])
+        self.disease_map = {
+            True: _compile(table['disease_map']['chronic']),
+            False: _compile(table['disease_map']['acute'])
+        }
+        self.templates = table['templates']
+        self._template_parts = {
+            name: [(literal, field) for literal, field, _, _ in Formatter().parse(template)]
+            for name, template in self.templates.items()
+        }
+
+    @classmethod
+    def load(cls, path=RULES_PATH, overrides_path=None):
+        with open(path) as f:
+            table = json.load(f)
+        if overrides_path:
+            with open(overrides_path) as f:
+                table = merge_rules(table, json.load(f))
+            logger.info("Applied clinical rule overrides from %s", overrides_path)
+        return cls(table)
+
+    @staticmethod
+    def _lookup(compiled, key):
+        rows, default = compiled
+        return rows.get(key, default)
+
+    def is_known_disease(self, disease):
+        return disease in self.diseases
+
+    def map_disease(self, general_health, has_chronic, risk_category):
+        """Return (disease, chief complaint, age band) for the GeneralHealth-based mapping."""
+        row = self._lookup(self.disease_map[bool(has_chronic)], general_health)
+        return row['disease'], row['complaint'], self._lookup(self.risk_category, risk_category)['age']
+
+    def facts(self, disease, has_chronic, risk_category, general_health, chief_complaint):
+        """All template fields for one patient."""
+        return {
+            **self.diseases.get(disease, self.default_disease),
+            **self.chronic[bool(has_chronic)],
+            **self._lookup(self.risk_category, risk_category),
+            **self._lookup(self.general_health, general_health),
+            'disease': disease,
+            'chief_complaint': chief_complaint
+        }
+
+    def sections(self, disease, has_chronic, risk_category, general_health, chief_complaint):
+        """Render every template for one patient, as {section: text}."""
+        facts = self.facts(disease, has_chronic, risk_category, general_health, chief_complaint)
+        return {name: template.format(**facts) for name, template in self.templates.items()}
+
+    def sections_frame(self, frame):
+        """Vectorised sections(): frame needs disease, HasChronicCondition, RiskCategory,
+        GeneralHealth and chief_complaint columns; returns one column per template."""
+        chronic = frame['HasChronicCondition'].fillna(False).astype(bool)
+        columns = {'disease': frame['disease'].astype(str), 'chief_complaint': frame['chief_complaint'].astype(str)}
+        for field in self.default_disease:
+            values = {name: row[field] for name, row in self.diseases.items()}
+            columns[field] = frame['disease'].map(values).fillna(self.default_disease[field])
+        for field in self.chronic[True]:
+            columns[field] = chronic.map({flag: row[field] for flag, row in self.chronic.items()})
+        for source, compiled in (('RiskCategory', self.risk_category), ('GeneralHealth', self.general_health)):
+            rows, default = compiled
+            for field in default:
+                columns[field] = frame[source].map({key: row[field] for key, row in rows.items()}).fillna(default[field])
+
+        sections = {}
+        for name, parts in self._template_parts.items():
+            text = pd.Series('', index=frame.index, dtype=object)
+            for literal, field in parts:
+                if literal:
+                    text = text + literal
+                if field is not None:
+                    text = text + columns[field].astype(str)
+            sections[name] = text
+        return pd.DataFrame(sections, index=frame.index)
@@ -0,0 +1,105 @@
+"""HTTP caching and offload for the files the app serves.
+
+send_cached_file() wraps Flask's send_file (which already answers Range and
+If-Modified-Since requests) with strong ETags, private cache lifetimes and
+optional hand-off of the body to the front web server. StaticVersions gives
+static assets content-hashed URLs that browsers may keep for a year.
+"""
+import hashlib
+import io
+import os
+from urllib.parse import quote
+
+from flask import Response, request, send_file
+from werkzeug.security import safe_join
+
+# FILE_OFFLOAD hands file bodies to the front server instead of streaming them
+# through a worker: 'x-sendfile' (Apache mod_xsendfile, lighttpd) or 'x-accel'
+# (nginx). For nginx, X_ACCEL_PREFIX must be an internal location aliased to
+# the filesystem root, e.g. `location /_files/ { internal; alias /; }`.
+FILE_OFFLOAD = os.environ.get('FILE_OFFLOAD', '').lower()
+X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX', '/_files').rstrip('/')
+OFFLOAD_HEADERS = ('X-Sendfile', 'X-Accel-Redirect')
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+def apply_cache_policy(response, max_age=0, immutable=False, public=False):
+    """Set Cache-Control: max_age > 0 lets the browser reuse its copy without asking,
+    0 makes it revalidate every time (answered with a 304 while the ETag matches)."""
+    cache_control = response.cache_control
+    cache_control.max_age = max_age
+    cache_control.no_cache = None if max_age > 0 else True
+    cache_control.immutable = immutable and max_age > 0
+    cache_control.public = public
+    cache_control.private = not public
+    return response
+
+
+def offload_body(response, path):
+    """Swap the response body for a header naming the file, for the front server to send."""
+    response.close()
+    response.response = []
+    response.direct_passthrough = False
+    # The length of the empty placeholder body would be wrong for the real file
+    response.automatically_set_content_length = False
+    absolute = os.path.abspath(path)
+    if FILE_OFFLOAD == 'x-sendfile':
+        response.headers['X-Sendfile'] = absolute
+    else:
+        response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIX + quote(absolute)
+    # Only 304s are decided here; the front server handles Range itself
+    response = response.make_conditional(request.environ)
+    if response.status_code == 304:
+        for header in OFFLOAD_HEADERS:
+            response.headers.pop(header, None)
+    return response
+
+
+def send_cached_file(path=None, data=None, etag=None, max_age=0, immutable=False, **kwargs):
+    """Serve a file from path, or bytes from data, with caching headers.
+
+    etag should identify the exact content (a hash, or the token of an
+    immutable artifact); without one, send_file derives a weak one from the
+    file's mtime and size. Responses are private because reports and
+    summaries hold patient data. Extra arguments go to send_file.
+    """
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        # The browser already has these bytes; answer without opening the file
+        response = Response(status=304)
+        response.set_etag(etag)
+        return apply_cache_policy(response, max_age, immutable)
+    if path is not None:
+        # Flask would resolve a relative path against the app's root, not the working directory
+        path = os.path.abspath(path)
+    offload = path is not None and FILE_OFFLOAD in ('x-sendfile', 'x-accel')
+    response = send_file(path if path is not None else io.BytesIO(data), etag=etag if etag is not None else True,
+                         max_age=max_age, conditional=not offload, **kwargs)
+    if offload:
+        response = offload_body(response, path)
+    return apply_cache_policy(response, max_age, immutable)
+
+
+class StaticVersions:
+    """Short content hashes of static files, recomputed when a file's mtime changes."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._versions = {}
+
+    def get(self, filename):
+        path = safe_join(self.folder, filename)
+        try:
+            mtime = os.path.getmtime(path) if path else None
+        except OSError:
+            mtime = None
+        if mtime is None:
+            return None
+        cached = self._versions.get(filename)
+        if cached is None or cached[0] != mtime:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            cached = self._versions[filename] = (mtime, digest.hexdigest()[:12])
+        return cached[1]
@@ -0,0 +1,59 @@
+import gc
+import os
+import subprocess
+import sys
+
+# Gunicorn settings used by the Procfile
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# Threaded workers, so open /jobs/<id>/events streams and status polls don't
+# each pin a whole process while generation runs on the job pool
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# The notes model runs once, in the model_server.py sidecar started below, and
+# every worker talks to it over a Unix socket. Set AI_SERVER_SOCKET='' to load
+# the model in each worker instead.
+os.environ.setdefault('AI_SERVER_SOCKET', '/tmp/smartdischarge-model.sock')
+
+# Import app.py once in the master. When the model is loaded in-process, a
+# background load started there would still be running when the workers fork,
+# and each worker would load its own on top (N+1 copies). So the master loads
+# nothing and each worker starts its background load after forking (N copies).
+# AI_MODEL_LOAD=eager loads once before forking instead, and the workers share
+# the weights copy-on-write, at the cost of a slow start.
+preload_app = True
+os.environ.setdefault('AI_MODEL_LOAD', 'background')
+_load_in_workers = not os.environ['AI_SERVER_SOCKET'] and os.environ['AI_MODEL_LOAD'] == 'background'
+if _load_in_workers:
+    os.environ['AI_MODEL_LOAD'] = 'lazy'  # only post_fork (or a request) starts a load
+
+_model_server = None
+
+
+def on_starting(server):
+    global _model_server
+    if os.environ['AI_SERVER_SOCKET']:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_server.py')
+        _model_server = subprocess.Popen([sys.executable, script])
+        server.log.info("Started model server (pid %s) on %s", _model_server.pid, os.environ['AI_SERVER_SOCKET'])
+
+
+def on_exit(server):
+    if _model_server is not None and _model_server.poll() is None:
+        _model_server.terminate()
+        try:
+            _model_server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _model_server.kill()
+
+
+def pre_fork(server, worker):
+    # Move the preloaded objects out of the GC's reach so collections in the
+    # workers don't touch (and un-share) their pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if _load_in_workers:
+        from app import model_manager
+        model_manager.warm_in_background()
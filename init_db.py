@@ -1,7 +1,17 @@
 import pandas as pd
 import os
+import time
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from contextlib import contextmanager
+from sqlalchemy import bindparam, select, update
 from sqlalchemy.exc import SQLAlchemyError
-from models import Patient, Base, engine, SessionLocal
+from models import ORIGIN_APP, IngestState, Base, Patient, engine, SessionLocal, create_schema
+from search_index import drop_search_index, drop_triggers, rebuild_search_index
+from analytics import add_to_rollups, rebuild_rollups
+from schema_mapping import MAPPINGS, get_mapping
 import logging
 
 # Configure logging
@@ -12,100 +22,283 @@ def reset_database():
     """Drop and recreate the database tables."""
     try:
         logger.info("Resetting database")
+        with engine.begin() as connection:
+            drop_search_index(connection)
         Base.metadata.drop_all(engine)
-        Base.metadata.create_all(engine)
+        create_schema(engine)
         logger.info("Database reset successfully")
     except SQLAlchemyError as e:
         logger.error("Error resetting database: %s", str(e))
         raise
 
-def load_data_from_csv(csv_path, row_limit=10000):
-    """Load data from CSV into the patients table, up to row_limit rows."""
+@contextmanager
+def bulk_load_pragmas(connection):
+    """Relax SQLite durability for the duration of a bulk load, then restore it."""
+    if connection.dialect.name != 'sqlite':
+        yield
+        return
+    # Use the DBAPI cursor directly so the PRAGMAs run outside SQLAlchemy's transaction
+    cursor = connection.connection.cursor()
+    saved = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in ('journal_mode', 'synchronous', 'cache_size')}
+    if saved['journal_mode'] == 'wal':
+        # Leaving WAL needs exclusive access, which running workers would block; WAL is fast enough
+        del saved['journal_mode']
+    else:
+        cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA cache_size=-262144")  # 256MB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def insert_chunk(connection, table, df, upsert=False):
+    """Insert a prepared chunk with a single executemany, optionally updating rows with the same key.
+
+    Upserts leave patients added through the app alone (Origin is set).
+    """
+    keys = [col.name for col in table.primary_key.columns]
+    guarded = upsert and 'Origin' in table.c
+    updated = [col for col in df.columns if col not in keys]
+    dates = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    if dates:
+        # As SQLAlchemy's Date type stores them: ISO text on SQLite, date objects elsewhere
+        df = df.assign(**{col: df[col].dt.strftime('%Y-%m-%d') if connection.dialect.name == 'sqlite' else df[col].dt.date
+                          for col in dates})
+    if connection.dialect.name == 'sqlite':
+        # Plain tuples through the driver skip SQLAlchemy's per-row parameter processing
+        columns = ', '.join(df.columns)
+        placeholders = ', '.join('?' for _ in df.columns)
+        sql = f"INSERT INTO {table.name} ({columns}) VALUES ({placeholders})"
+        if upsert:
+            sql += f" ON CONFLICT({', '.join(keys)}) DO UPDATE SET " + ', '.join(f"{col}=excluded.{col}" for col in updated)
+            if guarded:
+                sql += f" WHERE {table.name}.Origin IS NULL"
+        values = df.astype(object)
+        rows = list(values.where(df.notna(), None).itertuples(index=False, name=None))
+        connection.exec_driver_sql(sql, rows)
+        return
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    if upsert and connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        stmt = pg_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_={col: stmt.excluded[col] for col in updated},
+                                          where=table.c.Origin.is_(None) if guarded else None)
+        connection.execute(stmt, records)
+    elif upsert:
+        update_or_insert(connection, table, records, updated, guarded)
+    else:
+        connection.execute(table.insert(), records)
+
+def update_or_insert(connection, table, records, updated, guarded, batch_size=1000):
+    """Portable upsert for databases without ON CONFLICT: update the rows that exist, insert the rest.
+
+    Rows are updated in place rather than deleted and reinserted, which would
+    cascade to the patient's test reports. The upserted tables are all keyed
+    on PatientID alone.
+    """
+    key = table.primary_key.columns[0]
+    ids = [record[key.name] for record in records]
+    existing = set()
+    for start in range(0, len(ids), batch_size):
+        existing.update(connection.scalars(select(key).where(key.in_(ids[start:start + batch_size]))))
+    new = [record for record in records if record[key.name] not in existing]
+    if new:
+        connection.execute(table.insert(), new)
+    changed = [record for record in records if record[key.name] in existing]
+    if changed and updated:
+        stmt = update(table).where(key == bindparam('key_')).values({col: bindparam(f"{col}_") for col in updated})
+        if guarded:
+            stmt = stmt.where(table.c.Origin.is_(None))
+        connection.execute(stmt, [{'key_': record[key.name], **{f"{col}_": record[col] for col in updated}}
+                                  for record in changed])
+
+def sync_id_sequence(connection):
+    """Move the PatientID sequence past the loaded IDs so app inserts don't collide with them.
+
+    CSV loads insert explicit IDs, which PostgreSQL's sequence doesn't see;
+    SQLite allocates from max(rowid) and needs nothing.
+    """
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(
+            "SELECT setval(pg_get_serial_sequence('patients', 'PatientID'), "
+            "COALESCE((SELECT MAX(\"PatientID\") FROM patients), 0) + 1, false)")
+
+def insert_frames(connection, frames, upsert=False):
+    """Insert every table's frame from a schema mapping, patients first so foreign keys resolve."""
+    for table_name, df in frames.items():
+        if len(df):
+            insert_chunk(connection, Base.metadata.tables[table_name], df, upsert=upsert)
+
+def skip_app_patients(connection, frames):
+    """Drop a chunk's rows whose PatientIDs belong to patients added through the app.
+
+    App IDs come from the database, so a CSV that grows after them can reuse
+    them; those source rows are logged and left out rather than replacing
+    the app's patient (or attaching clinical records to it).
+    """
+    ids = frames['patients']['PatientID']
+    if not len(ids):
+        return frames
+    taken = set(connection.scalars(select(Patient.PatientID).where(
+        Patient.PatientID.between(int(ids.min()), int(ids.max())), Patient.Origin == ORIGIN_APP)))
+    taken &= set(ids.tolist())
+    if not taken:
+        return frames
+    logger.warning("Skipping %d CSV rows whose PatientIDs belong to patients added through the app: %s",
+                   len(taken), ', '.join(str(pid) for pid in sorted(taken)[:20]) + (' ...' if len(taken) > 20 else ''))
+    return {table_name: df[~df['PatientID'].isin(taken)] for table_name, df in frames.items()}
+
+def read_mapped_chunks(csv_path, schema, chunk_size, row_limit=None):
+    """Yield (index, frames) for each CSV chunk, run through the matching schema mapping."""
+    mapping = get_mapping(schema, pd.read_csv(csv_path, nrows=0).columns)
+    logger.info("Reading %s with the %s schema mapping", csv_path, mapping.name)
+    for index, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunk_size, nrows=row_limit)):
+        yield index, mapping.transform(chunk)
+
+def load_data_from_csv(csv_path, row_limit=None, chunk_size=50000, schema='auto'):
+    """Bulk load a CSV into the patients table in chunks, with no row cap unless row_limit is given."""
     if not os.path.exists(csv_path):
         logger.error("CSV file not found at: %s", csv_path)
         raise FileNotFoundError(f"CSV file not found at: {csv_path}")
 
+    logger.info("Loading CSV file: %s", csv_path)
+    total = 0
+    started = time.perf_counter()
     try:
-        logger.info("Loading CSV file: %s", csv_path)
-        # Read only the first row_limit rows
-        df = pd.read_csv(csv_path, nrows=row_limit)
-        logger.info("Read %d rows from CSV", len(df))
-
-        # Define expected columns based on Patient model
-        expected_columns = [
-            'PatientID', 'Name', 'Sex', 'State', 'GeneralHealth',
-            'HasChronicCondition', 'HospitalStayDuration', 'RiskCategory',
-            'DoctorName', 'Allergies', 'ChiefComplaint', 'AdmissionDate',
-            'DischargeDate', 'TestReports'
-        ]
-
-        # Check for missing columns and add defaults
-        for col in expected_columns:
-            if col not in df.columns:
-                logger.warning("Column %s missing in CSV, adding with default value", col)
-                df[col] = None if col != 'TestReports' else ''
-
-        # Select only expected columns
-        df = df[expected_columns]
-
-        # Clean and validate data
-        df['PatientID'] = pd.to_numeric(df['PatientID'], errors='coerce').fillna(0).astype(int)
-        df['HasChronicCondition'] = df['HasChronicCondition'].map({True: True, False: False, 'Yes': True, 'No': False, 1: True, 0: False}).fillna(False)
-        df['HospitalStayDuration'] = pd.to_numeric(df['HospitalStayDuration'], errors='coerce').fillna(1).astype(int)
-        df['Name'] = df['Name'].fillna('Unknown').astype(str)
-        df['Sex'] = df['Sex'].fillna('Unknown').astype(str)
-        df['State'] = df['State'].fillna('Unknown').astype(str)
-        df['GeneralHealth'] = df['GeneralHealth'].fillna('Unknown').astype(str)
-        df['RiskCategory'] = df['RiskCategory'].fillna('Unknown').astype(str)
-        df['DoctorName'] = df['DoctorName'].fillna('Dr. Anita Sharma').astype(str)
-        df['Allergies'] = df['Allergies'].fillna('None').astype(str)
-        df['ChiefComplaint'] = df['ChiefComplaint'].fillna('Unknown').astype(str)
-        df['AdmissionDate'] = df['AdmissionDate'].fillna('Unknown').astype(str)
-        df['DischargeDate'] = df['DischargeDate'].fillna('Unknown').astype(str)
-        df['TestReports'] = df['TestReports'].fillna('').astype(str)
-
-        session = SessionLocal()
-        try:
-            # Insert data in chunks to avoid memory issues
-            chunk_size = 1000
-            for start in range(0, len(df), chunk_size):
-                chunk = df[start:start + chunk_size]
-                patients = [
-                    Patient(
-                        PatientID=row['PatientID'],
-                        Name=row['Name'],
-                        Sex=row['Sex'],
-                        State=row['State'],
-                        GeneralHealth=row['GeneralHealth'],
-                        HasChronicCondition=row['HasChronicCondition'],
-                        HospitalStayDuration=row['HospitalStayDuration'],
-                        RiskCategory=row['RiskCategory'],
-                        DoctorName=row['DoctorName'],
-                        Allergies=row['Allergies'],
-                        ChiefComplaint=row['ChiefComplaint'],
-                        AdmissionDate=row['AdmissionDate'],
-                        DischargeDate=row['DischargeDate'],
-                        TestReports=row['TestReports']
-                    ) for _, row in chunk.iterrows() if row['PatientID'] > 0
-                ]
-                session.bulk_save_objects(patients)
-                session.commit()
-                logger.info("Inserted %d-%d of %d rows", start, min(start + chunk_size, len(df)), len(df))
-        except SQLAlchemyError as e:
-            session.rollback()
-            logger.error("Error inserting data into database: %s", str(e))
-            raise
-        finally:
-            session.close()
-        logger.info("Successfully loaded %d rows into database", len(df))
+        with engine.connect() as connection:
+            with bulk_load_pragmas(connection):
+                with connection.begin():
+                    # Index the text in one pass at the end instead of row by row
+                    drop_triggers(connection)
+                    for _, frames in read_mapped_chunks(csv_path, schema, chunk_size, row_limit):
+                        insert_frames(connection, frames)
+                        add_to_rollups(connection, frames['patients'])
+                        total += len(frames['patients'])
+                        elapsed = time.perf_counter() - started
+                        logger.info("Inserted %d rows (%.0f rows/s)", total, total / elapsed if elapsed else 0)
+                    sync_id_sequence(connection)
+                    rebuild_search_index(connection)
     except pd.errors.EmptyDataError:
         logger.error("CSV file is empty: %s", csv_path)
         raise
+    except SQLAlchemyError as e:
+        logger.error("Error inserting data into database: %s", str(e))
+        raise
     except Exception as e:
         logger.error("Unexpected error loading CSV: %s", str(e))
         raise
 
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed else 0
+    logger.info("Successfully loaded %d rows into database in %.2fs (%.0f rows/s)", total, elapsed, rate)
+    return total
+
+def file_fingerprint(path):
+    """sha256 of the file contents, read in 1MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_fingerprint(frames):
+    """sha256 over pandas' per-row hashes of every table's frame for a chunk."""
+    digest = hashlib.sha256()
+    for table_name, df in frames.items():
+        digest.update(table_name.encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+def sync_data_from_csv(csv_path, chunk_size=50000, schema='auto'):
+    """Upsert only the chunks of the CSV that changed since the last load.
+
+    Unlike reset + load, existing rows are kept. CSV rows whose PatientIDs
+    belong to patients added through the app are skipped (skip_app_patients),
+    not applied over them. Rows removed from the CSV are not deleted.
+    """
+    if not os.path.exists(csv_path):
+        logger.error("CSV file not found at: %s", csv_path)
+        raise FileNotFoundError(f"CSV file not found at: {csv_path}")
+
+    started = time.perf_counter()
+    source = os.path.abspath(csv_path)
+    stat = os.stat(csv_path)
+    session = SessionLocal()
+    try:
+        state = session.get(IngestState, source)
+        # Fast path: same size and mtime as the last load, nothing to read
+        if state and state.FileSize == stat.st_size and state.FileMtime == stat.st_mtime:
+            logger.info("Source %s unchanged since %s (%d rows), skipping load", csv_path, state.LoadedAt, state.RowCount)
+            return 0
+
+        file_hash = file_fingerprint(csv_path)
+        if state and state.FileHash == file_hash:
+            state.FileSize, state.FileMtime = stat.st_size, stat.st_mtime
+            session.commit()
+            logger.info("Source %s touched but content unchanged, skipping load", csv_path)
+            return 0
+
+        previous = json.loads(state.ChunkHashes) if state and state.ChunkSize == chunk_size else []
+        chunk_hashes, total, upserted = [], 0, 0
+        with engine.connect() as connection:
+            with bulk_load_pragmas(connection):
+                with connection.begin():
+                    for index, frames in read_mapped_chunks(csv_path, schema, chunk_size):
+                        rows = len(frames['patients'])
+                        fingerprint = chunk_fingerprint(frames)
+                        chunk_hashes.append(fingerprint)
+                        total += rows
+                        if index < len(previous) and previous[index] == fingerprint:
+                            continue
+                        frames = skip_app_patients(connection, frames)
+                        insert_frames(connection, frames, upsert=True)
+                        upserted += len(frames['patients'])
+                        logger.info("Upserted chunk %d (%d rows)", index, rows)
+                    sync_id_sequence(connection)
+                    if upserted:
+                        # Upserts can change patients already counted, so recount from scratch
+                        rebuild_rollups(connection)
+
+        if state is None:
+            state = IngestState(Source=source)
+            session.add(state)
+        state.FileSize, state.FileMtime, state.FileHash = stat.st_size, stat.st_mtime, file_hash
+        state.ChunkSize, state.ChunkHashes, state.RowCount = chunk_size, json.dumps(chunk_hashes), total
+        state.LoadedAt = datetime.now().isoformat(timespec='seconds')
+        session.commit()
+    except pd.errors.EmptyDataError:
+        logger.error("CSV file is empty: %s", csv_path)
+        raise
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.error("Error syncing data into database: %s", str(e))
+        raise
+    finally:
+        session.close()
+
+    logger.info("Synced %s: %d of %d rows upserted in %.2fs", csv_path, upserted, total, time.perf_counter() - started)
+    return upserted
+
+# dataset.csv in the native schema if present, otherwise the bundled cardiology dataset
+DEFAULT_CSV_PATHS = [
+    os.path.join(os.path.dirname(__file__), "dataset.csv"),
+    os.path.join(os.path.dirname(__file__), "data", "cardiology_dataset_corrected.csv")
+]
+
 if __name__ == "__main__":
-    csv_path = os.path.join(os.path.dirname(__file__), "dataset.csv")
-    reset_database()
-    load_data_from_csv(csv_path, row_limit=10000)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load the patients CSV into the database.")
+    parser.add_argument('--csv', default=next((path for path in DEFAULT_CSV_PATHS if os.path.exists(path)), DEFAULT_CSV_PATHS[0]))
+    parser.add_argument('--schema', default='auto', help="Schema mapping for the CSV: auto, " + ", ".join(MAPPINGS))
+    parser.add_argument('--reset', action='store_true', help="Drop all tables and reload from scratch instead of syncing")
+    parser.add_argument('--limit', type=int, default=None, help="With --reset, only load the first N rows")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    args = parser.parse_args()
+    if args.reset:
+        reset_database()
+        load_data_from_csv(args.csv, row_limit=args.limit, chunk_size=args.chunk_size, schema=args.schema)
+    else:
+        sync_data_from_csv(args.csv, chunk_size=args.chunk_size, schema=args.schema)
@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ('done', 'failed')
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class JobStore:
+    """Job status rows in SQLite, so any gunicorn worker can report on any job.
+
+    With db_path=None the rows live in a shared in-memory database that only
+    this process can see, which is enough for a single-worker setup.
+    """
+
+    def __init__(self, db_path=None, ttl=3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._changed = threading.Condition()
+        self._memory_name = f"file:jobs-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        self._keepalive = None
+
+    def _connection(self):
+        # sqlite3 connections can't cross threads or forks, so keep one per thread per pid
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        if self.db_path:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        else:
+            conn = sqlite3.connect(self._memory_name, uri=True, timeout=5)
+            if self._keepalive is None or self._keepalive[0] != os.getpid():
+                # The shared in-memory database disappears with its last connection
+                self._keepalive = (os.getpid(), sqlite3.connect(self._memory_name, uri=True, check_same_thread=False))
+        conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, "
+                     "result TEXT, error TEXT, error_code INTEGER, created REAL NOT NULL, updated REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated)")
+        conn.commit()
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def create(self):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connection()
+        conn.execute("INSERT INTO jobs (id, status, stage, created, updated) VALUES (?, 'queued', 'queued', ?, ?)",
+                     (job_id, now, now))
+        conn.execute("DELETE FROM jobs WHERE updated < ?", (now - self.ttl,))
+        conn.commit()
+        return job_id
+
+    def update(self, job_id, status=None, stage=None, result=None, error=None, error_code=None):
+        fields = {'updated': time.time()}
+        if status is not None:
+            fields['status'] = status
+        if stage is not None:
+            fields['stage'] = stage
+        if result is not None:
+            fields['result'] = json.dumps(result)
+        if error is not None:
+            fields['error'], fields['error_code'] = error, error_code
+        conn = self._connection()
+        conn.execute(f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                     (*fields.values(), job_id))
+        conn.commit()
+        with self._changed:
+            self._changed.notify_all()
+
+    def get(self, job_id):
+        row = self._connection().execute(
+            "SELECT id, status, stage, result, error, error_code, created, updated FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row[0],
+            'status': row[1],
+            'stage': row[2],
+            'result': json.loads(row[3]) if row[3] else None,
+            'error': row[4],
+            'error_code': row[5],
+            'created': row[6],
+            'updated': row[7]
+        }
+
+    def wait_for_change(self, timeout):
+        """Block until a job in this process is updated, or timeout for ones run by other workers."""
+        with self._changed:
+            self._changed.wait(timeout)
+
+
+class JobQueue:
+    """Runs jobs on a small per-process thread pool and records their progress in a JobStore.
+
+    The job function is called as fn(report, *args), where report(stage) marks
+    progress; its return value becomes the job result. Exceptions carrying a
+    status_code attribute keep it as error_code.
+    """
+
+    def __init__(self, store, max_workers=2, max_pending=32, name='generate-job'):
+        self.store = store
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # The pool is created on first use so each forked worker gets its own threads
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending)")
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            self._pending += 1
+        try:
+            job_id = self.store.create()
+            self._pool.submit(self._run, job_id, fn, args)
+        except Exception:
+            # _run won't release the slot for a job that never started, so release it here
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        try:
+            self.store.update(job_id, status='running')
+            result = fn(lambda stage: self.store.update(job_id, stage=stage), *args)
+            self.store.update(job_id, status='done', stage='done', result=result)
+        except Exception as e:
+            logger.error("Job %s failed: %s", job_id, str(e))
+            self.store.update(job_id, status='failed', stage='failed', error=str(e),
+                              error_code=getattr(e, 'status_code', 500))
+        finally:
+            with self._lock:
+                self._pending -= 1
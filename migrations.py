@@ -0,0 +1,131 @@
+"""In-place schema changes for databases created by older versions.
+
+models.create_schema() runs these on startup, after create_all. Each checks
+the live schema first and does nothing once applied, so every worker can
+call them.
+"""
+import logging
+import time
+
+import pandas as pd
+from sqlalchemy import Column, Date, Integer, MetaData, Table, inspect
+from sqlalchemy.schema import CreateTable
+
+from schema_mapping import parse_dates
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_CHUNK_SIZE = 100000
+
+
+def add_missing_columns(engine, table):
+    """Add model columns that the live table lacks. Only for nullable columns without defaults."""
+    with engine.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # Take the write lock before checking, so workers starting together add them once
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        inspector = inspect(connection)
+        existing = {column['name'] for column in inspector.get_columns(table.name)} if inspector.has_table(table.name) else None
+        missing = [column for column in table.columns if existing is not None and column.name not in existing]
+        quote = connection.dialect.identifier_preparer.quote
+        for column in missing:
+            connection.exec_driver_sql(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                                       f"{column.type.compile(dialect=connection.dialect)}")
+            logger.info("Added column %s.%s", table.name, column.name)
+        connection.commit()
+    return [column.name for column in missing]
+
+
+def retype_as_date(engine, table, columns):
+    """Convert text date columns of an existing table to DATE.
+
+    Values are parsed with pandas a chunk at a time (plain ISO dates in one
+    vectorised pass); anything unparseable, such as the old 'Unknown'
+    default, becomes NULL. The parsed dates go to a temporary table and are
+    joined back in one statement. SQLite can't change a column's type, so
+    there the table is rebuilt; its indexes and triggers are recreated by
+    create_schema afterwards.
+    """
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # Take the write lock before checking, so workers starting together migrate once
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        pending = text_columns(connection, table, columns)
+        if not pending:
+            connection.rollback()
+            return 0
+        key = table.primary_key.columns[0]
+        dates = read_dates(connection, table, key, pending)
+        staged = stage_dates(connection, key, pending, dates)
+        quote = connection.dialect.identifier_preparer.quote
+        if connection.dialect.name == 'sqlite':
+            rebuild_with(connection, table, key, pending, staged)
+        else:
+            for name in pending:
+                connection.exec_driver_sql(f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(name)} TYPE DATE USING NULL")
+            connection.exec_driver_sql(
+                f"UPDATE {quote(table.name)} SET {', '.join(f'{quote(name)} = d.{quote(name)}' for name in pending)} "
+                f"FROM {quote(staged.name)} d WHERE {quote(table.name)}.{quote(key.name)} = d.{quote(key.name)}")
+        staged.drop(connection)
+        connection.commit()
+    logger.info("Migrated %s.%s to DATE (%d rows with dates) in %.2fs", table.name, ', '.join(pending), len(dates),
+                time.perf_counter() - started)
+    return len(dates)
+
+
+def text_columns(connection, table, columns):
+    """The given columns that exist in the live table but aren't DATE yet."""
+    inspector = inspect(connection)
+    if not inspector.has_table(table.name):
+        return []
+    return [column['name'] for column in inspector.get_columns(table.name)
+            if column['name'] in columns and not isinstance(column['type'], Date)]
+
+
+def read_dates(connection, table, key, names):
+    """Primary key and parsed dates (datetime64) of every row with at least one date."""
+    quote = connection.dialect.identifier_preparer.quote
+    # Plain SQL, so the stored strings come back unconverted by the model's Date type
+    sql = f"SELECT {quote(key.name)}, {', '.join(quote(name) for name in names)} FROM {quote(table.name)}"
+    frames = []
+    for chunk in pd.read_sql_query(sql, connection, chunksize=MIGRATION_CHUNK_SIZE):
+        for name in names:
+            chunk[name] = parse_dates(chunk[name])
+        frames.append(chunk[chunk[list(names)].notna().any(axis=1)])
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[key.name, *names])
+
+
+def stage_dates(connection, key, names, dates):
+    """Load the parsed dates into a temporary table keyed like the migrated one."""
+    staged = Table('migration_dates', MetaData(), Column(key.name, Integer, primary_key=True),
+                   *(Column(name, Date) for name in names), prefixes=['TEMPORARY'])
+    staged.create(connection)
+    if not len(dates):
+        return staged
+    if connection.dialect.name == 'sqlite':
+        # Plain tuples of ISO text (how the Date type stores them) skip SQLAlchemy's
+        # per-row parameter processing, as in init_db's bulk load
+        values = dates.assign(**{name: dates[name].dt.strftime('%Y-%m-%d') for name in names})
+        placeholders = ', '.join('?' for _ in values.columns)
+        connection.exec_driver_sql(f"INSERT INTO {staged.name} VALUES ({placeholders})",
+                                   list(values.astype(object).where(values.notna(), None).itertuples(index=False, name=None)))
+    else:
+        values = dates.assign(**{name: dates[name].dt.date for name in names})
+        connection.execute(staged.insert(), values.astype(object).where(values.notna(), None).to_dict('records'))
+    return staged
+
+
+def rebuild_with(connection, table, key, names, staged):
+    """Recreate a SQLite table from its model definition, taking the named columns from the staged table."""
+    quote = connection.dialect.identifier_preparer.quote
+    staging = table.to_metadata(MetaData(), name=f"{table.name}_migrating")
+    connection.execute(CreateTable(staging))
+    columns = [quote(column.name) for column in table.columns]
+    selected = [f"{'d' if column.name in names else 't'}.{quote(column.name)}" for column in table.columns]
+    connection.exec_driver_sql(f"INSERT INTO {quote(staging.name)} ({', '.join(columns)}) "
+                               f"SELECT {', '.join(selected)} FROM {quote(table.name)} t "
+                               f"LEFT JOIN {quote(staged.name)} d ON d.{quote(key.name)} = t.{quote(key.name)}")
+    # Foreign keys aren't enforced (no PRAGMA foreign_keys), so dependent rows stay put
+    connection.exec_driver_sql(f"DROP TABLE {quote(table.name)}")
+    connection.exec_driver_sql(f"ALTER TABLE {quote(staging.name)} RENAME TO {quote(table.name)}")
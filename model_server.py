@@ -0,0 +1,270 @@
+"""Shared inference sidecar.
+
+One process owns the notes model and micro-batches requests from every
+gunicorn worker, so memory doesn't grow with the number of HTTP workers.
+Workers connect over a Unix socket (AI_SERVER_SOCKET) using
+RemoteModelManager / RemoteInferenceScheduler, which mirror the in-process
+ModelManager / InferenceScheduler interface.
+
+    AI_SERVER_SOCKET=/tmp/smartdischarge-model.sock python model_server.py
+
+Messages are length-prefixed JSON (4-byte big-endian length) in both directions.
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ai_model import ModelManager, InferenceScheduler, QueueFullError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '/tmp/smartdischarge-model.sock'
+_HEADER = struct.Struct('>I')
+
+
+def send_message(sock, message):
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_message(sock):
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    payload = _recv_exactly(sock, _HEADER.unpack(header)[0])
+    if payload is None:
+        raise ConnectionError("Connection closed mid-message")
+    return json.loads(payload)
+
+
+def _recv_exactly(sock, size):
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ConnectionError("Connection closed mid-message")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves generate, stream and status requests from the shared ModelManager."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, model_manager, scheduler):
+        self.model_manager = model_manager
+        self.scheduler = scheduler
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        old_umask = os.umask(0o077)  # socket only reachable by this user
+        try:
+            super().__init__(socket_path, ModelRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+
+class ModelRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            request = recv_message(self.request)
+            if request is None:
+                return
+            op = request.get('op')
+            if op == 'status':
+                manager = self.server.model_manager
+                send_message(self.request, {'status': manager.status, 'model': manager.model_name,
+                                            'backend': manager.backend})
+            elif op == 'generate':
+                # Blocks this connection's thread; the scheduler batches across connections
+                text = self.server.scheduler.generate(request['prompt'], timeout=request.get('timeout', 60),
+                                                      **request.get('kwargs', {}))
+                send_message(self.request, {'text': text})
+            elif op == 'stream':
+                for text in self.server.scheduler.stream(request['prompt'], max_chars=request.get('max_chars'),
+                                                         **request.get('kwargs', {})):
+                    send_message(self.request, {'token': text})
+                send_message(self.request, {'done': True})
+            else:
+                send_message(self.request, {'error': f"Unknown op {op!r}"})
+        except (BrokenPipeError, ConnectionError):
+            # Client went away; closing the stream generator above cancels its generation
+            pass
+        except Exception as e:
+            logger.error("Model server request failed: %s", str(e))
+            try:
+                send_message(self.request, {'error': str(e), 'queue_full': isinstance(e, QueueFullError)})
+            except OSError:
+                pass
+
+
+class RemoteModelManager:
+    """Client-side stand-in for ModelManager backed by the sidecar.
+
+    get() returns a truthy handle only while the sidecar answers and reports
+    the model ready, so callers fall back to template notes when it is down.
+    """
+
+    def __init__(self, socket_path, model_name="distilgpt2", connect_timeout=1.0, status_ttl=2.0):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.connect_timeout = connect_timeout
+        self.status_ttl = status_ttl
+        self.backend = 'remote'
+        self._status = None
+        self._checked = 0.0
+
+    def connect(self, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(timeout)
+        return sock
+
+    @property
+    def status(self):
+        if time.monotonic() - self._checked < self.status_ttl:
+            return self._status
+        try:
+            with self.connect(timeout=self.connect_timeout) as sock:
+                send_message(sock, {'op': 'status'})
+                self._status = (recv_message(sock) or {}).get('status', 'unavailable')
+        except (OSError, ValueError):
+            self._status = 'unavailable'
+        self._checked = time.monotonic()
+        return self._status
+
+    @property
+    def ready(self):
+        return self.status == 'ready'
+
+    def start(self):
+        pass
+
+    def get(self):
+        return self if self.ready else None
+
+    def load(self, timeout=120):
+        """Wait for the sidecar to report ready; returns the handle, or None on timeout or failure."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = self.status
+            if status == 'ready':
+                return self
+            if status == 'failed':
+                return None
+            time.sleep(self.status_ttl)
+        return None
+
+
+class RemoteInferenceScheduler:
+    """Client-side stand-in for InferenceScheduler: each call is one round trip to the sidecar."""
+
+    def __init__(self, model_manager, max_queue_depth=None, timeout=60):
+        self.model_manager = model_manager
+        self.max_queue_depth = int(max_queue_depth or os.environ.get('AI_QUEUE_MAX_DEPTH', 64))
+        self.timeout = timeout
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.max_queue_depth)
+        self._lock = threading.Lock()
+
+    def _call(self, request):
+        try:
+            with self.model_manager.connect(timeout=self.timeout) as sock:
+                send_message(sock, request)
+                reply = recv_message(sock)
+        except OSError as e:
+            raise RuntimeError(f"Model server unavailable: {e}")
+        if reply is None:
+            raise RuntimeError("Model server closed the connection")
+        if 'error' in reply:
+            raise (QueueFullError if reply.get('queue_full') else RuntimeError)(reply['error'])
+        return reply
+
+    def submit(self, prompt, **generate_kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError(f"Inference queue is full ({self.max_queue_depth} pending)")
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_queue_depth, thread_name_prefix='ai-remote')
+        try:
+            future = self._pool.submit(self._call, {'op': 'generate', 'prompt': prompt, 'kwargs': generate_kwargs,
+                                                    'timeout': self.timeout})
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        result = Future()
+        future.add_done_callback(lambda f: result.set_exception(f.exception()) if f.exception()
+                                 else result.set_result(f.result()['text']))
+        return result
+
+    def generate(self, prompt, timeout=60, **generate_kwargs):
+        """Blocking helper: submit and wait for the generated text."""
+        return self.submit(prompt, **generate_kwargs).result(timeout=timeout)
+
+    def stream(self, prompt, max_chars=None, **generate_kwargs):
+        try:
+            sock = self.model_manager.connect(timeout=self.timeout)
+        except OSError as e:
+            raise RuntimeError(f"Model server unavailable: {e}")
+        with sock:
+            send_message(sock, {'op': 'stream', 'prompt': prompt, 'max_chars': max_chars, 'kwargs': generate_kwargs})
+            while True:
+                reply = recv_message(sock)
+                if reply is None:
+                    raise RuntimeError("Model server closed the stream")
+                if 'error' in reply:
+                    raise (QueueFullError if reply.get('queue_full') else RuntimeError)(reply['error'])
+                if reply.get('done'):
+                    return
+                yield reply['token']
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    socket_path = os.environ.get('AI_SERVER_SOCKET') or DEFAULT_SOCKET
+    # The only process running the model, so it gets every core rather than the
+    # per-worker share configure_torch_threads works out from WEB_CONCURRENCY
+    os.environ.setdefault('AI_TORCH_THREADS', str(os.cpu_count() or 1))
+    model_manager = ModelManager(model_name=os.environ.get('AI_MODEL_NAME', 'distilgpt2'), load_mode='background')
+    scheduler = InferenceScheduler(model_manager)
+    server = ModelServer(socket_path, model_manager, scheduler)
+    model_manager.start()
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info("Model server listening on %s", socket_path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        logger.info("Model server stopped")
+
+
+if __name__ == '__main__':
+    main()
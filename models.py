@@ -1,17 +1,76 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Index
+import multiprocessing
+import os
+
+from sqlalchemy import create_engine, event, func, Column, Integer, String, Boolean, Float, Date, Text, Index, ForeignKey
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.schema import CreateIndex
+
+from migrations import add_missing_columns, retype_as_date
+from search_index import create_search_index
+
+# Database configuration: DATABASE_URL may point at a server database
+# (e.g. postgresql://...); the default is the local SQLite file
+DATABASE_URL = os.environ.get('DATABASE_URL', "sqlite:///smartdischarge.db")
+if DATABASE_URL.startswith('postgres://'):
+    # Heroku-style scheme, which SQLAlchemy no longer accepts
+    DATABASE_URL = 'postgresql://' + DATABASE_URL[len('postgres://'):]
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer, and busy_timeout makes concurrent writers from other
+# gunicorn workers wait for the lock instead of failing with "database is locked".
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 65536)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
+
+def create_db_engine(url=DATABASE_URL):
+    """Build the engine with a sized pool, plus the SQLite PRAGMAs on connect."""
+    url = make_url(url)
+    pool_args = dict(
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    )
+    if url.get_backend_name() != 'sqlite':
+        return create_engine(url, echo=False, pool_pre_ping=True, pool_recycle=1800, **pool_args)
+    if url.database in (None, '', ':memory:'):
+        return create_engine(url, echo=False)
+    engine = create_engine(url, echo=False, connect_args={'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+                           **pool_args)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
 
-# Database configuration
-DATABASE_URL = "sqlite:///smartdischarge.db"
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_db_engine()
+# One session per thread; app.py removes it when each request ends
+SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 Base = declarative_base()
 
+if hasattr(os, 'register_at_fork'):
+    # Pooled connections must not be shared with forked gunicorn workers
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+# Patient.Origin of patients added through the app; CSV loads leave it NULL
+ORIGIN_APP = 'app'
+
 class Patient(Base):
     __tablename__ = "patients"
 
-    PatientID = Column(Integer, primary_key=True)
+    # Assigned by the database (SQLite rowid / PostgreSQL sequence) on insert
+    PatientID = Column(Integer, primary_key=True, autoincrement=True)
     Name = Column(String, nullable=True)
     Sex = Column(String, nullable=True)
     State = Column(String, nullable=True)
@@ -22,12 +81,139 @@ class Patient(Base):
     DoctorName = Column(String, nullable=True)
     Allergies = Column(String, nullable=True)
     ChiefComplaint = Column(String, nullable=True)
-    AdmissionDate = Column(String, nullable=True)
-    DischargeDate = Column(String, nullable=True)
-    TestReports = Column(String, nullable=True)
+    AdmissionDate = Column(Date, nullable=True)  # NULL when not known
+    DischargeDate = Column(Date, nullable=True)
+    TestReports = Column(String, nullable=True)  # path of the latest upload; every upload is in test_reports
+    Origin = Column(String, nullable=True)  # ORIGIN_APP, or NULL when loaded from CSV; init_db's sync won't overwrite app rows
+
+    # Indexes for the /search, /export and view filters. PatientID needs none of
+    # its own: as the INTEGER PRIMARY KEY it is the table's rowid.
+    __table_args__ = (
+        Index('idx_patients_doctor_discharge', 'DoctorName', 'DischargeDate'),
+        Index('idx_patients_state_risk', 'State', 'RiskCategory'),
+        Index('idx_patients_risk_discharge', 'RiskCategory', 'DischargeDate'),
+        Index('idx_patients_admission', 'AdmissionDate'),
+        Index('idx_patients_discharge', 'DischargeDate'),
+        # Case-insensitive name prefix search compares lower(Name) against a range
+        Index('idx_patients_name_lower', func.lower(Name)),
+    )
+
+class TestReport(Base):
+    """One uploaded test report. Rows for identical files share one stored copy (same ContentHash)."""
+    __tablename__ = "test_reports"
+
+    ReportID = Column(Integer, primary_key=True, autoincrement=True)
+    PatientID = Column(Integer, ForeignKey("patients.PatientID", ondelete="CASCADE"), nullable=False)
+    FileName = Column(String, nullable=False)  # as uploaded
+    ContentHash = Column(String, nullable=False)  # sha256 of the file
+    Path = Column(String, nullable=False)  # under static/, like Patient.TestReports
+    Size = Column(Integer, nullable=False)
+    Status = Column(String, nullable=False)  # pending, ready or failed
+    PageCount = Column(Integer, nullable=True)
+    ThumbnailPath = Column(String, nullable=True)
+    UploadedAt = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index('idx_test_reports_patient', 'PatientID'),
+        Index('idx_test_reports_hash', 'ContentHash'),
+    )
+
+class ClinicalRecord(Base):
+    """Structured clinical fields parsed from richer source datasets (e.g. cardiology case sheets)."""
+    __tablename__ = "clinical_records"
+
+    PatientID = Column(Integer, ForeignKey("patients.PatientID", ondelete="CASCADE"), primary_key=True)
+    SourcePatientID = Column(String, nullable=True)
+    Age = Column(Integer, nullable=True)
+    SymptomDuration = Column(String, nullable=True)
+    PastMedicalHistory = Column(String, nullable=True)
+    SystolicBP = Column(Integer, nullable=True)
+    DiastolicBP = Column(Integer, nullable=True)
+    HeartRate = Column(Integer, nullable=True)
+    PhysicalExam = Column(String, nullable=True)
+    ECGFindings = Column(String, nullable=True)
+    ProvisionalDiagnosis = Column(String, nullable=True)
+    FinalDiagnosis = Column(String, nullable=True)
+    Medications = Column(String, nullable=True)
+    DischargeMedications = Column(String, nullable=True)
+    FollowUp = Column(String, nullable=True)
+
+class ClinicalNarrative(Base):
+    """Free-text notes kept verbatim alongside the structured record."""
+    __tablename__ = "clinical_narratives"
+
+    PatientID = Column(Integer, ForeignKey("patients.PatientID", ondelete="CASCADE"), primary_key=True)
+    CaseSheetText = Column(Text, nullable=True)
+    HistoryPresentIllness = Column(Text, nullable=True)
+    ReportText = Column(Text, nullable=True)
+    DischargeSummary = Column(Text, nullable=True)
+
+class IngestState(Base):
+    """Load watermark for a CSV source, used by init_db's incremental sync."""
+    __tablename__ = "ingest_state"
+
+    Source = Column(String, primary_key=True)
+    FileSize = Column(Integer, nullable=False)
+    FileMtime = Column(Float, nullable=False)
+    FileHash = Column(String, nullable=False)
+    ChunkSize = Column(Integer, nullable=False)
+    ChunkHashes = Column(Text, nullable=False)  # JSON list, one sha256 per chunk
+    RowCount = Column(Integer, nullable=False)
+    LoadedAt = Column(String, nullable=False)
+
+class PatientRollup(Base):
+    """Patient totals per doctor and risk category, maintained by analytics.py."""
+    __tablename__ = "rollup_patients"
+
+    DoctorName = Column(String, primary_key=True)
+    RiskCategory = Column(String, primary_key=True)
+    Patients = Column(Integer, nullable=False)
+    Chronic = Column(Integer, nullable=False)  # patients with a chronic condition
+    TotalStayDays = Column(Integer, nullable=False)
+
+class StayRollup(Base):
+    """Length-of-stay histogram per doctor, maintained by analytics.py."""
+    __tablename__ = "rollup_stays"
+
+    DoctorName = Column(String, primary_key=True)
+    StayDays = Column(Integer, primary_key=True)
+    Patients = Column(Integer, nullable=False)
+
+class DischargeRollup(Base):
+    """Discharges per day and doctor, maintained by analytics.py. Patients without a DischargeDate aren't counted."""
+    __tablename__ = "rollup_discharges"
+
+    DischargeDate = Column(Date, primary_key=True)
+    DoctorName = Column(String, primary_key=True)
+    Discharges = Column(Integer, nullable=False)
+    Chronic = Column(Integer, nullable=False)
+    TotalStayDays = Column(Integer, nullable=False)
+
+def create_schema(engine):
+    """Create missing tables and indexes, migrate columns whose type changed, and drop unused indexes."""
+    Base.metadata.create_all(engine)
+    # Before retype_as_date, whose SQLite table rebuild copies every model column
+    add_missing_columns(engine, Patient.__table__)
+    # Databases from before the dates were typed stored them as text, 'Unknown' when missing
+    retype_as_date(engine, Patient.__table__, ('AdmissionDate', 'DischargeDate'))
+    with engine.begin() as connection:
+        # create_all skips tables that exist, so indexes added since still need creating
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+        # Duplicated the primary key
+        connection.exec_driver_sql("DROP INDEX IF EXISTS idx_patient_id")
+    create_search_index(engine)
+
+def is_pool_process():
+    """True in processes started by multiprocessing, e.g. app.py's PDF render pool.
 
-    # Index for faster lookups on PatientID
-    __table_args__ = (Index('idx_patient_id', 'PatientID'),)
+    Spawned processes re-run the parent's main script before taking work, so
+    a parent started with `python app.py` would have every render process run
+    the app's startup again. Their parent has already done it; they skip it.
+    """
+    return multiprocessing.parent_process() is not None
 
 # Create tables
-Base.metadata.create_all(engine)
\ No newline at end of file
+if not is_pool_process():
+    create_schema(engine)
\ No newline at end of file
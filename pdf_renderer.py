@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import unicodedata
+
+from fpdf import FPDF
+
+logger = logging.getLogger(__name__)
+
+LOGO_PATH = os.path.join(os.path.dirname(__file__), "static", "images", "logo.png")
+HOSPITAL_NAME = "ICareForYou"
+HOSPITAL_CONTACT = "Hyderabad, Telangana, India | Mobile: +91 9123696969"
+BRAND_COLOR = (0, 102, 204)
+SECTION_FILL = (240, 240, 240)
+
+# Identifying data lines: (label, value from patient_data/summary)
+IDENTIFYING_FIELDS = [
+    ("Patient", lambda patient_data, summary: patient_data.get('Name', 'Unknown')),
+    ("Medical Record Number", lambda patient_data, summary: patient_data.get('PatientID', 'Unknown')),
+    ("Age", lambda patient_data, summary: summary['age']),
+    ("Sex", lambda patient_data, summary: patient_data.get('Sex', 'Unknown')),
+    ("Admission Date", lambda patient_data, summary: summary['admission_date']),
+    ("Discharge Date", lambda patient_data, summary: summary['discharge_date']),
+]
+
+# Body sections in page order: (heading, summary key or callable(patient_data, summary))
+SECTIONS = [
+    ("Service:", lambda patient_data, summary: "General Medicine"),
+    ("Chief Complaint:", 'chief_complaint'),
+    ("History of Present Illness:", 'hpi'),
+    ("Past Medical/Surgical History:", 'past_history'),
+    ("Social History:", 'social_history'),
+    ("Allergies:", 'allergies'),
+    ("Physical Exam on Admission:", 'physical_exam'),
+    ("Laboratory Data:", 'lab_data'),
+    ("Hospital Course:", 'hospital_course'),
+    ("Condition at Discharge:", 'condition'),
+    ("Discharge Diagnoses:", 'diagnosis'),
+    ("Discharge Medications:", 'medications'),
+    ("Diet:", 'diet'),
+    ("Activity:", 'activity'),
+    ("Follow-Up:", 'follow_up'),
+    ("Discharge Instructions:", 'discharge_instructions'),
+    ("AI-Generated Notes:", 'ai_notes'),
+]
+
+# Typographic characters model output and pasted text often carry, mapped to
+# what the latin-1 core fonts can draw
+LATIN1_SUBSTITUTES = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201c': '"', '\u201d': '"', '\u201e': '"',
+    '\u2013': '-', '\u2014': '-', '\u2212': '-', '\u2022': '*', '\u2026': '...', '\ufffd': '?',
+})
+
+
+def to_latin1(text):
+    """Return text with anything fpdf's core fonts can't encode replaced, so rendering never fails on it."""
+    text = str(text).translate(LATIN1_SUBSTITUTES)
+    if text.isascii():
+        return text
+    # Accented letters outside latin-1 fall back to their base letter, anything else to '?'
+    return ''.join(c if ord(c) < 256 else
+                   unicodedata.normalize('NFKD', c).encode('latin-1', 'ignore').decode('latin-1') or '?'
+                   for c in text)
+
+
+class _OutputBuffer:
+    """Append-only stand-in for fpdf 1.x's str buffer.
+
+    fpdf 1.x grows its output with `buffer += s`, which recopies the whole
+    document (including the ~1MB logo stream) on every line written after it.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._length = 0
+
+    def __iadd__(self, text):
+        self._parts.append(text)
+        self._length += len(text)
+        return self
+
+    def __len__(self):
+        return self._length
+
+    def getvalue(self):
+        return ''.join(self._parts)
+
+
+class DischargePDF(FPDF):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if isinstance(self.buffer, str):
+            self.buffer = _OutputBuffer()
+
+    def heading(self, text):
+        self.set_font("Arial", 'B', 12)
+        self.cell(0, 10, text, ln=True, fill=True)
+
+    def separator(self):
+        self.set_draw_color(*BRAND_COLOR)
+        self.line(20, self.get_y(), 190, self.get_y())
+        self.ln(5)
+
+    def banner(self):
+        self.set_fill_color(*BRAND_COLOR)
+        self.set_text_color(255, 255, 255)
+        self.set_font("Arial", 'B', 14)
+        self.cell(0, 10, HOSPITAL_NAME, ln=True, align='C', fill=True)
+        self.set_font("Arial", 'I', 10)
+        self.set_text_color(0, 0, 0)
+        self.cell(0, 8, HOSPITAL_CONTACT, ln=True, align='C')
+
+
+# The logo as parsed by fpdf, ~1MB of image data, parsed once per process
+_logo = None
+_logo_lock = threading.Lock()
+
+def load_logo():
+    global _logo
+    if _logo is None:
+        with _logo_lock:
+            if _logo is None:
+                pdf = FPDF()
+                pdf.add_page()
+                pdf.image(LOGO_PATH, x=0, y=0, w=1)
+                _logo = pdf.images[LOGO_PATH]
+    return _logo
+
+
+def build_frame():
+    """Draw everything that is the same on every summary: border, logo, header and the first heading."""
+    pdf = DischargePDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_margins(20, 15, 20)
+
+    pdf.set_draw_color(*BRAND_COLOR)
+    pdf.rect(10, 10, 190, 277)  # A4 size: 210x297mm, 10mm margin
+    try:
+        logo = load_logo()
+        if logo is not None:
+            # fpdf only parses images missing from pdf.images. A copy per document,
+            # since output() deletes the image data from its own entry; the bytes are shared.
+            pdf.images[LOGO_PATH] = dict(logo)
+        pdf.image(LOGO_PATH, x=85, y=15, w=40)  # Centered logo
+    except Exception as e:
+        logger.warning("Logo image not found or invalid at %s: %s", LOGO_PATH, str(e))
+
+    pdf.set_y(55)
+    pdf.banner()
+    pdf.ln(10)
+    pdf.separator()
+
+    pdf.set_fill_color(*SECTION_FILL)
+    pdf.heading("Identifying Data:")
+    pdf.set_font("Arial", size=12)
+    return pdf
+
+
+# Render the discharge summary PDF and return it as bytes. Kept free of app
+# imports so it can run in a process pool without loading Flask or the model.
+def render_pdf(patient_data, summary):
+    pdf = build_frame()
+
+    for label, value in IDENTIFYING_FIELDS:
+        pdf.multi_cell(0, 10, to_latin1(f"{label}: {value(patient_data, summary)}"), align='L')
+    if summary['is_fallback']:
+        pdf.multi_cell(0, 10, "Note: Generated based on similar patient data", align='L')
+    pdf.ln(5)
+
+    for heading, field in SECTIONS:
+        pdf.heading(heading)
+        pdf.set_font("Arial", size=12)
+        pdf.multi_cell(0, 10, to_latin1(field(patient_data, summary) if callable(field) else summary[field]))
+        pdf.ln(5)
+
+    pdf.heading(to_latin1(f"Signature: {summary['doctor_name']}"))
+    pdf.set_font("Arial", 'I', 12)
+    pdf.cell(0, 10, f"Consultant Physician, {HOSPITAL_NAME}", ln=True)
+    pdf.ln(10)
+    pdf.separator()
+    pdf.banner()
+
+    output = pdf.output(dest='S')
+    if isinstance(output, _OutputBuffer):
+        output = output.getvalue()
+    # fpdf 1.x returns a latin-1 str, fpdf2 a bytearray
+    if isinstance(output, str):
+        output = output.encode('latin-1')
+    return bytes(output)
@@ -0,0 +1,127 @@
+"""Content-addressed storage for uploaded test reports.
+
+Uploads are copied to disk in fixed-size chunks while being hashed, then
+renamed to <root>/<sha256[:2]>/<sha256><ext>. A file that is uploaded again
+(for the same or another patient) resolves to the stored copy, so it costs
+no extra space. Page counts and thumbnails are derived from the stored file
+and keyed by the same hash.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_SIZE = (256, 256)
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# key is the stored file's path relative to the store root; created is False
+# when an identical file was already stored and the upload was discarded
+StoredFile = namedtuple('StoredFile', ['content_hash', 'key', 'size', 'created'])
+
+# Page objects in an uncompressed PDF ('/Type /Pages' is the page tree, not a page)
+PDF_PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+
+
+class UploadTooLargeError(ValueError):
+    status_code = 413
+
+
+def count_pdf_pages(path):
+    """Number of pages in a PDF, or None when it can't be told.
+
+    Uses pypdf when it is installed; otherwise counts page objects in the raw
+    file, which misses pages kept in compressed object streams.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        PdfReader = None
+    if PdfReader is not None:
+        return len(PdfReader(path).pages)
+    if not os.path.getsize(path):
+        return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return sum(1 for _ in PDF_PAGE_PATTERN.finditer(data)) or None
+
+
+class ReportStore:
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        # Partial uploads live on the same filesystem so the final rename is atomic
+        self._tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def save(self, stream, extension, max_bytes=None):
+        """Copy a readable binary stream into the store; returns a StoredFile."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+                    digest.update(chunk)
+                    out.write(chunk)
+            content_hash = digest.hexdigest()
+            key = os.path.join(content_hash[:2], content_hash + extension.lower())
+            final_path = self.path(key)
+            if os.path.exists(final_path):
+                os.unlink(tmp_path)
+                return StoredFile(content_hash, key, size, False)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            # Two identical uploads racing here both rename the same bytes into place
+            os.replace(tmp_path, final_path)
+            return StoredFile(content_hash, key, size, True)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def thumbnail(self, key, content_hash):
+        """Write a JPEG thumbnail of a stored image and return its key; None if Pillow isn't installed."""
+        try:
+            from PIL import Image
+        except ImportError:
+            logger.debug("Pillow not installed, skipping thumbnail for %s", key)
+            return None
+        thumb_key = os.path.join('thumbs', content_hash[:2], content_hash + '.jpg')
+        thumb_path = self.path(thumb_key)
+        if not os.path.exists(thumb_path):
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            # A temp file per call: workers extracting the same image concurrently each rename a complete thumbnail
+            fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+            try:
+                with os.fdopen(fd, 'wb') as out, Image.open(self.path(key)) as image:
+                    image.thumbnail(THUMBNAIL_SIZE)
+                    image.convert('RGB').save(out, 'JPEG', quality=80)
+                os.replace(tmp_path, thumb_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        return thumb_key
+
+    def extract(self, key, content_hash):
+        """(page count, thumbnail key) for a stored report. Either may be None."""
+        extension = os.path.splitext(key)[1]
+        if extension == '.pdf':
+            # Rendering PDF pages needs a rasteriser this app doesn't ship; count pages only
+            return count_pdf_pages(self.path(key)), None
+        if extension in IMAGE_EXTENSIONS:
+            return 1, self.thumbnail(key, content_hash)
+        return None, None
@@ -0,0 +1,170 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Columns of the native patients CSV, in Patient model order
+EXPECTED_COLUMNS = [
+    'PatientID', 'Name', 'Sex', 'State', 'GeneralHealth',
+    'HasChronicCondition', 'HospitalStayDuration', 'RiskCategory',
+    'DoctorName', 'Allergies', 'ChiefComplaint', 'AdmissionDate',
+    'DischargeDate', 'TestReports'
+]
+
+# Default fill value for each text column
+TEXT_DEFAULTS = {
+    'Name': 'Unknown',
+    'Sex': 'Unknown',
+    'State': 'Unknown',
+    'GeneralHealth': 'Unknown',
+    'RiskCategory': 'Unknown',
+    'DoctorName': 'Dr. Anita Sharma',
+    'Allergies': 'None',
+    'ChiefComplaint': 'Unknown',
+    'TestReports': ''
+}
+
+# Stored as DATE; missing or unparseable values are NULL
+DATE_COLUMNS = ('AdmissionDate', 'DischargeDate')
+
+CHRONIC_VALUES = {True: True, False: False, 'Yes': True, 'No': False, 1: True, 0: False}
+
+def parse_dates(values):
+    """Parse a column of date strings to datetime64 (midnight); unparseable values such as 'Unknown' become NaT."""
+    values = values.astype('string').str.strip()
+    parsed = pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+    # Only values that aren't plain ISO dates take the slower per-value format inference
+    rest = parsed.isna() & values.notna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(values[rest], format='mixed', errors='coerce')
+    return parsed.dt.normalize()
+
+def prepare_patients(df, warn_missing=True):
+    """Clean a chunk in the native patients schema and drop rows without a valid PatientID."""
+    for col in EXPECTED_COLUMNS:
+        if col not in df.columns:
+            if warn_missing:
+                logger.warning("Column %s missing in CSV, adding with default value", col)
+            df[col] = None if col != 'TestReports' else ''
+    df = df[EXPECTED_COLUMNS].copy()
+
+    df['PatientID'] = pd.to_numeric(df['PatientID'], errors='coerce').fillna(0).astype('int64')
+    df['HasChronicCondition'] = df['HasChronicCondition'].map(CHRONIC_VALUES).fillna(False).astype(bool)
+    df['HospitalStayDuration'] = pd.to_numeric(df['HospitalStayDuration'], errors='coerce').fillna(1).astype('int64')
+    for col, default in TEXT_DEFAULTS.items():
+        df[col] = df[col].fillna(default).astype(str)
+    for col in DATE_COLUMNS:
+        df[col] = parse_dates(df[col])
+    return df[df['PatientID'] > 0]
+
+
+class SchemaMapping:
+    """Turns a chunk of some source CSV into DataFrames keyed by destination table.
+
+    The 'patients' frame is always present; mappings for richer sources add
+    more tables. Subclass and pass an instance to register_mapping to support
+    a new source format.
+    """
+    name = None
+    required_columns = ()
+
+    def matches(self, columns):
+        return set(self.required_columns).issubset(columns)
+
+    def transform(self, chunk):
+        raise NotImplementedError
+
+
+class PatientsMapping(SchemaMapping):
+    name = 'patients'
+    required_columns = ('PatientID',)
+
+    def transform(self, chunk):
+        return {'patients': prepare_patients(chunk)}
+
+
+class CardiologyMapping(SchemaMapping):
+    """data/cardiology_dataset_corrected.csv: one row per admission, keyed P0001..."""
+    name = 'cardiology'
+    required_columns = ('Patient_ID', 'Case_Sheet_Text')
+
+    # "33yo female, Chest pain for 2 days, ..." -> age, sex, complaint, duration
+    CASE_SHEET_PATTERN = r'^\s*(?P<Age>\d+)\s*yo\s+(?P<Sex>[A-Za-z]+)\s*,\s*(?P<Complaint>[^,]+?)\s+for\s+(?P<SymptomDuration>[^,]+)'
+    # "BP 148/71, HR 74, no murmurs" -> vitals
+    VITALS_PATTERN = r'BP\s*(?P<SystolicBP>\d+)\s*/\s*(?P<DiastolicBP>\d+)(?:.*?HR\s*(?P<HeartRate>\d+))?'
+    NO_HISTORY = 'No known prior illness'
+
+    def transform(self, chunk):
+        chunk = chunk.reset_index(drop=True)
+        text = lambda col: chunk[col].astype('string') if col in chunk.columns else pd.Series(pd.NA, index=chunk.index, dtype='string')
+
+        # All parsing is column-wise through pandas' vectorised str accessors
+        patient_ids = pd.to_numeric(text('Patient_ID').str.extract(r'(\d+)', expand=False), errors='coerce').fillna(0).astype('int64')
+        case_sheet = text('Case_Sheet_Text').str.extract(self.CASE_SHEET_PATTERN)
+        exam = text('Physical_Exam').fillna(text('Case_Sheet_Text'))
+        vitals = exam.str.extract(self.VITALS_PATTERN)
+        history = text('Past_Medical_History').str.strip()
+
+        patients = prepare_patients(pd.DataFrame({
+            'PatientID': patient_ids,
+            'Name': 'Patient ' + text('Patient_ID'),
+            'Sex': case_sheet['Sex'].str.capitalize(),
+            'HasChronicCondition': history.notna() & (history != self.NO_HISTORY),
+            'RiskCategory': np.where(history.str.lower() == 'obesity', 'Obese', 'Unknown'),
+            'ChiefComplaint': text('Chief_Complaint').fillna(case_sheet['Complaint']),
+            'AdmissionDate': text('Admission_Date')
+        }), warn_missing=False)
+        as_int = lambda series: pd.to_numeric(series, errors='coerce').astype('Int64')
+        clinical = pd.DataFrame({
+            'PatientID': patient_ids,
+            'SourcePatientID': text('Patient_ID'),
+            'Age': as_int(case_sheet['Age']),
+            'SymptomDuration': case_sheet['SymptomDuration'],
+            'PastMedicalHistory': history,
+            'SystolicBP': as_int(vitals['SystolicBP']),
+            'DiastolicBP': as_int(vitals['DiastolicBP']),
+            'HeartRate': as_int(vitals['HeartRate']),
+            'PhysicalExam': exam,
+            'ECGFindings': text('ECG_Findings'),
+            'ProvisionalDiagnosis': text('Provisional_Diagnosis'),
+            'FinalDiagnosis': text('Final_Diagnosis').fillna(text('Provisional_Diagnosis')),
+            'Medications': text('Medications'),
+            'DischargeMedications': text('Discharge_Medications').fillna(text('Medications')),
+            'FollowUp': text('Follow_Up')
+        })
+        narratives = pd.DataFrame({
+            'PatientID': patient_ids,
+            'CaseSheetText': text('Case_Sheet_Text'),
+            'HistoryPresentIllness': text('History_Present_Illness'),
+            'ReportText': text('Report_Text'),
+            'DischargeSummary': text('Discharge_Summary')
+        })
+        valid = patient_ids > 0
+        return {'patients': patients, 'clinical_records': clinical[valid], 'clinical_narratives': narratives[valid]}
+
+
+MAPPINGS = {}
+
+def register_mapping(mapping):
+    MAPPINGS[mapping.name] = mapping
+    return mapping
+
+# Most specific first: detect_mapping returns the first one whose columns match
+register_mapping(CardiologyMapping())
+register_mapping(PatientsMapping())
+
+def detect_mapping(columns):
+    for mapping in MAPPINGS.values():
+        if mapping.matches(columns):
+            return mapping
+    raise ValueError(f"No schema mapping matches CSV columns: {', '.join(columns)}")
+
+def get_mapping(name, columns=None):
+    """Look up a mapping by name, or detect it from the CSV header when name is 'auto'."""
+    if name in (None, 'auto'):
+        return detect_mapping(columns)
+    if name not in MAPPINGS:
+        raise ValueError(f"Unknown schema mapping {name}; choose from {', '.join(MAPPINGS)}")
+    return MAPPINGS[name]
@@ -0,0 +1,134 @@
+"""SQLite FTS5 index over patients' free text, for /search.
+
+patients_fts holds one row per patient (rowid = PatientID) with the chief
+complaint, allergies and the clinical narrative text. Triggers on patients
+and clinical_narratives keep it in step with every insert, update and
+delete, including init_db's upserts. Bulk loads suspend the triggers and
+rebuild the index in one statement afterwards, which is much faster than
+indexing row by row.
+
+Other databases have no FTS5; /search falls back to LIKE there.
+"""
+import logging
+import re
+
+from sqlalchemy import column, table, text
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'patients_fts'
+
+# Narrative columns concatenated into the index's Narrative column
+NARRATIVE_SQL = ("SELECT " + " || ' ' || ".join(f"COALESCE({name}, '')" for name in (
+    'CaseSheetText', 'HistoryPresentIllness', 'ReportText', 'DischargeSummary')) +
+    " FROM clinical_narratives WHERE PatientID = {id}")
+INDEXED_ROW_SQL = ("SELECT p.PatientID, p.ChiefComplaint, p.Allergies, ({narrative}) FROM patients p"
+                   .format(narrative=NARRATIVE_SQL.format(id='p.PatientID')))
+
+TRIGGERS = {
+    'patients_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS patients_fts_insert AFTER INSERT ON patients BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, ChiefComplaint, Allergies, Narrative)
+            VALUES (new.PatientID, new.ChiefComplaint, new.Allergies, ({NARRATIVE_SQL.format(id='new.PatientID')}));
+        END""",
+    'patients_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS patients_fts_update AFTER UPDATE OF ChiefComplaint, Allergies ON patients BEGIN
+            UPDATE {FTS_TABLE} SET ChiefComplaint = new.ChiefComplaint, Allergies = new.Allergies
+            WHERE rowid = new.PatientID;
+        END""",
+    'patients_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS patients_fts_delete AFTER DELETE ON patients BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.PatientID;
+        END""",
+    'narratives_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS narratives_fts_insert AFTER INSERT ON clinical_narratives BEGIN
+            UPDATE {FTS_TABLE} SET Narrative = ({NARRATIVE_SQL.format(id='new.PatientID')}) WHERE rowid = new.PatientID;
+        END""",
+    'narratives_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS narratives_fts_update AFTER UPDATE ON clinical_narratives BEGIN
+            UPDATE {FTS_TABLE} SET Narrative = ({NARRATIVE_SQL.format(id='new.PatientID')}) WHERE rowid = new.PatientID;
+        END""",
+    'narratives_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS narratives_fts_delete AFTER DELETE ON clinical_narratives BEGIN
+            UPDATE {FTS_TABLE} SET Narrative = NULL WHERE rowid = old.PatientID;
+        END""",
+}
+
+
+def supports_search_index(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+def create_search_index(engine):
+    """Create the FTS table and its triggers if missing, filling it from existing rows."""
+    if engine.dialect.name != 'sqlite':
+        return
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        # Take the write lock first so workers starting together don't both build the index
+        cursor.execute("BEGIN IMMEDIATE")
+        if not cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)).fetchone():
+            cursor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(ChiefComplaint, Allergies, Narrative, "
+                           "tokenize = 'porter unicode61')")
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, ChiefComplaint, Allergies, Narrative) " + INDEXED_ROW_SQL)
+            logger.info("Built full-text search index")
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def create_triggers(connection):
+    for sql in TRIGGERS.values():
+        connection.exec_driver_sql(sql)
+
+
+def drop_triggers(connection):
+    if not supports_search_index(connection):
+        return
+    for name in TRIGGERS:
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def drop_search_index(connection):
+    if supports_search_index(connection):
+        drop_triggers(connection)
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def rebuild_search_index(connection):
+    """Refill the FTS table from scratch and reinstate the triggers (after a bulk load)."""
+    if not supports_search_index(connection):
+        return
+    connection.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE} (rowid, ChiefComplaint, Allergies, Narrative) "
+                               + INDEXED_ROW_SQL)
+    create_triggers(connection)
+
+
+def fts_query(terms):
+    """Turn free text into an FTS5 query in which every word must match.
+
+    Words match exactly after stemming ('pains' finds 'pain'); a word typed
+    with a trailing * matches as a prefix, which is much slower on common
+    prefixes. Words are quoted, so FTS5 operators and punctuation in the
+    input are taken literally rather than as query syntax.
+    """
+    return ' '.join('"{}"{}'.format(word, star) for word, star in re.findall(r'(\w+)(\*?)', terms))
+
+
+# The FTS table as a selectable, joined on rowid = PatientID
+fts = table(FTS_TABLE, column('rowid'))
+
+
+def match_clause(terms):
+    """WHERE clause matching terms against the index; None if terms has no words."""
+    query = fts_query(terms)
+    if not query:
+        return None
+    return text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=query)
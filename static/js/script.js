@@ -105,6 +105,134 @@ $(document).ready(function() {
         });
     });
 
+    // Render a finished summary into #result
+    function showSummary(data) {
+        $('#result').html('');
+        if (data.error) {
+            $('#result').html(`<div class="alert-error p-4 rounded-lg"><strong>⚠️ Error:</strong> ${data.error}</div>`);
+        } else {
+            $('#result').html(`
+                <div class="alert-success p-4 rounded-lg card">
+                    <strong>✅ Discharge Summary</strong>
+                    ${data.summary.is_fallback ? "<p class='mt-2 italic'>Note: Generated based on similar patient data</p>" : ""}
+                    <p class="mt-2"><strong>Chief Complaint:</strong> ${data.summary.chief_complaint}</p>
+                    <p class="mt-2"><strong>History of Present Illness:</strong> ${data.summary.hpi}</p>
+                    <p class="mt-2"><strong>Past History:</strong> ${data.summary.past_history}</p>
+                    <p class="mt-2"><strong>Social History:</strong> ${data.summary.social_history}</p>
+                    <p class="mt-2"><strong>Allergies:</strong> ${data.summary.allergies}</p>
+                    <p class="mt-2"><strong>Physical Exam:</strong> ${data.summary.physical_exam}</p>
+                    <p class="mt-2"><strong>Laboratory Data:</strong> ${data.summary.lab_data}</p>
+                    <p class="mt-2"><strong>Hospital Course:</strong> ${data.summary.hospital_course}</p>
+                    <p class="mt-2"><strong>Condition:</strong> ${data.summary.condition}</p>
+                    <p class="mt-2"><strong>Diagnoses:</strong> ${data.summary.diagnosis}</p>
+                    <p class="mt-2"><strong>Medications:</strong> ${data.summary.medications}</p>
+                    <p class="mt-2"><strong>Diet:</strong> ${data.summary.diet}</p>
+                    <p class="mt-2"><strong>Activity:</strong> ${data.summary.activity}</p>
+                    <p class="mt-2"><strong>Follow-Up:</strong> ${data.summary.follow_up}</p>
+                    <p class="mt-2"><strong>Instructions:</strong> ${data.summary.discharge_instructions}</p>
+                    <p class="mt-2"><strong>AI Notes:</strong> ${data.summary.ai_notes}</p>
+                    <p class="mt-2"><strong>Admission Date:</strong> ${data.summary.admission_date}</p>
+                    <p class="mt-2"><strong>Discharge Date:</strong> ${data.summary.discharge_date}</p>
+                    <p class="mt-2"><strong>Doctor:</strong> ${data.summary.doctor_name}</p>
+                    <button class="copy-summary-btn inline-block mt-4 bg-gray-600 text-white px-4 py-2 rounded-lg hover:bg-gray-700 transition"><i class="fas fa-copy mr-2"></i>Copy Summary</button>
+                    <a href="/download/${data.pdf_file}" class="inline-block mt-4 button px-4 py-2 rounded-lg transition"><i class="fas fa-download mr-2"></i>Download PDF</a>
+                </div>
+            `);
+
+            // Attach click event to Copy Summary button
+            $('.copy-summary-btn').click(function() {
+                const summaryText = `Chief Complaint: ${data.summary.chief_complaint}\nHPI: ${data.summary.hpi}\nPast History: ${data.summary.past_history}\nSocial History: ${data.summary.social_history}\nAllergies: ${data.summary.allergies}\nPhysical Exam: ${data.summary.physical_exam}\nLab Data: ${data.summary.lab_data}\nHospital Course: ${data.summary.hospital_course}\nCondition: ${data.summary.condition}\nDiagnoses: ${data.summary.diagnosis}\nMedications: ${data.summary.medications}\nDiet: ${data.summary.diet}\nActivity: ${data.summary.activity}\nFollow-Up: ${data.summary.follow_up}\nInstructions: ${data.summary.discharge_instructions}\nAI Notes: ${data.summary.ai_notes}\nAdmission: ${data.summary.admission_date}\nDischarge: ${data.summary.discharge_date}\nDoctor: ${data.summary.doctor_name}`;
+                navigator.clipboard.writeText(summaryText).then(() => {
+                    showNotification('Summary copied to clipboard!');
+                }).catch(err => {
+                    console.error('Failed to copy text: ', err);
+                    showNotification('Failed to copy summary.', true);
+                });
+            });
+        }
+    }
+
+    const JOB_STAGES = {
+        queued: 'Waiting for a free worker...',
+        running: 'Starting...',
+        fetching_patient: 'Fetching patient...',
+        ai_notes: 'Generating AI notes...',
+        rendering_pdf: 'Rendering PDF...',
+        pdf_ready: 'PDF ready...'
+    };
+
+    function showJobStage(stage) {
+        $('#job_stage').text(JOB_STAGES[stage] || 'Generating summary...');
+    }
+
+    // Stream the AI notes into #ai_notes_live as they decode, then call onDone.
+    // The server caches the finished notes, so the /generate job that follows reuses them.
+    function streamNotes(patientId, onDone) {
+        if (!window.EventSource) {
+            onDone();
+            return;
+        }
+        const source = new EventSource(`/ai_notes/stream?patient_id=${encodeURIComponent(patientId)}`);
+        let finished = false;
+        const finish = function() {
+            if (!finished) {
+                finished = true;
+                source.close();
+                onDone();
+            }
+        };
+        source.addEventListener('token', function(e) {
+            $('#ai_notes_live').append(document.createTextNode(JSON.parse(e.data).text));
+        });
+        source.addEventListener('done', finish);
+        source.onerror = finish;
+    }
+
+    function finishJob(job) {
+        if (job.status === 'done') {
+            showSummary(job.result);
+        } else {
+            showSummary({ error: job.error || 'Failed to generate summary. Please try again.' });
+        }
+    }
+
+    // Follow a queued /generate job over Server-Sent Events, polling where EventSource is unavailable
+    function followJob(job) {
+        showJobStage('queued');
+        if (window.EventSource) {
+            const source = new EventSource(job.events_url);
+            source.addEventListener('progress', function(e) {
+                showJobStage(JSON.parse(e.data).stage);
+            });
+            ['done', 'failed'].forEach(function(name) {
+                source.addEventListener(name, function(e) {
+                    source.close();
+                    finishJob(JSON.parse(e.data));
+                });
+            });
+            source.onerror = function() {
+                // Stream dropped (e.g. by a proxy); carry on by polling
+                source.close();
+                pollJob(job.status_url);
+            };
+        } else {
+            pollJob(job.status_url);
+        }
+    }
+
+    function pollJob(statusUrl) {
+        $.getJSON(statusUrl, function(job) {
+            if (job.status === 'done' || job.status === 'failed') {
+                finishJob(job);
+            } else {
+                showJobStage(job.stage);
+                setTimeout(() => pollJob(statusUrl), 1000);
+            }
+        }).fail(function() {
+            showSummary({ error: 'Lost track of the summary job. Please try again.' });
+        });
+    }
+
     // Generate summary
     $('#generate_btn').click(function(e) {
         e.preventDefault();
@@ -114,9 +242,12 @@ $(document).ready(function() {
             return;
         }
 
-        $('#result').removeClass('hidden').html('<div class="spinner mr-2"></div><span class="text-gray-600 dark:text-gray-400">Generating summary...</span>');
+        $('#result').removeClass('hidden').html(`
+            <div class="spinner mr-2"></div><span id="job_stage" class="text-gray-600 dark:text-gray-400">Generating AI notes...</span>
+            <p id="ai_notes_live" class="mt-2 italic text-gray-600 dark:text-gray-400"></p>
+        `);
 
-        $.ajax({
+        streamNotes(patientId, () => $.ajax({
             url: '/generate',
             type: 'POST',
             data: {
@@ -127,56 +258,19 @@ $(document).ready(function() {
             },
             success: function(data) {
                 console.log("Response:", data);
-                $('#result').html('');
                 if (data.error) {
-                    $('#result').html(`<div class="alert-error p-4 rounded-lg"><strong>⚠️ Error:</strong> ${data.error}</div>`);
+                    showSummary(data);
                 } else {
-                    $('#result').html(`
-                        <div class="alert-success p-4 rounded-lg card">
-                            <strong>✅ Discharge Summary</strong>
-                            ${data.summary.is_fallback ? "<p class='mt-2 italic'>Note: Generated based on similar patient data</p>" : ""}
-                            <p class="mt-2"><strong>Chief Complaint:</strong> ${data.summary.chief_complaint}</p>
-                            <p class="mt-2"><strong>History of Present Illness:</strong> ${data.summary.hpi}</p>
-                            <p class="mt-2"><strong>Past History:</strong> ${data.summary.past_history}</p>
-                            <p class="mt-2"><strong>Social History:</strong> ${data.summary.social_history}</p>
-                            <p class="mt-2"><strong>Allergies:</strong> ${data.summary.allergies}</p>
-                            <p class="mt-2"><strong>Physical Exam:</strong> ${data.summary.physical_exam}</p>
-                            <p class="mt-2"><strong>Laboratory Data:</strong> ${data.summary.lab_data}</p>
-                            <p class="mt-2"><strong>Hospital Course:</strong> ${data.summary.hospital_course}</p>
-                            <p class="mt-2"><strong>Condition:</strong> ${data.summary.condition}</p>
-                            <p class="mt-2"><strong>Diagnoses:</strong> ${data.summary.diagnosis}</p>
-                            <p class="mt-2"><strong>Medications:</strong> ${data.summary.medications}</p>
-                            <p class="mt-2"><strong>Diet:</strong> ${data.summary.diet}</p>
-                            <p class="mt-2"><strong>Activity:</strong> ${data.summary.activity}</p>
-                            <p class="mt-2"><strong>Follow-Up:</strong> ${data.summary.follow_up}</p>
-                            <p class="mt-2"><strong>Instructions:</strong> ${data.summary.discharge_instructions}</p>
-                            <p class="mt-2"><strong>AI Notes:</strong> ${data.summary.ai_notes}</p>
-                            <p class="mt-2"><strong>Admission Date:</strong> ${data.summary.admission_date}</p>
-                            <p class="mt-2"><strong>Discharge Date:</strong> ${data.summary.discharge_date}</p>
-                            <p class="mt-2"><strong>Doctor:</strong> ${data.summary.doctor_name}</p>
-                            <button class="copy-summary-btn inline-block mt-4 bg-gray-600 text-white px-4 py-2 rounded-lg hover:bg-gray-700 transition"><i class="fas fa-copy mr-2"></i>Copy Summary</button>
-                            <a href="/download/${data.pdf_file}" class="inline-block mt-4 button px-4 py-2 rounded-lg transition"><i class="fas fa-download mr-2"></i>Download PDF</a>
-                        </div>
-                    `);
-
-                    // Attach click event to Copy Summary button
-                    $('.copy-summary-btn').click(function() {
-                        const summaryText = `Chief Complaint: ${data.summary.chief_complaint}\nHPI: ${data.summary.hpi}\nPast History: ${data.summary.past_history}\nSocial History: ${data.summary.social_history}\nAllergies: ${data.summary.allergies}\nPhysical Exam: ${data.summary.physical_exam}\nLab Data: ${data.summary.lab_data}\nHospital Course: ${data.summary.hospital_course}\nCondition: ${data.summary.condition}\nDiagnoses: ${data.summary.diagnosis}\nMedications: ${data.summary.medications}\nDiet: ${data.summary.diet}\nActivity: ${data.summary.activity}\nFollow-Up: ${data.summary.follow_up}\nInstructions: ${data.summary.discharge_instructions}\nAI Notes: ${data.summary.ai_notes}\nAdmission: ${data.summary.admission_date}\nDischarge: ${data.summary.discharge_date}\nDoctor: ${data.summary.doctor_name}`;
-                        navigator.clipboard.writeText(summaryText).then(() => {
-                            showNotification('Summary copied to clipboard!');
-                        }).catch(err => {
-                            console.error('Failed to copy text: ', err);
-                            showNotification('Failed to copy summary.', true);
-                        });
-                    });
+                    followJob(data);
                 }
             },
             error: function(xhr, status, error) {
                 console.log("AJAX Error:", status, error);
-                $('#result').html(`<div class="alert-error p-4 rounded-lg"><strong>⚠️ Error:</strong> Failed to generate summary. Please try again.</div>`);
+                const message = xhr.responseJSON && xhr.responseJSON.error ? xhr.responseJSON.error : 'Failed to generate summary. Please try again.';
+                $('#result').html(`<div class="alert-error p-4 rounded-lg"><strong>⚠️ Error:</strong> ${message}</div>`);
             },
             timeout: 60000
-        });
+        }));
     });
 
     // Form submission (optional, kept for compatibility)
@@ -239,11 +333,11 @@ $(document).ready(function() {
 
     // Handle load more button for pagination
     $(document).on('click', '#load-more', function() {
-        const nextPage = $(this).data('next-page');
+        const before = $(this).data('before');
         $.ajax({
             url: '/view_database',
             type: 'GET',
-            data: { page: nextPage, ajax: true },
+            data: { before: before, ajax: true },
             success: function(data) {
                 if (data.error) {
                     showNotification(`Failed to load more patients: ${data.error}`, true);
@@ -264,8 +358,8 @@ $(document).ready(function() {
                             <td class="p-2 sm:p-3">${patient.DoctorName}</td>
                             <td class="p-2 sm:p-3">${patient.Allergies}</td>
                             <td class="p-2 sm:p-3">${patient.ChiefComplaint}</td>
-                            <td class="p-2 sm:p-3">${patient.AdmissionDate}</td>
-                            <td class="p-2 sm:p-3">${patient.DischargeDate}</td>
+                            <td class="p-2 sm:p-3">${patient.AdmissionDate || 'Unknown'}</td>
+                            <td class="p-2 sm:p-3">${patient.DischargeDate || 'Unknown'}</td>
                             <td class="p-2 sm:p-3">
                                 ${patient.TestReports ? `<a href="/${patient.TestReports}" target="_blank" class="text-teal-600 hover:underline">View Report</a>` : 'None'}
                             </td>
@@ -276,7 +370,7 @@ $(document).ready(function() {
                 if (!data.has_more) {
                     $('#load-more').remove();
                 } else {
-                    $('#load-more').data('next-page', data.next_page);
+                    $('#load-more').data('before', data.next_before);
                 }
             },
             error: function(xhr, status, error) {